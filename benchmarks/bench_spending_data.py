@@ -0,0 +1,48 @@
+"""Замер get_spending_data на синтетических данных с разным числом карт.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_spending_data
+"""
+
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from src.store import index_by_date
+from src.views import get_spending_data
+
+ROWS = 200_000
+CARD_COUNTS = [10, 100, 1_000, 10_000]
+END_DATE = datetime(2021, 12, 31)
+
+
+def make_transactions(rows: int, cards: int, seed: int = 42) -> pd.DataFrame:
+    """Синтетические транзакции за декабрь 2021 года на заданное число карт."""
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp("2021-12-01") + pd.to_timedelta(rng.integers(0, 30 * 24 * 3600, rows), unit="s")
+    return index_by_date(
+        pd.DataFrame(
+            {
+                "Дата операции": dates,
+                "Номер карты": [f"*{number:04d}" for number in rng.integers(0, cards, rows)],
+                "Категория": pd.Categorical(rng.choice(["Супермаркеты", "Каршеринг", "Переводы"], rows)),
+                "Сумма платежа": rng.normal(-500, 300, rows).round(2),
+            }
+        )
+    )
+
+
+def run() -> None:
+    """Печатает время расчета для каждого числа карт при фиксированном числе строк."""
+    for cards in CARD_COUNTS:
+        transactions = make_transactions(ROWS, cards)
+        started = time.perf_counter()
+        result = get_spending_data(transactions, END_DATE)
+        elapsed = time.perf_counter() - started
+        print(f"rows={ROWS} cards={len(result)} time={elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,27 @@
+"""Память, занимаемая выгрузкой до и после приведения типов, по колонкам.
+
+Запуск из корня проекта:
+    python -m benchmarks.memory_report [путь к выгрузке]
+"""
+
+import sys
+
+import pandas as pd
+
+from src.store import memory_report, normalize_transactions
+
+DATA_PATH = "data/operations.xlsx"
+
+
+def run(file_path: str = DATA_PATH) -> None:
+    """Печатает отчет о памяти для выгрузки file_path."""
+    raw = pd.read_excel(file_path)
+    report = memory_report(raw, normalize_transactions(raw.copy()))
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(report)
+    total = report.loc["Итого"]
+    print(f"Сжатие: {total['Байт до'] / total['Байт после']:.1f}x")
+
+
+if __name__ == "__main__":
+    run(*sys.argv[1:])
@@ -0,0 +1,227 @@
+"""Набор замеров основных функций на синтетических выгрузках разного размера.
+
+Для каждой функции записываются лучшее время из нескольких повторов, пиковая память (tracemalloc)
+и отпечаток результата. При сравнении с прошлым запуском отмечаются замедления и изменившиеся результаты.
+
+Запуск из корня проекта:
+    python -m benchmarks.suite --rows 100000 1000000 --output benchmarks/results/current.json
+    python -m benchmarks.suite --rows 100000 --compare benchmarks/results/current.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+import pandas as pd
+
+from benchmarks.synthetic import make_operations
+from src.cube import SpendingCube
+from src.reports import category_cache, iter_json_records, spending_by_category
+from src.services import find_transactions_with_phone_numbers
+from src.store import derive, file_digest, load_transactions, sidecar_path, store, write_sidecar
+from src.views import get_spending_data
+
+ROWS = [100_000, 1_000_000]
+REPEAT = 3
+END_DATE = datetime(2021, 12, 31)
+CATEGORY = "Супермаркеты"
+REGRESSION_THRESHOLD = 0.2  # замедление больше чем на 20% считается регрессией
+MIN_REGRESSION_SECONDS = 0.01  # более короткие разницы не отличить от шума
+
+
+@dataclass
+class Measurement:
+    entry_point: str
+    rows: int
+    seconds: float
+    peak_bytes: int
+    digest: str
+
+
+def result_digest(result: Any) -> str:
+    """Отпечаток результата, чтобы заметить изменение вывода между запусками."""
+    if isinstance(result, pd.DataFrame):
+        data = pd.util.hash_pandas_object(result, index=False).to_numpy().tobytes()
+    elif isinstance(result, str):
+        data = result.encode("utf-8")
+    else:
+        data = json.dumps(result, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def prepare_dataset(rows: int, seed: int, directory: str) -> str:
+    """Создает выгрузку-заглушку, данные которой лежат в колоночном кэше, как после первого чтения Excel.
+
+    Так функции читают синтетические данные тем же путем, что и реальную выгрузку, без записи
+    миллионов строк в xlsx.
+    """
+    path = os.path.join(directory, f"synthetic_{rows}_{seed}.xlsx")
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(f"synthetic rows={rows} seed={seed}")
+    write_sidecar(make_operations(rows, seed), sidecar_path(path, file_digest(path)))
+    return path
+
+
+def entry_points(path: str) -> Dict[str, Callable[[], Any]]:
+    """Замеряемые функции. Перед каждым вызовом кэш процесса сбрасывается и выгрузка загружается заново."""
+
+    def spending_data_with_cube() -> Dict[str, Dict[str, Any]]:
+        transactions = load_transactions(path)
+        return get_spending_data(transactions, END_DATE, derive(path, transactions, "cube", SpendingCube))
+
+    return {
+        "load_transactions": lambda: load_transactions(path),
+        "get_spending_data": lambda: get_spending_data(load_transactions(path), END_DATE),
+        "get_spending_data_cube": spending_data_with_cube,
+        "spending_by_category": lambda: spending_by_category.__wrapped__(path, CATEGORY, "31.12.2021"),
+        "find_transactions_with_phone_numbers": lambda: find_transactions_with_phone_numbers(path),
+        "report_json": lambda: "".join(iter_json_records(load_transactions(path))),
+    }
+
+
+def reset_caches() -> None:
+    """Сбрасывает загруженные выгрузки и вычисленные отчеты: каждый повтор замеряет вычисление целиком."""
+    store.clear()
+    category_cache.clear()
+
+
+def measure(name: str, func: Callable[[], Any], path: str, rows: int, repeat: int) -> Measurement:
+    """Лучшее время из repeat повторов и пиковая память отдельного прогона под tracemalloc."""
+    timings = []
+    for _ in range(repeat):
+        reset_caches()
+        if name != "load_transactions":
+            load_transactions(path)  # загрузка не входит в замер остальных функций
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+
+    reset_caches()
+    if name != "load_transactions":
+        load_transactions(path)
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return Measurement(name, rows, min(timings), peak, result_digest(result))
+
+
+def run(rows_list: List[int], repeat: int = REPEAT, seed: int = 42, only: List[str] | None = None) -> Dict:
+    """Выполняет замеры для каждого размера выгрузки и возвращает результаты с описанием окружения."""
+    measurements = []
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in rows_list:
+            path = prepare_dataset(rows, seed, directory)
+            for name, func in entry_points(path).items():
+                if only and name not in only:
+                    continue
+                measurement = measure(name, func, path, rows, repeat)
+                print(
+                    f"{name:<40} rows={rows:<10} time={measurement.seconds:8.3f}s "
+                    f"peak={measurement.peak_bytes / 2**20:8.1f} MiB",
+                    flush=True,
+                )
+                measurements.append(measurement)
+        store.clear()
+    return {"meta": environment(seed, repeat), "results": [asdict(measurement) for measurement in measurements]}
+
+
+def environment(seed: int, repeat: int) -> Dict[str, Any]:
+    """Версии и коммит, на которых выполнен замер."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=False
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "seed": seed,
+        "repeat": repeat,
+    }
+
+
+def compare(previous: Dict, current: Dict, threshold: float = REGRESSION_THRESHOLD) -> List[Dict[str, Any]]:
+    """Сравнивает замеры по парам (функция, число строк), которые есть в обоих запусках."""
+    before = {(item["entry_point"], item["rows"]): item for item in previous["results"]}
+    rows = []
+    for item in current["results"]:
+        old = before.get((item["entry_point"], item["rows"]))
+        if old is None:
+            continue
+        ratio = item["seconds"] / old["seconds"] if old["seconds"] else float("inf")
+        rows.append(
+            {
+                "entry_point": item["entry_point"],
+                "rows": item["rows"],
+                "seconds_before": old["seconds"],
+                "seconds_after": item["seconds"],
+                "ratio": ratio,
+                "peak_before": old["peak_bytes"],
+                "peak_after": item["peak_bytes"],
+                "regression": ratio > 1 + threshold and item["seconds"] - old["seconds"] > MIN_REGRESSION_SECONDS,
+                "output_changed": old["digest"] != item["digest"],
+            }
+        )
+    return rows
+
+
+def print_comparison(rows: List[Dict[str, Any]]) -> None:
+    """Печатает таблицу сравнения с отметками о регрессиях и изменившихся результатах."""
+    for row in rows:
+        flags = []
+        if row["regression"]:
+            flags.append("РЕГРЕССИЯ")
+        if row["output_changed"]:
+            flags.append("ИЗМЕНИЛСЯ РЕЗУЛЬТАТ")
+        print(
+            f"{row['entry_point']:<40} rows={row['rows']:<10} "
+            f"{row['seconds_before']:8.3f}s -> {row['seconds_after']:8.3f}s (x{row['ratio']:.2f}) "
+            f"peak {row['peak_before'] / 2**20:.1f} -> {row['peak_after'] / 2**20:.1f} MiB {' '.join(flags)}"
+        )
+
+
+def main(argv: List[str] | None = None) -> int:
+    """Запуск из командной строки. Код завершения 1 — есть регрессии или изменившиеся результаты."""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite", description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=ROWS, help="размеры синтетических выгрузок")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="число повторов для замера времени")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", nargs="+", help="замерять только указанные функции")
+    parser.add_argument("--output", help="сохранить результаты в JSON-файл")
+    parser.add_argument("--compare", help="JSON-файл прошлого запуска для сравнения")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="допустимое замедление")
+    args = parser.parse_args(argv)
+
+    current = run(args.rows, args.repeat, args.seed, args.only)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(current, file, ensure_ascii=False, indent=4)
+
+    if not args.compare:
+        return 0
+    with open(args.compare, "r", encoding="utf-8") as file:
+        previous = json.load(file)
+    rows = compare(previous, current, args.threshold)
+    print_comparison(rows)
+    return 1 if any(row["regression"] or row["output_changed"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""Детерминированный генератор синтетических выгрузок по схеме data/operations.xlsx.
+
+Доли карт, категорий, валют, статусов и описаний с номерами телефонов подобраны по реальной выгрузке.
+Результат имеет те же колонки и типы, что и DataFrame после load_transactions.
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.store import index_by_date, normalize_transactions
+
+START = pd.Timestamp("2018-01-01")
+END = pd.Timestamp("2022-01-01")
+
+# (категория, доля, MCC, описания, знак суммы)
+CATEGORIES: List[Tuple[str, float, float, List[str], int]] = [
+    ("Супермаркеты", 0.34, 5411.0, ["Колхоз", "Магнит", "SPAR", "Дикси", "Пятерочка"], -1),
+    ("Фастфуд", 0.19, 5814.0, ["McDonald's", "Rumyanyj Khleb", "Бургер Кинг", "KFC"], -1),
+    ("Транспорт", 0.06, 4111.0, ["Метро Санкт-Петербург", "Яндекс Такси", "Ситимобил"], -1),
+    ("Переводы", 0.05, np.nan, ["Перевод на карту", "Константин Л.", "Иван С.", "Светлана Т."], -1),
+    ("Ж/д билеты", 0.04, 4112.0, ["РЖД", "Ласточка"], -1),
+    ("Различные товары", 0.04, 5399.0, ["Ozon.ru", "Wildberries", "Ashan"], -1),
+    ("Связь", 0.03, 4814.0, ["МТС", "Билайн", "Ростелеком"], -1),
+    ("Мобильная связь", 0.01, np.nan, [], -1),
+    ("Пополнения", 0.03, np.nan, ["Пополнение через Газпромбанк", "Внесение наличных"], 1),
+    ("Аптеки", 0.02, 5912.0, ["Апрель", "Аптека Вита"], -1),
+    ("Каршеринг", 0.02, 7512.0, ["Ситидрайв", "Делимобиль"], -1),
+    ("Рестораны", 0.02, 5812.0, ["Ресторан Пхали-Хинкали", "Шоколадница"], -1),
+    ("Бонусы", 0.02, np.nan, ["Кешбэк за обычные покупки"], 1),
+    ("Наличные", 0.02, 6011.0, ["Снятие в банкомате Сбербанк"], -1),
+    ("Дом и ремонт", 0.02, 5200.0, ["Леруа Мерлен", "OBI"], -1),
+    ("Топливо", 0.02, 5541.0, ["Shell", "Лукойл"], -1),
+    ("Другое", 0.07, 5999.0, ["ИП Смирнов", "Почта России", "IP Yakubovskaya M. V."], -1),
+]
+CARDS = ["*7197", "*4556", "*5091", "*5441", "*1112", "*5507", "*6002"]
+CARD_WEIGHTS = [0.72, 0.17, 0.008, 0.002, 0.001, 0.0005, 0.0005]
+MISSING_CARD_SHARE = 0.097
+CURRENCIES = ["RUB", "TRY", "EUR", "CNY", "USD"]
+CURRENCY_WEIGHTS = [0.98, 0.011, 0.0045, 0.0027, 0.0018]
+OPERATORS = ["Тинькофф Мобайл", "МТС", "Я МТС", "Билайн", "МегаФон"]
+PHONE_POOL_SIZE = 500
+
+
+def phone_descriptions(rng: np.random.Generator) -> List[str]:
+    """Описания платежей за мобильную связь с номерами в разных написаниях."""
+    numbers = rng.integers(900_000_0000, 999_999_9999, PHONE_POOL_SIZE)
+    descriptions = []
+    for position, number in enumerate(numbers):
+        digits = str(number)
+        if position % 3 == 0:
+            phone = f"+7 {digits[:3]} {digits[3:6]}-{digits[6:8]}-{digits[8:]}"
+        elif position % 3 == 1:
+            phone = f"+7{digits}"
+        else:
+            phone = f"+7 {digits[:3]} {digits[3:6]} {digits[6:8]} {digits[8:]}"
+        descriptions.append(f"{OPERATORS[position % len(OPERATORS)]} {phone}")
+    return descriptions
+
+
+def choice_codes(rng: np.random.Generator, weights: List[float], rows: int) -> np.ndarray:
+    """Случайные номера вариантов по долям; доли нормируются."""
+    probabilities = np.asarray(weights, dtype=float)
+    return rng.choice(len(probabilities), size=rows, p=probabilities / probabilities.sum())
+
+
+def make_operations(rows: int, seed: int = 42) -> pd.DataFrame:
+    """Синтетическая выгрузка из rows операций. При одинаковом seed результат одинаковый."""
+    rng = np.random.default_rng(seed)
+
+    seconds = rng.integers(0, int((END - START).total_seconds()), rows)
+    operation_dates = START + pd.to_timedelta(seconds, unit="s")
+    payment_dates = (operation_dates + pd.to_timedelta(rng.integers(0, 3, rows), unit="D")).normalize()
+
+    category_codes = choice_codes(rng, [category[1] for category in CATEGORIES], rows)
+    signs = np.array([category[4] for category in CATEGORIES])[category_codes]
+    amounts = (np.exp(rng.normal(5.0, 1.2, rows)) * signs).round(2)
+
+    pools = [category[3] or phone_descriptions(rng) for category in CATEGORIES]
+    offsets = np.cumsum([0] + [len(pool) for pool in pools])
+    descriptions = np.array([description for pool in pools for description in pool], dtype=object)
+    picks = (rng.random(rows) * np.diff(offsets)[category_codes]).astype(np.int64)
+    description_codes = offsets[category_codes] + picks
+
+    card_codes = choice_codes(rng, CARD_WEIGHTS + [MISSING_CARD_SHARE], rows)
+    card_codes[card_codes == len(CARDS)] = -1  # операция без номера карты
+    failed = rng.random(rows) < 0.006
+    cashback = np.where(rng.random(rows) < 0.09, (np.abs(amounts) / 100).round(0), np.nan)
+
+    transactions = pd.DataFrame(
+        {
+            "Дата операции": operation_dates,
+            "Дата платежа": payment_dates,
+            "Номер карты": pd.Categorical.from_codes(card_codes, categories=CARDS),
+            "Статус": pd.Categorical.from_codes(failed.astype(np.int8), categories=["OK", "FAILED"]),
+            "Сумма операции": amounts,
+            "Валюта операции": pd.Categorical.from_codes(
+                choice_codes(rng, CURRENCY_WEIGHTS, rows), categories=CURRENCIES
+            ),
+            "Сумма платежа": amounts,
+            "Валюта платежа": pd.Categorical.from_codes(np.zeros(rows, dtype=np.int8), categories=["RUB"]),
+            "Кэшбэк": cashback,
+            "Категория": pd.Categorical.from_codes(category_codes, categories=[c[0] for c in CATEGORIES]),
+            "MCC": np.array([category[2] for category in CATEGORIES])[category_codes],
+            "Описание": descriptions[description_codes],
+            "Бонусы (включая кэшбэк)": np.where(signs < 0, np.abs(amounts) // 100, 0).astype(np.int64),
+            "Округление на инвесткопилку": np.zeros(rows, dtype=np.int64),
+            "Сумма операции с округлением": np.abs(amounts),
+        }
+    )
+    return index_by_date(normalize_transactions(transactions))
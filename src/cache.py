@@ -0,0 +1,246 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from src.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache")
+# Сохранять ли вычисленные отчеты на диск (второй уровень ResultCache); включается, например, из командной строки
+PERSIST_RESULTS = False
+
+
+class TTLCache:
+    """LRU-кэш со сроком жизни записей и сохранением на диск.
+
+    Просроченные записи не удаляются сразу: их можно отдать, если источник данных недоступен.
+    """
+
+    def __init__(self, name: str, ttl: float, maxsize: int = 256, persistent: bool = True) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.persistent = persistent
+        self._data: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+        self._loaded = not persistent
+        self._lock = threading.RLock()
+
+    @property
+    def path(self) -> str:
+        """Файл, в котором хранится кэш."""
+        return os.path.join(CACHE_DIR, f"{self.name}.json")
+
+    def get(self, key: str, allow_stale: bool = False) -> Tuple[bool, Any]:
+        """Возвращает пару (найдено, значение). Просроченные записи отдаются только при allow_stale."""
+        with self._lock:
+            self._load()
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            stored_at, value = entry
+            if not allow_stale and time.time() - stored_at > self.ttl:
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key: str, value: Any) -> None:
+        """Сохраняет значение и вытесняет самые давно использованные записи сверх maxsize."""
+        self.set_many({key: value})
+
+    def set_many(self, values: Dict[str, Any]) -> None:
+        """Сохраняет несколько значений с одной записью файла на диск."""
+        if not values:
+            return
+        with self._lock:
+            self._load()
+            stored_at = time.time()
+            for key, value in values.items():
+                self._data[key] = (stored_at, value)
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            self._save()
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], Optional[Any]]) -> Optional[Any]:
+        """Отдает свежее значение из кэша или получает его через fetch.
+
+        Если fetch вернул None (источник недоступен), отдается просроченное значение, если оно есть.
+        """
+        found, value = self.get(key)
+        if found:
+            return value
+
+        value = fetch()
+        if value is not None:
+            self.set(key, value)
+            return value
+
+        found, stale = self.get(key, allow_stale=True)
+        if found:
+            logger.warning("Источник недоступен, используются устаревшие данные кэша %s для %s", self.name, key)
+            return stale
+        return None
+
+    def clear(self) -> None:
+        """Очищает кэш в памяти. Файл на диске будет перечитан при следующем обращении."""
+        with self._lock:
+            self._data.clear()
+            self._loaded = not self.persistent
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                entries = json.load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("Не удалось прочитать кэш %s: %s", self.path, e)
+            return
+        for key, stored_at, value in entries:
+            self._data[key] = (stored_at, value)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def _save(self) -> None:
+        if not self.persistent:
+            return
+        entries = [[key, stored_at, value] for key, (stored_at, value) in self._data.items()]
+        # Свой временный файл у каждого процесса: параллельные процессы не пишут в один и тот же файл
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump(entries, file, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("Не удалось сохранить кэш %s: %s", self.path, e)
+
+
+def set_persist_results(enabled: bool = True) -> None:
+    """Включает или выключает дисковый уровень для кэшей ResultCache без собственной настройки."""
+    global PERSIST_RESULTS
+    PERSIST_RESULTS = enabled
+
+
+class ResultCache:
+    """LRU-кэш вычисленных отчетов с необязательным вторым уровнем на диске.
+
+    Ключ строит вызывающий код из отпечатка содержимого выгрузки и параметров вызова (store.result_key),
+    поэтому после изменения файла старые записи просто перестают находиться. В памяти хранится до maxsize записей,
+    на диске — до disk_maxsize файлов (по файлу pickle на запись, вытесняются самые старые).
+    persistent=None — дисковый уровень по общей настройке PERSIST_RESULTS.
+    """
+
+    def __init__(
+        self, name: str, maxsize: int = 128, persistent: bool | None = None, disk_maxsize: int = 1024
+    ) -> None:
+        self.name = name
+        self.maxsize = maxsize
+        self.persistent = persistent
+        self.disk_maxsize = disk_maxsize
+        self._data: OrderedDict[str, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self) -> str:
+        """Директория дискового уровня кэша."""
+        return os.path.join(CACHE_DIR, "results", self.name)
+
+    @property
+    def on_disk(self) -> bool:
+        """Включен ли дисковый уровень."""
+        return PERSIST_RESULTS if self.persistent is None else self.persistent
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Возвращает пару (найдено, значение): сначала из памяти, затем с диска."""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                metrics.record(f"cache.{self.name}.hit", 0.0)
+                return True, self._data[key]
+
+        found, value = self._read(key) if self.on_disk else (False, None)
+        if found:
+            self._remember(key, value)
+            metrics.record(f"cache.{self.name}.disk_hit", 0.0)
+        else:
+            metrics.record(f"cache.{self.name}.miss", 0.0)
+        return found, value
+
+    def set(self, key: str, value: Any) -> None:
+        """Сохраняет значение в памяти и, если включен дисковый уровень, на диске."""
+        self._remember(key, value)
+        if self.on_disk:
+            self._write(key, value)
+
+    def get_or_compute(self, key: str | None, compute: Callable[[], Any]) -> Any:
+        """Отдает значение из кэша или вычисляет и сохраняет его. Значение общее для всех вызовов,
+        изменять его нельзя. При key=None значение вычисляется без кэша."""
+        if key is None:
+            return compute()
+        found, value = self.get(key)
+        if found:
+            return value
+        value = compute()
+        self.set(key, value)
+        return value
+
+    def clear(self) -> None:
+        """Очищает уровень в памяти. Файлы на диске не удаляются."""
+        with self._lock:
+            self._data.clear()
+
+    def _remember(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".pkl")
+
+    def _read(self, key: str) -> Tuple[bool, Any]:
+        try:
+            with open(self._path(key), "rb") as file:
+                stored_key, value = pickle.load(file)
+        except FileNotFoundError:
+            return False, None
+        except Exception as e:
+            logger.warning("Не удалось прочитать кэш %s: %s", self._path(key), e)
+            return False, None
+        return stored_key == key, value
+
+    def _write(self, key: str, value: Any) -> None:
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, "wb") as file:
+                pickle.dump((key, value), file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            self._prune()
+        except Exception as e:
+            logger.warning("Не удалось сохранить кэш %s: %s", path, e)
+
+    def _prune(self) -> None:
+        """Удаляет самые старые файлы дискового уровня сверх disk_maxsize."""
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".pkl")]
+        if len(entries) <= self.disk_maxsize:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[: len(entries) - self.disk_maxsize]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
@@ -0,0 +1,245 @@
+import glob
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src import store
+from src.metrics import span
+
+logger = logging.getLogger(__name__)
+
+TABLE = "transactions"
+# Даты хранятся строками ISO: их лексикографический порядок совпадает с хронологическим
+SQL_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+DATE_COLUMNS = ["Дата операции", "Дата платежа"]
+INDEXES = {
+    "idx_operation_date": ["Дата операции"],
+    "idx_card_date": ["Номер карты", "Дата операции"],
+    "idx_category_date": ["Категория", "Дата операции"],
+}
+TOP_TRANSACTIONS = 5
+
+CATEGORY_QUERY = f"""
+    SELECT * FROM {TABLE}
+    WHERE "Категория" = ? AND "Дата операции" BETWEEN ? AND ?
+    ORDER BY "Дата операции", rowid
+"""
+# Строки в порядке выгрузки: после index_by_date sort_index() вернет его, как для DataFrame выгрузки
+PERIOD_QUERY = f"""
+    SELECT * FROM {TABLE}
+    WHERE "Дата операции" BETWEEN ? AND ?
+    ORDER BY rowid
+"""
+# Карты в порядке первой операции за период, как при группировке DataFrame без сортировки
+CARD_TOTALS_QUERY = f"""
+    SELECT COALESCE("Номер карты", 'nan') AS card, PAIRWISE_TOTAL(rowid, "Сумма платежа") AS total
+    FROM {TABLE}
+    WHERE "Дата операции" BETWEEN ? AND ?
+    GROUP BY card
+    ORDER BY MIN(rowid)
+"""
+TOP_TRANSACTIONS_QUERY = f"""
+    SELECT card, "Дата операции", "Категория", "Сумма платежа" FROM (
+        SELECT COALESCE("Номер карты", 'nan') AS card, "Дата операции", "Категория", "Сумма платежа",
+               ROW_NUMBER() OVER (
+                   PARTITION BY COALESCE("Номер карты", 'nan') ORDER BY "Сумма платежа" DESC, rowid
+               ) AS position
+        FROM {TABLE}
+        WHERE "Дата операции" BETWEEN ? AND ? AND "Сумма платежа" IS NOT NULL
+    )
+    WHERE position <= {TOP_TRANSACTIONS}
+    ORDER BY card, position
+"""
+
+
+class PairwiseTotal:
+    """Агрегат SQLite: сумма строк в порядке выгрузки (по rowid), как Series.sum() в get_spending_data.
+
+    Встроенные SUM и TOTAL складывают последовательно и в порядке обхода индекса, и итоги расходились бы
+    с pandas в последних знаках. Пропуски (NULL) считаются нулем, сумма пустой группы — 0.0.
+    """
+
+    def __init__(self) -> None:
+        self.rows: List[Tuple[int, float]] = []
+
+    def step(self, position: int, value: float | None) -> None:
+        self.rows.append((position, 0.0 if value is None else value))
+
+    def finalize(self) -> float:
+        self.rows.sort()
+        return float(np.array([value for _, value in self.rows], dtype="float64").sum())
+
+
+_lock = threading.Lock()
+
+
+def database_path(file_path: str, digest: str) -> str:
+    """Путь к базе SQLite рядом с исходной выгрузкой. Имя зависит от содержимого выгрузки."""
+    directory, name = os.path.split(os.path.abspath(file_path))
+    return os.path.join(directory, f".{name}.{digest[:16]}.sqlite")
+
+
+def to_sql_frame(transactions: pd.DataFrame) -> pd.DataFrame:
+    """Колонки выгрузки в типах, которые SQLite хранит без потерь: даты строками ISO, пропуски — NULL.
+
+    Строки пишутся в порядке файла, поэтому rowid — номер строки в выгрузке, как индекс после index_by_date.
+    """
+    frame = transactions.sort_index().reset_index(drop=True)
+    for column in DATE_COLUMNS:
+        if column in frame and pd.api.types.is_datetime64_any_dtype(frame[column]):
+            frame[column] = frame[column].dt.strftime(SQL_DATE_FORMAT)
+    for column in store.CATEGORICAL_COLUMNS + store.TEXT_COLUMNS:
+        if column in frame:
+            frame[column] = frame[column].astype(object).where(frame[column].notna(), None)
+    for column in store.CODE_COLUMNS:
+        if column in frame:
+            frame[column] = frame[column].astype("float64")
+    return frame
+
+
+def from_sql_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """Восстанавливает типы колонок, прочитанных из SQLite, как после load_transactions."""
+    for column in DATE_COLUMNS:
+        if column in frame:
+            frame[column] = pd.to_datetime(frame[column], format=SQL_DATE_FORMAT)
+    # Колонка из одних NULL читается как object, поэтому суммы и коды приводим явно
+    for column in store.AMOUNT_COLUMNS + store.CODE_COLUMNS:
+        if column in frame:
+            frame[column] = frame[column].astype("float64")
+    return store.index_by_date(store.normalize_transactions(frame))
+
+
+def build_database(transactions: pd.DataFrame, path: str) -> None:
+    """Записывает транзакции в базу SQLite с индексами по дате операции, карте и категории.
+
+    База пишется во временный файл и подменяет прежнюю одним переименованием, поэтому другие процессы
+    не увидят ее недостроенной. Базы от прежних версий выгрузки удаляются.
+    """
+    stale = glob.glob(path[: -len(".sqlite")].rsplit(".", 1)[0] + ".*.sqlite")
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with span("load.database") as stage:
+        connection = sqlite3.connect(temporary_path)
+        try:
+            to_sql_frame(transactions).to_sql(TABLE, connection, index=False, if_exists="replace")
+            for name, columns in INDEXES.items():
+                quoted = ", ".join(f'"{column}"' for column in columns if column in transactions)
+                if quoted:
+                    connection.execute(f"CREATE INDEX {name} ON {TABLE} ({quoted})")
+            connection.commit()
+        finally:
+            connection.close()
+        os.replace(temporary_path, path)
+        stage.add(rows=len(transactions), bytes=os.path.getsize(path))
+    logger.info("База транзакций сохранена: %s", path)
+
+    for old_path in stale:
+        if old_path != path:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+
+def ensure_database(file_path: str) -> str:
+    """Путь к базе SQLite выгрузки. База строится при первом обращении и пересоздается при изменении файла.
+
+    Построенная база переживает перезапуск процесса: следующие процессы не загружают выгрузку заново.
+    """
+    path = database_path(file_path, store.file_fingerprint(file_path))
+    with _lock:
+        if not os.path.exists(path):
+            build_database(store.load_transactions(file_path), path)
+    return path
+
+
+def connect(file_path: str) -> sqlite3.Connection:
+    """Соединение с базой выгрузки только для чтения: произвольные запросы не могут изменить данные."""
+    connection = sqlite3.connect(f"file:{ensure_database(file_path)}?mode=ro", uri=True)
+    connection.create_aggregate("PAIRWISE_TOTAL", 2, PairwiseTotal)  # type: ignore[arg-type]
+    return connection
+
+
+def query(file_path: str, sql: str, params: Sequence[Any] = ()) -> pd.DataFrame:
+    """Выполняет произвольный запрос к таблице transactions выгрузки. Значения передаются в params (?)."""
+    connection = connect(file_path)
+    try:
+        with span("query.adhoc") as stage:
+            result = pd.read_sql_query(sql, connection, params=list(params))
+            stage.add(rows=len(result))
+    finally:
+        connection.close()
+    return result
+
+
+def category_transactions(file_path: str, category: str, start_date: datetime, end_date: datetime) -> pd.DataFrame:
+    """Транзакции категории за период включительно, по индексу (категория, дата операции)."""
+    connection = connect(file_path)
+    try:
+        with span("filter.category_sql") as stage:
+            frame = pd.read_sql_query(
+                CATEGORY_QUERY,
+                connection,
+                params=[category, start_date.strftime(SQL_DATE_FORMAT), end_date.strftime(SQL_DATE_FORMAT)],
+            )
+            stage.add(rows=len(frame))
+    finally:
+        connection.close()
+    return from_sql_frame(frame)
+
+
+def period_transactions(file_path: str, start_date: datetime, end_date: datetime) -> pd.DataFrame:
+    """Транзакции за период включительно, по индексу даты операции."""
+    connection = connect(file_path)
+    try:
+        with span("filter.period_sql") as stage:
+            frame = pd.read_sql_query(
+                PERIOD_QUERY,
+                connection,
+                params=[start_date.strftime(SQL_DATE_FORMAT), end_date.strftime(SQL_DATE_FORMAT)],
+            )
+            stage.add(rows=len(frame))
+    finally:
+        connection.close()
+    return from_sql_frame(frame)
+
+
+def spending_data(file_path: str, end_date: datetime) -> Dict[str, Dict[str, Any]]:
+    """Сумма расходов, кешбэк и топ-5 транзакций по каждой карте с начала месяца, запросами к базе.
+
+    Результат совпадает с get_spending_data без куба дневных сумм по той же выгрузке.
+    """
+    params = [end_date.replace(day=1).strftime(SQL_DATE_FORMAT), end_date.strftime(SQL_DATE_FORMAT)]
+    connection = connect(file_path)
+    try:
+        with span("aggregate.card_totals_sql"):
+            totals = connection.execute(CARD_TOTALS_QUERY, params).fetchall()
+        with span("aggregate.top_transactions_sql"):
+            top_rows = connection.execute(TOP_TRANSACTIONS_QUERY, params).fetchall()
+    finally:
+        connection.close()
+
+    top_records: Dict[str, List[Dict[str, Any]]] = {card_number: [] for card_number, _ in totals}
+    for card_number, operation_date, category, amount in top_rows:
+        top_records[card_number].append(
+            {
+                "Дата операции": pd.Timestamp(operation_date),
+                "Категория": category if category is not None else float("nan"),
+                "Сумма платежа": amount,
+            }
+        )
+
+    card_data: Dict[str, Dict[str, Any]] = {}
+    for card_number, total_spent in totals:
+        card_data[card_number] = {
+            "last_4_digits": card_number[-4:],
+            "total_spent": total_spent,
+            "cashback": store.cashback(total_spent),
+            "top_transactions": top_records[card_number],
+        }
+    return card_data
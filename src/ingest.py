@@ -0,0 +1,278 @@
+import glob
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List
+
+import numpy as np
+import pandas as pd
+
+from src.store import STORE_MANIFEST, feather, index_by_date, load_transactions, select_period
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: загрузки из разных процессов не блокируются
+    fcntl = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+INGEST_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "ingested")
+
+# Колонки, по которым строка выписки считается той же самой операцией
+FINGERPRINT_COLUMNS = ["Дата операции", "Номер карты", "Сумма платежа", "Описание"]
+
+CARD_MONTHLY_KEYS = ["Номер карты", "Месяц"]
+CATEGORY_DAILY_KEYS = ["Категория", "День"]
+LOCK_FILE = ".lock"  # файл-замок, на котором загрузки из разных процессов ждут друг друга
+
+
+def fingerprint_rows(transactions: pd.DataFrame) -> np.ndarray:
+    """Отпечатки строк по дате, карте, сумме и описанию.
+
+    Одинаковые строки внутри выписки нумеруются, чтобы две одинаковые покупки не склеились в одну.
+    """
+    columns = [column for column in FINGERPRINT_COLUMNS if column in transactions]
+    hashes = pd.util.hash_pandas_object(transactions[columns].astype(str), index=False).to_numpy()
+    occurrence = pd.Series(hashes).groupby(hashes).cumcount().to_numpy()
+    fingerprints: np.ndarray = pd.util.hash_array(
+        hashes ^ (occurrence.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15))
+    )
+    return fingerprints
+
+
+def card_monthly_totals(transactions: pd.DataFrame) -> pd.DataFrame:
+    """Суммы платежей и кешбэка по картам и месяцам."""
+    frame = pd.DataFrame(
+        {
+            "Номер карты": transactions["Номер карты"].astype(str).to_numpy(),
+            "Месяц": transactions["Дата операции"].dt.to_period("M").dt.to_timestamp().to_numpy(),
+            "Сумма платежа": transactions["Сумма платежа"].fillna(0).to_numpy(),
+            "Кэшбэк": transactions.get("Кэшбэк", pd.Series(0.0, index=transactions.index)).fillna(0).to_numpy(),
+            "Количество операций": 1,
+        }
+    )
+    return frame.groupby(CARD_MONTHLY_KEYS, as_index=False).sum()
+
+
+def category_daily_totals(transactions: pd.DataFrame) -> pd.DataFrame:
+    """Суммы платежей по категориям и дням."""
+    frame = pd.DataFrame(
+        {
+            "Категория": transactions["Категория"].astype(str).to_numpy(),
+            "День": transactions["Дата операции"].dt.normalize().to_numpy(),
+            "Сумма платежа": transactions["Сумма платежа"].fillna(0).to_numpy(),
+            "Количество операций": 1,
+        }
+    )
+    return frame.groupby(CATEGORY_DAILY_KEYS, as_index=False).sum()
+
+
+def merge_totals(current: pd.DataFrame | None, delta: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+    """Добавляет агрегаты по новым строкам к накопленным."""
+    if current is None or current.empty:
+        return delta
+    return pd.concat([current, delta], ignore_index=True).groupby(keys, as_index=False).sum()
+
+
+# Агрегаты хранилища: имя -> (расчет по строкам, ключи группировки)
+AGGREGATES = {
+    "card_monthly": (card_monthly_totals, CARD_MONTHLY_KEYS),
+    "category_daily": (category_daily_totals, CATEGORY_DAILY_KEYS),
+}
+
+
+class CardMonthlyTotals:
+    """Итоги по картам за период из агрегата хранилища по картам и месяцам.
+
+    Для периода внутри одного месяца из суммы за месяц вычитаются строки месяца до начала и после конца
+    периода, поэтому строки нужны только для краев месяца. Суммы совпадают с расчетом по строкам
+    с точностью до округления float. Период из нескольких месяцев считается по строкам.
+    """
+
+    def __init__(self, card_monthly: pd.DataFrame, transactions: pd.DataFrame) -> None:
+        self.card_monthly = card_monthly
+        self.transactions = transactions
+
+    def totals(self, start_date: datetime, end_date: datetime, by: str = "Номер карты") -> pd.DataFrame:
+        """Суммы и количество операций по картам за период [start_date, end_date], как SpendingCube.totals."""
+        if by != "Номер карты":
+            raise ValueError(f"Агрегат по картам и месяцам не содержит разреза {by}")
+        columns = ["Сумма платежа", "Количество операций"]
+        start = pd.Timestamp(start_date)
+        end = pd.Timestamp(end_date)
+        month = start.to_period("M")
+        if month != end.to_period("M"):
+            return card_monthly_totals(select_period(self.transactions, start, end)).groupby(by)[columns].sum()
+
+        month_start = month.to_timestamp()
+        month_end = (month + 1).to_timestamp() - pd.Timedelta(1, unit="ns")
+        monthly = self.card_monthly[self.card_monthly["Месяц"] == month_start].set_index(by)[columns]
+        outside = pd.concat(
+            [
+                select_period(self.transactions, month_start, start - pd.Timedelta(1, unit="ns")),
+                select_period(self.transactions, end + pd.Timedelta(1, unit="ns"), month_end),
+            ]
+        )
+        if outside.empty:
+            return monthly
+        totals = monthly.sub(card_monthly_totals(outside).groupby(by)[columns].sum(), fill_value=0)
+        return totals[totals["Количество операций"] > 0]
+
+
+class IncrementalStore:
+    """Накопительное хранилище выписок.
+
+    Каждая загрузка дописывает только новые строки отдельной частью (Feather) и обновляет агрегаты
+    по картам/месяцам и категориям/дням, не пересчитывая историю.
+    """
+
+    def __init__(self, directory: str = INGEST_DIR) -> None:
+        if feather is None:
+            raise RuntimeError("Для инкрементальной загрузки нужен пакет pyarrow")
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.directory, STORE_MANIFEST)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Запись в хранилище: одна на процесс (threading.Lock) и одна на все процессы (flock на файле-замке)."""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, LOCK_FILE), "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _read_manifest(self) -> Dict:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as file:
+                manifest: Dict = json.load(file)
+        except FileNotFoundError:
+            return {"parts": []}
+        return manifest
+
+    def _write_manifest(self, manifest: Dict) -> None:
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(manifest, file, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _write_feather(self, frame: pd.DataFrame, name: str) -> None:
+        """Пишет файл хранилища целиком или не пишет вовсе: через временный файл и переименование."""
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        feather.write_feather(frame, tmp_path)
+        os.replace(tmp_path, path)
+
+    def _read_aggregate(self, name: str, manifest: Dict | None = None) -> pd.DataFrame | None:
+        """Агрегат той версии, что указана в манифесте.
+
+        Хранилище без версий агрегатов в манифесте (записанное до их введения) пересчитывает агрегат по частям:
+        прежний файл агрегата мог учесть строки, не попавшие в манифест.
+        """
+        manifest = self._read_manifest() if manifest is None else manifest
+        aggregates = manifest.get("aggregates")
+        if aggregates is None:
+            if not manifest["parts"]:
+                return None
+            return AGGREGATES[name][0](self._read_parts(manifest))
+        return feather.read_feather(os.path.join(self.directory, aggregates[name]))
+
+    def fingerprints(self, manifest: Dict | None = None) -> np.ndarray:
+        """Отпечатки всех загруженных строк (читается только одна колонка частей)."""
+        manifest = self._read_manifest() if manifest is None else manifest
+        parts = []
+        for part in manifest["parts"]:
+            path = os.path.join(self.directory, part["file"])
+            parts.append(feather.read_table(path, columns=["fingerprint"], memory_map=True)["fingerprint"].to_numpy())
+        return np.concatenate(parts) if parts else np.array([], dtype=np.uint64)
+
+    def ingest(self, file_path: str) -> int:
+        """Загружает выписку и дописывает строки, которых еще нет в хранилище. Возвращает число новых строк."""
+        # Строки дописываются в порядке выписки, а не в порядке дат загруженной выгрузки
+        return self.ingest_frame(load_transactions(file_path).sort_index(), source=os.path.basename(file_path))
+
+    def ingest_frame(self, transactions: pd.DataFrame, source: str = "") -> int:
+        """Дописывает новые строки из DataFrame с приведенными типами.
+
+        Часть и новые версии агрегатов пишутся в отдельные файлы, а данными хранилища они становятся только
+        с заменой манифеста. Если процесс прервется раньше, манифест указывает на прежние файлы, и повторная
+        загрузка не учтет строки дважды. Параллельные загрузки (в том числе из разных процессов) идут по очереди.
+        """
+        with self._locked():
+            manifest = self._read_manifest()
+            fingerprints = fingerprint_rows(transactions)
+            is_new = ~np.isin(fingerprints, self.fingerprints(manifest))
+            new_rows = transactions.iloc[is_new].reset_index(drop=True)
+            if new_rows.empty:
+                logger.info("Новых строк в выписке %s нет.", source)
+                return 0
+
+            version = len(manifest["parts"]) + 1
+            part_file = f"part-{version:05d}.feather"
+            self._write_feather(new_rows.assign(fingerprint=fingerprints[is_new]), part_file)
+
+            previous = manifest.get("aggregates", {})
+            aggregates = {}
+            for name, (build, keys) in AGGREGATES.items():
+                aggregates[name] = f"{name}-{version:05d}.feather"
+                self._write_feather(
+                    merge_totals(self._read_aggregate(name, manifest), build(new_rows), keys), aggregates[name]
+                )
+
+            manifest["parts"].append({"file": part_file, "source": source, "rows": len(new_rows)})
+            manifest["aggregates"] = aggregates
+            self._write_manifest(manifest)
+            self._remove_stale_aggregates(keep=set(aggregates.values()) | set(previous.values()))
+
+            logger.info("Из выписки %s добавлено %d новых строк.", source, len(new_rows))
+            return len(new_rows)
+
+    def _remove_stale_aggregates(self, keep: set) -> None:
+        """Удаляет старые версии агрегатов. Предыдущая остается для читателей, успевших прочитать прежний манифест."""
+        for name in AGGREGATES:
+            for path in glob.glob(os.path.join(self.directory, f"{name}*.feather")):
+                if os.path.basename(path) not in keep:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    def read_parts(self) -> pd.DataFrame:
+        """Все накопленные транзакции в порядке загрузки: части по очереди, строки внутри части — как в выписке."""
+        return self._read_parts(self._read_manifest())
+
+    def _read_parts(self, manifest: Dict) -> pd.DataFrame:
+        parts = [feather.read_feather(os.path.join(self.directory, part["file"])) for part in manifest["parts"]]
+        if not parts:
+            return pd.DataFrame()
+        return pd.concat(parts, ignore_index=True).drop(columns="fingerprint")
+
+    def load(self) -> pd.DataFrame:
+        """Все накопленные транзакции, отсортированные по дате операции."""
+        transactions = self.read_parts()
+        return transactions if transactions.empty else index_by_date(transactions)
+
+    def card_totals(self, transactions: pd.DataFrame) -> CardMonthlyTotals:
+        """Итоги по картам за период для get_spending_data: из агрегата по месяцам и строк transactions."""
+        return CardMonthlyTotals(self.card_monthly(), transactions)
+
+    def card_monthly(self) -> pd.DataFrame:
+        """Суммы платежей и кешбэка по картам и месяцам."""
+        card_monthly = self._read_aggregate("card_monthly")
+        return pd.DataFrame(columns=CARD_MONTHLY_KEYS) if card_monthly is None else card_monthly
+
+    def category_daily(self) -> pd.DataFrame:
+        """Суммы платежей по категориям и дням."""
+        category_daily = self._read_aggregate("category_daily")
+        return pd.DataFrame(columns=CATEGORY_DAILY_KEYS) if category_daily is None else category_daily
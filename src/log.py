@@ -0,0 +1,143 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict
+
+LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs")
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+class LazyFileHandler(logging.FileHandler):
+    """Файловый обработчик, который создает директорию и открывает (с mode="w" — очищает) файл лога
+    только при первой записи.
+
+    Импорт модуля с таким обработчиком не трогает диск, поэтому команды, которые ничего не пишут
+    в лог, не создают и не очищают файлы логов.
+    """
+
+    def __init__(self, filename: str, mode: str = "w") -> None:
+        super().__init__(os.path.join(LOG_DIR, filename), mode=mode, encoding="utf-8", delay=True)
+        self.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    def _open(self):  # type: ignore[no-untyped-def]
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+class RouteHandler(logging.Handler):
+    """Передает записи из очереди обработчику по имени логгера, остальные — обработчику по умолчанию."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.routes: Dict[str, logging.Handler] = {}
+        self.default: logging.Handler | None = None
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        handler = self.routes.get(record.name, self.default)
+        if handler is not None and record.levelno >= handler.level:
+            handler.handle(record)
+        return True
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.handle(record)
+
+
+class AsyncQueueHandler(QueueHandler):
+    """Кладет запись в общую очередь без форматирования и запускает фоновый поток при первой записи."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Очередь не покидает процесс, поэтому запись не нужно готовить к передаче:
+        # сообщение отформатирует обработчик в потоке записи
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if _direct:
+            router.handle(record)
+            return
+        start_listener()
+        _queue.put_nowait(record)
+
+
+# Общая очередь логов всех модулей: логгеры только кладут в нее записи, а форматирование сообщений
+# и запись в файлы и stderr выполняет фоновый поток, поэтому ввод-вывод не задерживает обработку запросов
+_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+router = RouteHandler()
+queue_handler = AsyncQueueHandler(_queue)
+file_handlers: Dict[str, LazyFileHandler] = {}
+
+_listener: QueueListener | None = None
+_lock = threading.Lock()
+_direct = False  # писать без очереди (в дочерних процессах пула)
+
+
+def start_listener() -> None:
+    """Запускает фоновый поток записи логов, если он еще не запущен."""
+    global _listener
+    if _listener is not None:
+        return
+    with _lock:
+        if _listener is None:
+            listener = QueueListener(_queue, router)
+            listener.start()
+            _listener = listener
+
+
+def stop_listener() -> None:
+    """Дописывает записи, оставшиеся в очереди, и останавливает фоновый поток."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+    for handler in file_handlers.values():
+        handler.flush()
+
+
+def _after_fork() -> None:
+    # Поток записи не переходит в дочерний процесс, а процессы пула завершаются через os._exit
+    # без atexit, поэтому в них записи пишутся сразу, без очереди
+    global _direct, _listener, _lock
+    _direct = True
+    _listener = None
+    _lock = threading.Lock()
+    for handler in file_handlers.values():
+        handler.mode = "a"  # файл лога уже начат родительским процессом
+
+
+atexit.register(stop_listener)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def file_logger(name: str, filename: str, level: int | None = None) -> logging.Logger:
+    """Логгер, который пишет только в файл filename через общую очередь, без передачи сообщений
+    корневому логгеру. Логгеры с одинаковым filename пишут в один файл."""
+    if filename not in file_handlers:
+        file_handlers[filename] = LazyFileHandler(filename)
+    router.routes[name] = file_handlers[filename]
+
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    if queue_handler not in logger.handlers:
+        logger.addHandler(queue_handler)
+    if level is not None:
+        logger.setLevel(level)
+    return logger
+
+
+def setup_logging(level: int = logging.INFO) -> None:
+    """Настраивает корневой логгер для запуска из командной строки: записи идут через общую очередь в stderr.
+
+    Как и logging.basicConfig, ничего не меняет, если у корневого логгера уже есть обработчики.
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return
+    stderr_handler = logging.StreamHandler()
+    stderr_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    router.default = stderr_handler
+    root.addHandler(queue_handler)
+    root.setLevel(level)
@@ -1,12 +1,84 @@
+import argparse
+import gzip
+import importlib
+import json
 import os
+import sys
 import time
+from datetime import datetime
+from typing import IO, TYPE_CHECKING, Any, Iterable, List
 
-from src.reports import spending_by_category
-from src.services import find_transactions_with_phone_numbers
-from src.views import generate_report, get_greeting
+from src.log import setup_logging
+from src.metrics import PROFILE_MODES, capture, metrics, span
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from src import cache, database, multifile
+    from src.ingest import IncrementalStore
+    from src.reports import iter_json_records, spending_by_categories, spending_by_category
+    from src.services import PhoneIndex, find_transactions_by_phone, find_transactions_with_phone_numbers
+    from src.store import format_dates
+    from src.views import generate_report, get_greeting
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 FILE_PATH = os.path.join(BASE_DIR, "..", "data", "operations.xlsx")
+SETTINGS_PATH = os.path.join(BASE_DIR, "..", "user_settings.json")
+STORE_PATH = os.path.join(BASE_DIR, "..", "data", "ingested")  # совпадает с src.ingest.INGEST_DIR
+
+OUTPUT_FORMATS = ("json", "compact", "ndjson")  # совпадает с src.reports.OUTPUT_FORMATS
+DEFAULT_CURRENCY = "RUB"  # совпадает с src.rates.BASE_CURRENCY
+ENGINES = ("pandas", "sqlite")  # pandas — выборки по DataFrame в памяти, sqlite — запросы к базе src.database
+
+# pandas, requests и модули отчетов загружаются не при импорте main, а при первом обращении:
+# справка и разбор аргументов обходятся без них. Имя -> (модуль, атрибут; None — сам модуль)
+LAZY_IMPORTS = {
+    "pd": ("pandas", None),
+    "cache": ("src.cache", None),
+    "database": ("src.database", None),
+    "IncrementalStore": ("src.ingest", "IncrementalStore"),
+    "multifile": ("src.multifile", None),
+    "iter_json_records": ("src.reports", "iter_json_records"),
+    "spending_by_categories": ("src.reports", "spending_by_categories"),
+    "spending_by_category": ("src.reports", "spending_by_category"),
+    "PhoneIndex": ("src.services", "PhoneIndex"),
+    "find_transactions_by_phone": ("src.services", "find_transactions_by_phone"),
+    "find_transactions_with_phone_numbers": ("src.services", "find_transactions_with_phone_numbers"),
+    "format_dates": ("src.store", "format_dates"),
+    "generate_report": ("src.views", "generate_report"),
+    "get_greeting": ("src.views", "get_greeting"),
+}
+
+# Что нужно каждой подкоманде: views (а с ним HTTP-клиент) загружает только main_page
+COMMAND_IMPORTS = {
+    "main_page": ("generate_report",),
+    "filtered_by_phone": ("find_transactions_by_phone", "find_transactions_with_phone_numbers"),
+    "report": ("spending_by_category", "iter_json_records"),
+    "report_batch": ("spending_by_categories", "iter_json_records"),
+    "query": ("database", "iter_json_records"),
+    "ingest": ("IncrementalStore",),
+}
+
+
+def __getattr__(name: str) -> Any:
+    """Загружает имя из LAZY_IMPORTS при первом обращении к атрибуту модуля."""
+    if name not in LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, attribute = LAZY_IMPORTS[name]
+    module = importlib.import_module(module_name)
+    value = module if attribute is None else getattr(module, attribute)
+    globals()[name] = value
+    return value
+
+
+def require(*names: str) -> None:
+    """Загружает имена из LAZY_IMPORTS, которые нужны команде.
+
+    Уже загруженные (или подмененные в тестах) имена не перезаписываются.
+    """
+    for name in names:
+        if name not in globals():
+            __getattr__(name)
 
 
 def main() -> None:
@@ -17,11 +89,13 @@ def main() -> None:
     1. main_page — генерация отчета по дате.
     2. filtered_by_phone — поиск транзакций с номерами телефонов.
     3. report — получение списка трат по категории за три месяца.
+    4. report_batch — суммы трат по нескольким категориям за три месяца до каждой из дат.
 
     """
+    require(*LAZY_IMPORTS)
     try:
         print(get_greeting())
-        print("Доступные команды: 1 - main_page, 2 - filtered_by_phone, 3 - report")
+        print("Доступные команды: 1 - main_page, 2 - filtered_by_phone, 3 - report, 4 - report_batch")
         user_input = input("Введите цифру или название интересующей команды: ").strip().lower()
 
         if user_input in ("main_page", "1"):
@@ -38,9 +112,7 @@ def main() -> None:
 
         elif user_input in ("filtered_by_phone", "2"):
             print("Обращение к файлу с данными: data/operations.xlsx")
-            time.sleep(2)
             print("Подготовка вывода отфильтрованных данных (операция содержит в описании номер телефона)")
-            time.sleep(2)
             try:
                 result = find_transactions_with_phone_numbers(FILE_PATH)
                 print(result)
@@ -60,12 +132,277 @@ def main() -> None:
             except ValueError:
                 print("Ошибка: Некорректный формат даты. Пожалуйста, используйте формат 'ДД.ММ.ГГГГ'.")
 
+        elif user_input in ("report_batch", "4"):
+            print("Введите категории через запятую или нажмите Enter, чтобы получить отчет по всем категориям.")
+            categories_input = input("Категории: ").strip()
+            categories = [item.strip() for item in categories_input.split(",") if item.strip()] or None
+            print("Введите даты окончания периодов через запятую в формате 'ДД.ММ.ГГГГ'.")
+            print("Значение по умолчанию: 31.12.2021")
+            dates_input = input("Для продолжения введите свои даты или нажмите Enter: ").strip()
+            dates = [item.strip() for item in dates_input.split(",") if item.strip()] or ["31.12.2021"]
+            try:
+                for date in dates:
+                    time.strptime(date, "%d.%m.%Y")
+                print(spending_by_categories(FILE_PATH, categories, dates))
+            except ValueError:
+                print("Ошибка: Некорректный формат даты. Пожалуйста, используйте формат 'ДД.ММ.ГГГГ'.")
+
         else:
-            print("Ошибка: Неверная команда. Пожалуйста, введите 1, 2 или 3.")
+            print("Ошибка: Неверная команда. Пожалуйста, введите 1, 2, 3 или 4.")
 
     except Exception as e:
         print(f"Произошла ошибка: {e}")
 
 
+def parse_date(value: str) -> str:
+    """Проверяет дату в формате ДД.ММ.ГГГГ для аргументов командной строки."""
+    try:
+        time.strptime(value, "%d.%m.%Y")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"некорректная дата '{value}', используйте формат ДД.ММ.ГГГГ")
+    return value
+
+
+def parse_datetime(value: str) -> str:
+    """Проверяет дату и время в формате ГГГГ-ММ-ДД ЧЧ:ММ:СС для аргументов командной строки."""
+    try:
+        time.strptime(value, "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"некорректная дата '{value}', используйте формат ГГГГ-ММ-ДД ЧЧ:ММ:СС")
+    return value
+
+
+def parse_currency(value: str) -> str | None:
+    """Код валюты для пересчета сумм; "none" — без пересчета, суммы как в выписке."""
+    return None if value.lower() == "none" else value.upper()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Парсер аргументов неинтерактивного режима: по подкоманде на каждую команду меню."""
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "-i",
+        "--input",
+        default=FILE_PATH,
+        help="путь к выгрузке (.xlsx), директории или шаблону glob с выгрузками либо к хранилищу команды ingest",
+    )
+    common.add_argument(
+        "-j", "--jobs", type=int, help="число процессов для нескольких выгрузок (по умолчанию — все ядра)"
+    )
+    common.add_argument(
+        "-o", "--output", default="-", help="файл для результата; '-' — стандартный вывод, *.gz — сжатие gzip"
+    )
+    common.add_argument("-f", "--format", choices=OUTPUT_FORMATS, default="json", help="формат JSON-вывода")
+    common.add_argument("--metrics", help="сохранить время и счетчики по этапам: *.prom — Prometheus, иначе JSON")
+    common.add_argument("--profile", choices=PROFILE_MODES, help="профилирование команды (результат в logs/profiles)")
+    common.add_argument(
+        "--result-cache", action="store_true", help="сохранять вычисленные отчеты на диск для следующих запусков"
+    )
+
+    parser = argparse.ArgumentParser(prog="python -m src.main", description="Анализ банковских операций.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    main_page = commands.add_parser("main_page", parents=[common], help="отчет по картам на дату")
+    main_page.add_argument(
+        "--date", type=parse_datetime, help="дата отчета ГГГГ-ММ-ДД ЧЧ:ММ:СС (по умолчанию — текущий момент)"
+    )
+    main_page.add_argument("--settings", default=SETTINGS_PATH, help="путь к файлу пользовательских настроек")
+    main_page.add_argument("--engine", choices=ENGINES, default="pandas", help="способ расчета расходов по картам")
+    main_page.add_argument(
+        "--currency",
+        type=parse_currency,
+        default=DEFAULT_CURRENCY,
+        help="валюта сумм: пересчет по курсу на дату операции (по умолчанию RUB; none — суммы как в выписке)",
+    )
+
+    filtered_by_phone = commands.add_parser(
+        "filtered_by_phone", parents=[common], help="транзакции с номерами телефонов в описании"
+    )
+    filtered_by_phone.add_argument("--phone", help="искать только операции с этим номером")
+
+    report = commands.add_parser("report", parents=[common], help="траты по категории за три месяца")
+    report.add_argument("--category", required=True, help="категория трат")
+    report.add_argument("--date", type=parse_date, help="дата ДД.ММ.ГГГГ (по умолчанию — сегодня)")
+    report.add_argument("--engine", choices=ENGINES, default="pandas", help="способ выборки транзакций")
+
+    report_batch = commands.add_parser(
+        "report_batch", parents=[common], help="суммы трат по категориям за три месяца до каждой из дат"
+    )
+    report_batch.add_argument("--categories", nargs="*", help="категории (по умолчанию — все)")
+    report_batch.add_argument("--dates", nargs="+", type=parse_date, required=True, help="даты ДД.ММ.ГГГГ")
+
+    query = commands.add_parser(
+        "query", parents=[common], help="произвольный SQL-запрос к таблице transactions (только чтение)"
+    )
+    query.add_argument("sql", help='запрос, например: SELECT "Категория", COUNT(*) FROM transactions GROUP BY 1')
+    query.add_argument("-p", "--param", action="append", default=[], help="значение для параметра ? в запросе")
+
+    ingest = commands.add_parser(
+        "ingest", parents=[common], help="дописать новые строки выгрузок в накопительное хранилище"
+    )
+    ingest.add_argument(
+        "--store", default=STORE_PATH, help="каталог хранилища; его можно передать в -i другим командам"
+    )
+
+    return parser
+
+
+def reformat_json(text: str, output_format: str) -> Iterable[str]:
+    """Переводит готовый JSON-ответ в нужный формат вывода."""
+    if output_format == "json":
+        return [text, "\n"]
+    data = json.loads(text)
+    if output_format == "ndjson" and isinstance(data, list):
+        return [json.dumps(record, ensure_ascii=False) + "\n" for record in data]
+    return [json.dumps(data, ensure_ascii=False), "\n"]
+
+
+def write_output(parts: Iterable[str], output: str) -> None:
+    """Записывает результат в файл (с gzip для *.gz) или в стандартный вывод."""
+    if output == "-":
+        write_parts(parts, sys.stdout)
+        return
+    file: IO[str] = (
+        gzip.open(output, "wt", encoding="utf-8") if output.endswith(".gz") else open(output, "w", encoding="utf-8")
+    )
+    with file:
+        write_parts(parts, file)
+
+
+def write_parts(parts: Iterable[str], file: IO[str]) -> None:
+    """Пишет части результата с замером этапа сериализации и вывода."""
+    with span("serialize.output") as stage:
+        for part in parts:
+            file.write(part)
+            stage.add(bytes=len(part))
+
+
+def cli(argv: List[str]) -> int:
+    """Неинтерактивный запуск команды по аргументам командной строки. Возвращает код завершения.
+
+    Подходит для cron и планировщиков: без ввода с клавиатуры и пауз, ошибки пишутся в stderr.
+    """
+    args = build_parser().parse_args(argv)
+    if args.result_cache:
+        require("cache")
+        cache.set_persist_results(True)
+    with capture(args.command, args.profile):
+        exit_code = run_command(args)
+    if args.metrics:
+        metrics.save(args.metrics)
+    return exit_code
+
+
+def run_command(args: argparse.Namespace) -> int:
+    """Выполняет команду по разобранным аргументам."""
+    require("multifile", *COMMAND_IMPORTS[args.command])
+    if args.command == "ingest":
+        return run_ingest(args)
+    if multifile.is_multi_source(args.input):
+        if args.command == "query":
+            print("Ошибка: Запрос выполняется по одной выгрузке, а не по директории или шаблону", file=sys.stderr)
+            return 1
+        return run_multi(args)
+
+    if args.command == "main_page":
+        date = args.date or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        text = generate_report(
+            date, file_path=args.input, settings_path=args.settings, engine=args.engine, currency=args.currency
+        )
+        write_output(reformat_json(text, args.format), args.output)
+        return 1 if "error" in json.loads(text) else 0
+
+    if not os.path.exists(args.input):
+        print(f"Ошибка: Файл с данными не найден: {args.input}", file=sys.stderr)
+        return 1
+
+    if args.command == "filtered_by_phone":
+        if args.phone:
+            text = find_transactions_by_phone(args.input, args.phone)
+        else:
+            text = find_transactions_with_phone_numbers(args.input)
+        if text is None:
+            print(f"Ошибка: Не удалось прочитать файл: {args.input}", file=sys.stderr)
+            return 1
+        write_output(reformat_json(text, args.format), args.output)
+        return 0
+
+    # Недекорированные функции: результат пишется в --output, а не в файл отчета относительно рабочей папки
+    if args.command == "report":
+        result = spending_by_category.__wrapped__(  # type: ignore[attr-defined]
+            args.input, args.category, args.date, args.engine
+        )
+    elif args.command == "query":
+        try:
+            result = database.query(args.input, args.sql, args.param)
+        except Exception as e:
+            print(f"Ошибка в запросе: {e}", file=sys.stderr)
+            return 1
+    else:
+        result = spending_by_categories.__wrapped__(  # type: ignore[attr-defined]
+            args.input, args.categories or None, args.dates
+        )
+    write_output(iter_json_records(result, args.format), args.output)
+    return 0
+
+
+def run_ingest(args: argparse.Namespace) -> int:
+    """Дописывает в хранилище новые строки выгрузки (или всех выгрузок директории либо шаблона glob).
+
+    Результат — число добавленных строк по каждому файлу.
+    """
+    paths = multifile.statement_paths(args.input) if multifile.is_multi_source(args.input) else [args.input]
+    if not paths or not all(os.path.isfile(path) for path in paths):
+        print(f"Ошибка: Выгрузки не найдены: {args.input}", file=sys.stderr)
+        return 1
+
+    store = IncrementalStore(args.store)
+    added = {os.path.basename(path): store.ingest(path) for path in paths}
+    write_output(reformat_json(json.dumps({"added": added}, ensure_ascii=False, indent=4), args.format), args.output)
+    return 0
+
+
+def run_multi(args: argparse.Namespace) -> int:
+    """Выполняет команду по всем выгрузкам директории или шаблона glob и объединяет результаты.
+
+    Для main_page отчет содержит только валюту сумм и раздел spending_data: курсы и котировки не зависят
+    от выгрузок.
+    """
+    require("pd", "PhoneIndex", "format_dates", "iter_json_records")
+    if not multifile.statement_paths(args.input):
+        print(f"Ошибка: Выгрузки не найдены: {args.input}", file=sys.stderr)
+        return 1
+
+    if args.command == "main_page":
+        end_date = pd.to_datetime(args.date or datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        try:
+            currency, spending_data = multifile.spending_data_for_files(
+                args.input, end_date, max_workers=args.jobs, currency=args.currency
+            )
+        except LookupError as e:
+            write_output(reformat_json(json.dumps({"error": str(e)}, ensure_ascii=False), args.format), args.output)
+            return 1
+        text = json.dumps({"currency": currency, "spending_data": spending_data}, ensure_ascii=False, indent=4)
+        write_output(reformat_json(text, args.format), args.output)
+    elif args.command == "filtered_by_phone":
+        transactions = multifile.phone_transactions_for_files(args.input, max_workers=args.jobs)
+        if args.phone and not transactions.empty:
+            transactions = transactions.iloc[PhoneIndex(transactions).lookup(args.phone)]
+        text = format_dates(transactions).to_json(orient="records", force_ascii=False, indent=4)
+        write_output(reformat_json(text, args.format), args.output)
+    elif args.command == "report":
+        result = multifile.category_report_for_files(args.input, args.category, args.date, max_workers=args.jobs)
+        write_output(iter_json_records(result, args.format), args.output)
+    else:
+        result = multifile.categories_report_for_files(
+            args.input, args.categories or None, args.dates, max_workers=args.jobs
+        )
+        write_output(iter_json_records(result, args.format), args.output)
+    return 0
+
+
 if __name__ == "__main__":
+    setup_logging()
+    if len(sys.argv) > 1:
+        sys.exit(cli(sys.argv[1:]))
     main()
@@ -0,0 +1,164 @@
+import io
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import ContextManager, Dict, Iterator
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs", "profiles")
+PROFILE_MODES = ("cprofile", "tracemalloc")
+PROFILE_TOP = 20  # строк в сводке профиля
+
+
+@dataclass
+class StageStats:
+    """Накопленные показатели одного этапа: число вызовов, время, обработанные строки и байты."""
+
+    calls: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+    rows: int = 0
+    bytes: int = 0
+
+
+class Span:
+    """Текущий замер этапа. Счетчики строк и байтов заполняет код внутри блока span."""
+
+    def __init__(self, stage: str) -> None:
+        self.stage = stage
+        self.rows = 0
+        self.bytes = 0
+
+    def add(self, rows: int = 0, bytes: int = 0) -> None:
+        self.rows += rows
+        self.bytes += bytes
+
+
+class Metrics:
+    """Время и счетчики по этапам формирования отчетов (загрузка, разбор дат, фильтрация, агрегация,
+    HTTP-запросы, сериализация). Потокобезопасно, показатели накапливаются за время жизни процесса."""
+
+    def __init__(self) -> None:
+        self._stages: Dict[str, StageStats] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[Span]:
+        """Замеряет время блока и записывает его в показатели этапа stage, в том числе при исключении."""
+        span = Span(stage)
+        started = time.perf_counter()
+        try:
+            yield span
+        finally:
+            self.record(stage, time.perf_counter() - started, span.rows, span.bytes)
+
+    def record(self, stage: str, seconds: float, rows: int = 0, bytes: int = 0) -> None:
+        with self._lock:
+            stats = self._stages.setdefault(stage, StageStats())
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.rows += rows
+            stats.bytes += bytes
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Копия показателей по этапам."""
+        with self._lock:
+            return {stage: asdict(stats) for stage, stats in sorted(self._stages.items())}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=4)
+
+    def to_prometheus(self) -> str:
+        """Показатели в текстовом формате Prometheus."""
+        snapshot = self.snapshot()
+        series = [
+            ("report_stage_calls_total", "counter", "Число выполнений этапа", "calls"),
+            ("report_stage_seconds_total", "counter", "Суммарное время этапа, с", "seconds"),
+            ("report_stage_seconds_max", "gauge", "Наибольшее время одного выполнения этапа, с", "max_seconds"),
+            ("report_stage_rows_total", "counter", "Строк обработано на этапе", "rows"),
+            ("report_stage_bytes_total", "counter", "Байтов обработано на этапе", "bytes"),
+        ]
+        lines = []
+        for name, metric_type, description, field in series:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for stage, stats in snapshot.items():
+                lines.append(f'{name}{{stage="{stage}"}} {stats[field]}')
+        return "\n".join(lines) + "\n"
+
+    def save(self, path: str) -> None:
+        """Сохраняет показатели в файл: *.prom — в формате Prometheus, иначе в JSON."""
+        text = self.to_prometheus() if path.endswith(".prom") else self.to_json()
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(text)
+
+
+metrics = Metrics()
+
+
+def span(stage: str) -> ContextManager[Span]:
+    """Замер этапа в общих показателях процесса."""
+    return metrics.span(stage)
+
+
+@contextmanager
+def capture(name: str, mode: str | None = None) -> Iterator[None]:
+    """Профилирование блока по запросу: mode="cprofile" или "tracemalloc", None — без профилирования.
+
+    Результат сохраняется в logs/profiles/<name>.prof (cProfile) или <name>.tracemalloc.txt,
+    а краткая сводка пишется в лог.
+    """
+    if mode is None:
+        yield
+        return
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Неизвестный режим профилирования: {mode}")
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    if mode == "cprofile":
+        # cProfile и pstats заметно замедляют импорт, поэтому загружаются только при профилировании
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            path = os.path.join(PROFILE_DIR, f"{name}.prof")
+            profiler.dump_stats(path)
+            if logger.isEnabledFor(logging.INFO):  # сводку строим, только если ее есть куда записать
+                summary = io.StringIO()
+                pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(PROFILE_TOP)
+                logger.info("Профиль %s сохранен в %s\n%s", name, path, summary.getvalue())
+        return
+
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        yield
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if not already_tracing:
+            tracemalloc.stop()
+        top = snapshot.statistics("lineno")[:PROFILE_TOP]
+        report = [f"Пиковая память: {peak} байт, текущая: {current} байт"] + [str(stat) for stat in top]
+        path = os.path.join(PROFILE_DIR, f"{name}.tracemalloc.txt")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("\n".join(report) + "\n")
+        logger.info("Профиль памяти %s сохранен в %s. %s", name, path, report[0])
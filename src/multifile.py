@@ -0,0 +1,183 @@
+import glob
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple, Type
+
+import pandas as pd
+
+from src.reports import spending_by_categories, spending_by_category
+from src.services import filter_phone_transactions
+from src.store import cashback, is_ingested, load_transactions
+
+logger = logging.getLogger(__name__)
+
+STATEMENT_PATTERN = "*.xlsx"
+TOP_TRANSACTIONS = 5
+
+
+def statement_paths(source: str) -> List[str]:
+    """Файлы выгрузок по пути: все *.xlsx в директории или файлы, подходящие под шаблон glob."""
+    pattern = os.path.join(source, STATEMENT_PATTERN) if os.path.isdir(source) else source
+    # Временные файлы Excel (~$name.xlsx) и скрытые колоночные кэши не являются выгрузками
+    paths = [path for path in glob.glob(pattern) if not os.path.basename(path).startswith(("~$", "."))]
+    return sorted(paths)
+
+
+def is_multi_source(source: str) -> bool:
+    """Указывает ли путь на несколько выгрузок (директория или шаблон glob).
+
+    Каталог накопительного хранилища (src.ingest) — один источник, а не набор выгрузок.
+    """
+    return (os.path.isdir(source) and not is_ingested(source)) or glob.has_magic(source)
+
+
+def map_statements(
+    func: Callable[..., Any],
+    paths: List[str],
+    *args: Any,
+    max_workers: int | None = None,
+    reraise: Tuple[Type[BaseException], ...] = (),
+) -> List[Tuple[str, Any]]:
+    """Применяет func(path, *args) к каждой выгрузке в пуле процессов.
+
+    Возвращает пары (путь, результат) в порядке путей. Выгрузка, которую не удалось обработать,
+    пропускается с записью в лог, чтобы один поврежденный файл не останавливал обработку остальных.
+    Исключения типов reraise не пропускаются: без такой выгрузки общий результат был бы неверным.
+    При max_workers=1 файлы обрабатываются в текущем процессе.
+    """
+    if max_workers == 1 or len(paths) <= 1:
+        results = []
+        for path in paths:
+            try:
+                results.append((path, func(path, *args)))
+            except reraise:
+                raise
+            except Exception as e:
+                logger.error("Ошибка при обработке файла %s: %s", path, e)
+        return results
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [(path, executor.submit(func, path, *args)) for path in paths]
+        results = []
+        for path, future in futures:
+            try:
+                results.append((path, future.result()))
+            except reraise:
+                raise
+            except Exception as e:
+                logger.error("Ошибка при обработке файла %s: %s", path, e)
+        return results
+
+
+def file_spending_data(
+    file_path: str, end_date: datetime, currency: str | None
+) -> Tuple[str | None, Dict[str, Dict[str, Any]]]:
+    """Валюта сумм и расходы по картам одной выгрузки, как в main_page по файлу (выполняется в процессе пула)."""
+    # views загружает HTTP-клиент для курсов и котировок; остальным командам он не нужен
+    from src.views import SECTION_TIMEOUTS, cached_card_spending
+
+    date_str = end_date.strftime("%Y-%m-%d %H:%M:%S")
+    return cached_card_spending(
+        file_path, date_str, end_date, "pandas", currency, rates_timeout=SECTION_TIMEOUTS["rate_history"]
+    )
+
+
+def file_category_spending(file_path: str, category: str, date: str | None) -> pd.DataFrame:
+    """Траты по категории в одной выгрузке. Отчет по отдельному файлу не сохраняется."""
+    return spending_by_category.__wrapped__(file_path, category, date)  # type: ignore[attr-defined]
+
+
+def file_categories_spending(file_path: str, categories: list | None, dates: list) -> pd.DataFrame:
+    """Суммы трат по категориям и датам в одной выгрузке."""
+    return spending_by_categories.__wrapped__(file_path, categories, dates)  # type: ignore[attr-defined]
+
+
+def file_phone_transactions(file_path: str) -> pd.DataFrame:
+    """Транзакции с мобильными номерами в одной выгрузке."""
+    return filter_phone_transactions(load_transactions(file_path))
+
+
+def merge_spending_data(parts: List[Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """Объединяет расходы по картам из нескольких выгрузок.
+
+    Суммы по одной карте из разных файлов складываются, топ-5 выбирается заново из топ-5 каждого файла.
+    """
+    totals: Dict[str, float] = {}
+    candidates: Dict[str, List[Dict[str, Any]]] = {}
+    for part in parts:
+        for card_number, card in part.items():
+            totals[card_number] = totals.get(card_number, 0.0) + card["total_spent"]
+            candidates.setdefault(card_number, []).extend(card["top_transactions"])
+
+    card_data: Dict[str, Dict[str, Any]] = {}
+    for card_number, total_spent in totals.items():
+        top_transactions = sorted(candidates[card_number], key=lambda record: record["Сумма платежа"], reverse=True)
+        card_data[card_number] = {
+            "last_4_digits": card_number[-4:],
+            "total_spent": total_spent,
+            "cashback": cashback(total_spent),
+            "top_transactions": top_transactions[:TOP_TRANSACTIONS],
+        }
+    return card_data
+
+
+def concat_with_source(results: List[Tuple[str, pd.DataFrame]]) -> pd.DataFrame:
+    """Объединяет таблицы по файлам, добавляя колонку "Файл" с именем выгрузки."""
+    frames = [frame.assign(Файл=os.path.basename(path)) for path, frame in results if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def spending_data_for_files(
+    source: str, end_date: datetime, max_workers: int | None = None, currency: str | None = None
+) -> Tuple[str | None, Dict[str, Dict[str, Any]]]:
+    """Расходы, кешбэк и топ-5 транзакций по картам с начала месяца по всем выгрузкам source.
+
+    Суммы каждой выгрузки пересчитываются в currency, как в main_page по одному файлу. Возвращает пару
+    (валюта сумм, расходы); валюта — None, если суммы хотя бы одной выгрузки остались как в выписке.
+    Если для другой валюты, чем рубли, нет курсов, выбрасывается LookupError.
+    """
+    paths = statement_paths(source)
+    results = map_statements(
+        file_spending_data, paths, end_date, currency, max_workers=max_workers, reraise=(LookupError,)
+    )
+    converted = all(part_currency == currency for _, (part_currency, _) in results)
+    return (currency if converted else None), merge_spending_data([part for _, (_, part) in results])
+
+
+def category_report_for_files(
+    source: str, category: str, date: str | None = None, max_workers: int | None = None
+) -> pd.DataFrame:
+    """Траты по категории за три месяца по всем выгрузкам source, отсортированные по дате операции."""
+    results = map_statements(file_category_spending, statement_paths(source), category, date, max_workers=max_workers)
+    combined = concat_with_source(results)
+    if combined.empty:
+        return combined
+    return combined.sort_values(by="Дата операции", kind="stable", ignore_index=True)
+
+
+def categories_report_for_files(
+    source: str, categories: list | None, dates: list, max_workers: int | None = None
+) -> pd.DataFrame:
+    """Суммы трат по категориям за три месяца до каждой из дат, сложенные по всем выгрузкам source."""
+    results = map_statements(
+        file_categories_spending, statement_paths(source), categories, dates, max_workers=max_workers
+    )
+    frames = [frame for _, frame in results if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=["Дата", "Категория", "Сумма платежа", "Количество операций"])
+    return (
+        pd.concat(frames, ignore_index=True)
+        .groupby(["Дата", "Категория"], as_index=False, observed=True)[["Сумма платежа", "Количество операций"]]
+        .sum()
+    )
+
+
+def phone_transactions_for_files(source: str, max_workers: int | None = None) -> pd.DataFrame:
+    """Транзакции с мобильными номерами в описании по всем выгрузкам source."""
+    return concat_with_source(
+        map_statements(file_phone_transactions, statement_paths(source), max_workers=max_workers)
+    )
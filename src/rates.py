@@ -0,0 +1,197 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src import cache
+from src.metrics import span
+from src.utils import get_rate_history, run_in_thread
+
+logger = logging.getLogger(__name__)
+
+BASE_CURRENCY = "RUB"  # валюта, к которой хранятся курсы
+# Курсы запрашиваются с запасом до начала периода: в праздники ЦБ РФ курсы не устанавливает,
+# и для первых операций периода нужен последний курс до них
+RATE_LOOKBACK = timedelta(days=14)
+
+
+class RateStore:
+    """История курсов валют к рублю с сохранением в файл.
+
+    Курсы запрашиваются пачками — по одному запросу на валюту и недостающий период — и хранятся вместе
+    с покрытыми периодами, поэтому повторные пересчеты за те же даты не обращаются к API.
+    """
+
+    def __init__(self, name: str = "currency_history") -> None:
+        self.name = name
+        self._rates: Dict[str, pd.Series] = {}
+        self._coverage: Dict[str, Tuple[date, date]] = {}
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    @property
+    def path(self) -> str:
+        """Файл, в котором хранится история курсов."""
+        return os.path.join(cache.CACHE_DIR, f"{self.name}.json")
+
+    def ensure(self, currencies: Iterable[str], start: datetime, end: datetime) -> None:
+        """Догружает курсы валют за период, которых еще нет в хранилище. Будущие даты не запрашиваются."""
+        first_day = (start - RATE_LOOKBACK).date()
+        last_day = min(end.date(), date.today())
+        with self._lock:
+            self._load()
+            changed = False
+            for currency in sorted(set(currencies) - {BASE_CURRENCY}):
+                covered = self._coverage.get(currency)
+                if covered is None:
+                    missing = [(first_day, last_day)]
+                else:
+                    missing = []
+                    if first_day < covered[0]:
+                        missing.append((first_day, covered[0] - timedelta(days=1)))
+                    if last_day > covered[1]:
+                        missing.append((covered[1] + timedelta(days=1), last_day))
+                for period_start, period_end in missing:
+                    if period_start > period_end:
+                        continue
+                    history = get_rate_history(currency, period_start, period_end)
+                    if history is not None:
+                        self.add(currency, history, period_start, period_end)
+                        changed = True
+            if changed:
+                self._save()
+
+    def add(self, currency: str, history: Dict[str, float], start: date, end: date) -> None:
+        """Добавляет курсы валюты ({дата ГГГГ-ММ-ДД: рублей за единицу}) за период, примыкающий к покрытому."""
+        with self._lock:
+            self._load()
+            rates = pd.Series(history, dtype="float64")
+            rates.index = pd.DatetimeIndex(rates.index)
+            if currency in self._rates:
+                rates = rates.combine_first(self._rates[currency])
+            self._rates[currency] = rates.sort_index()
+            covered = self._coverage.get(currency, (start, end))
+            self._coverage[currency] = (min(covered[0], start), max(covered[1], end))
+
+    def to_rubles(self, currencies: pd.Series, dates: pd.Series) -> np.ndarray:
+        """Курс к рублю на дату каждой строки: последний известный на эту дату (as-of).
+
+        Поиск идет бинарным поиском по датам курсов, отдельно для каждой валюты, без перебора строк.
+        Для рубля курс 1.0, для дат без известного курса — NaN.
+        """
+        currency_values = currencies.astype(object).to_numpy()
+        date_values = dates.to_numpy(dtype="datetime64[ns]")
+        result = np.full(len(currency_values), np.nan)
+        result[currency_values == BASE_CURRENCY] = 1.0
+        with self._lock:
+            self._load()
+            for currency, rates in self._rates.items():
+                mask = currency_values == currency
+                if not mask.any():
+                    continue
+                positions = rates.index.searchsorted(date_values[mask], side="right") - 1
+                found = positions >= 0
+                values = np.full(len(positions), np.nan)
+                values[found] = rates.to_numpy()[positions[found]]
+                result[mask] = values
+        return result
+
+    def clear(self) -> None:
+        """Очищает курсы в памяти. Файл на диске будет перечитан при следующем обращении."""
+        with self._lock:
+            self._rates.clear()
+            self._coverage.clear()
+            self._loaded = False
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                stored = json.load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("Не удалось прочитать историю курсов %s: %s", self.path, e)
+            return
+        for currency, (start, end) in stored["coverage"].items():
+            self.add(currency, stored["rates"][currency], date.fromisoformat(start), date.fromisoformat(end))
+
+    def _save(self) -> None:
+        stored = {
+            "coverage": {
+                currency: [start.isoformat(), end.isoformat()] for currency, (start, end) in self._coverage.items()
+            },
+            "rates": {
+                currency: {day.strftime("%Y-%m-%d"): rate for day, rate in rates.items()}
+                for currency, rates in self._rates.items()
+            },
+        }
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(cache.CACHE_DIR, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump(stored, file)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("Не удалось сохранить историю курсов %s: %s", self.path, e)
+
+
+rate_store = RateStore()
+
+
+def convert_amounts(
+    transactions: pd.DataFrame, currency: str = BASE_CURRENCY, timeout: float | None = None
+) -> pd.DataFrame:
+    """Возвращает копию транзакций с суммами платежа, пересчитанными в валюту currency по курсу на дату операции.
+
+    Недостающие курсы догружаются в хранилище одним запросом на валюту. Если в выгрузке нет платежей
+    в других валютах (или нет колонки валюты платежа, а currency — рубли), возвращается исходный DataFrame.
+    Если курса на дату операции нет, выбрасывается LookupError.
+
+    timeout — сколько секунд ждать догрузки курсов. Догрузка идет в фоновом потоке: если API не ответил вовремя,
+    выбрасывается LookupError, а загрузка завершится в фоне и пополнит хранилище для следующих пересчетов.
+    """
+    if "Валюта платежа" not in transactions:
+        # Выгрузка без колонки валюты платежа — рублевая
+        if currency == BASE_CURRENCY:
+            return transactions
+        transactions = transactions.assign(**{"Валюта платежа": BASE_CURRENCY})
+    payment_currencies = transactions["Валюта платежа"]
+    foreign = (payment_currencies.notna() & (payment_currencies != currency)).to_numpy()
+    if not foreign.any():
+        return transactions
+
+    with span("convert.currency") as stage:
+        foreign_rows = transactions[foreign]
+        dates = foreign_rows["Дата операции"]
+        needed = set(foreign_rows["Валюта платежа"].astype(str)) | {currency}
+        if timeout is None:
+            rate_store.ensure(needed, dates.min(), dates.max())
+        else:
+            try:
+                run_in_thread(rate_store.ensure, needed, dates.min(), dates.max()).result(timeout=timeout)
+            except FutureTimeoutError:
+                raise LookupError(f"Курсы для пересчета в {currency} не получены за {timeout:g} с") from None
+
+        rates = rate_store.to_rubles(foreign_rows["Валюта платежа"], dates)
+        rates /= rate_store.to_rubles(pd.Series(currency, index=foreign_rows.index), dates)
+        if np.isnan(rates).any():
+            unknown = sorted(set(foreign_rows["Валюта платежа"][np.isnan(rates)].astype(str)))
+            raise LookupError(f"Нет курсов для пересчета в {currency}: {', '.join(unknown)}")
+
+        amounts = transactions["Сумма платежа"].to_numpy(dtype="float64", copy=True)
+        amounts[foreign] *= rates
+        currency_column = pd.Series(currency, index=transactions.index).where(payment_currencies.notna())
+        converted = transactions.assign(
+            **{"Сумма платежа": amounts, "Валюта платежа": currency_column.astype("category")}
+        )
+        stage.add(rows=int(foreign.sum()))
+    return converted
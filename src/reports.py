@@ -1,31 +1,146 @@
+import gzip
 import json
 import logging
+import os
 from datetime import datetime, timedelta
 from functools import wraps
-from typing import Any, Callable
+from json.encoder import encode_basestring  # type: ignore[attr-defined]
+from typing import IO, Any, Callable, Dict, Iterator, List
 
+import numpy as np
 import pandas as pd
 
-logging.basicConfig(level=logging.INFO)
+from src import database
+from src.cache import ResultCache
+from src.log import setup_logging
+from src.metrics import span
+from src.store import format_payment_dates, load_transactions, result_key, select_period
+
 logger = logging.getLogger(__name__)
 
+OUTPUT_FORMATS = ("json", "compact", "ndjson")
+CHUNK_SIZE = 10_000  # строк отчета, сериализуемых за один шаг
+JSON_ENCODER = json.JSONEncoder(ensure_ascii=False)
+REPORT_PERIOD = timedelta(days=90)
+
+# Вычисленные отчеты по категории: ключ — отпечаток выгрузки, категория, дата и движок
+category_cache = ResultCache("spending_by_category", maxsize=256)
+
+
+def format_timestamps(column: pd.Series) -> pd.Series:
+    """Переводит колонку дат в строки ISO 8601 так же, как Timestamp.isoformat(), но без цикла по значениям."""
+    if column.dt.tz is not None:
+        return column.map(lambda value: None if pd.isna(value) else value.isoformat())
+
+    formatted = pd.Series(
+        np.datetime_as_string(column.to_numpy(dtype="datetime64[ns]"), unit="s"), index=column.index, dtype=object
+    )
+    # Дробные секунды встречаются редко, для них сохраняем точный формат isoformat()
+    fractional = column.notna() & ((column.dt.microsecond != 0) | (column.dt.nanosecond != 0))
+    if fractional.any():
+        formatted[fractional] = column[fractional].map(lambda value: value.isoformat())
+    return formatted.where(column.notna(), None)
+
+
+def encode_value(value: Any) -> str:
+    """Кодирует одно значение так же, как json.dump(..., ensure_ascii=False)."""
+    if isinstance(value, str):
+        return encode_basestring(value)
+    return JSON_ENCODER.encode(value)
+
+
+def encode_column(column: pd.Series) -> List[str]:
+    """Кодирует колонку в список JSON-значений. Для однотипных колонок без вызова кодировщика на каждое значение."""
+    if pd.api.types.is_datetime64_any_dtype(column):
+        column = format_timestamps(column)
+    elif pd.api.types.is_string_dtype(column) and column.dtype != object:
+        # Пропуски строк Arrow (pd.NA) записываем как NaN, как и пропуски в object-колонках
+        column = column.astype(object).where(column.notna(), np.nan)
+
+    if pd.api.types.is_bool_dtype(column):
+        return ["true" if value else "false" for value in column.tolist()]
+    if pd.api.types.is_integer_dtype(column):
+        return list(map(int.__repr__, column.tolist()))
+    if pd.api.types.is_float_dtype(column):
+        values = column.tolist()
+        encoded = list(map(float.__repr__, values))
+        # NaN и бесконечности json записывает как NaN/Infinity, а не как repr
+        for position in np.flatnonzero(~np.isfinite(column.to_numpy())):
+            encoded[position] = JSON_ENCODER.encode(values[position])
+        return encoded
+
+    values = column.tolist()
+    if all(isinstance(value, str) for value in values):
+        return list(map(encode_basestring, values))
+    return list(map(encode_value, values))
+
+
+def iter_json_records(frame: pd.DataFrame, output_format: str = "json", chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """Построчно сериализует DataFrame в JSON по частям из chunk_size строк.
+
+    Форматы: "json" — массив с отступом 4 (как json.dump(..., indent=4)), "compact" — массив без отступов,
+    "ndjson" — по одной записи на строку.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Неизвестный формат отчета: {output_format}")
+
+    keys = [encode_basestring(str(column)).replace("%", "%%") for column in frame.columns]
+    if output_format == "json":
+        template = "    {\n" + ",\n".join(f"        {key}: %s" for key in keys) + "\n    }"
+        separator, opening, closing, empty = ",\n", "[\n", "\n]", "[]"
+    elif output_format == "compact":
+        template = "{" + ", ".join(f"{key}: %s" for key in keys) + "}"
+        separator, opening, closing, empty = ", ", "[", "]", "[]"
+    else:
+        template = "{" + ", ".join(f"{key}: %s" for key in keys) + "}"
+        separator, opening, closing, empty = "\n", "", "\n", ""
+
+    if frame.empty:
+        yield empty
+        return
+
+    yield opening
+    for start in range(0, len(frame), chunk_size):
+        stop = start + chunk_size
+        chunk = frame.iloc[start:stop]
+        columns = [encode_column(chunk.iloc[:, position]) for position in range(chunk.shape[1])]
+        records = [template % fields for fields in zip(*columns)]
+        yield ("" if start == 0 else separator) + separator.join(records)
+    yield closing
 
-def report_decorator(filename: str) -> Callable[[Callable], Callable]:
-    """Декоратор для сохранения результата функции в JSON-файл."""
+
+def report_decorator(
+    filename: str, output_format: str = "json", compress: bool = False
+) -> Callable[[Callable], Callable]:
+    """Декоратор для сохранения результата функции в JSON-файл.
+
+    output_format: "json", "compact" или "ndjson"; при compress=True файл сжимается gzip.
+    """
 
     def decorator(func: Callable[..., pd.DataFrame]) -> Callable[..., pd.DataFrame]:
+        # Последний записанный результат: тот же объект из кэша отчетов повторно в файл не пишется
+        written: Dict[str, pd.DataFrame] = {}
+
         @wraps(func)
         def wrapper(*args: Any, **kwargs: Any) -> pd.DataFrame:
             result = func(*args, **kwargs)
-            report_filename = f"../logs/{func.__name__}_report.json"
-            result_dict = result.to_dict(orient="records")
-            for record in result_dict:
-                for key, value in record.items():
-                    if isinstance(value, pd.Timestamp):
-                        record[key] = value.isoformat()
-            with open(report_filename, "w", encoding="utf-8") as file:
-                json.dump(result_dict, file, ensure_ascii=False, indent=4)
-            logger.info(f"Отчет сохранен в файл: {report_filename}")
+            extension = "ndjson" if output_format == "ndjson" else "json"
+            report_filename = f"../logs/{func.__name__}_report.{extension}"
+            if compress:
+                report_filename += ".gz"
+            if written.get(report_filename) is result and os.path.exists(report_filename):
+                return result
+            if compress:
+                file: IO[str] = gzip.open(report_filename, "wt", encoding="utf-8")
+            else:
+                file = open(report_filename, "w", encoding="utf-8")
+            with file, span("serialize.report_json") as stage:
+                for part in iter_json_records(result, output_format):
+                    file.write(part)
+                    stage.add(bytes=len(part))
+                stage.add(rows=len(result))
+            logger.info("Отчет сохранен в файл: %s", report_filename)
+            written[report_filename] = result
             return result
 
         return wrapper
@@ -33,40 +148,112 @@ def report_decorator(filename: str) -> Callable[[Callable], Callable]:
     return decorator
 
 
+def get_report_period(date: str | None = None) -> tuple[datetime, datetime]:
+    """Возвращает начало и конец трехмесячного периода, заканчивающегося указанной датой."""
+    end_date = datetime.now() if date is None else datetime.strptime(date, "%d.%m.%Y")
+    return end_date - REPORT_PERIOD, end_date
+
+
+def filter_by_category(
+    transactions: pd.DataFrame, category: str, start_date: datetime, end_date: datetime
+) -> pd.DataFrame:
+    """Отбирает транзакции заданной категории за период."""
+    with span("filter.category") as stage:
+        period_transactions = select_period(transactions, start_date, end_date)
+        filtered = period_transactions[period_transactions["Категория"] == category]
+        stage.add(rows=len(period_transactions))
+    return filtered
+
+
 @report_decorator("../data/operations.xlsx")
-def spending_by_category(file_path: str, category: str, date: datetime | None = None) -> pd.DataFrame:
-    """Функция возвращает траты по заданной категории за последние три месяца"""
-    transactions = pd.read_excel(file_path)
+def spending_by_category(
+    file_path: str, category: str, date: str | None = None, engine: str = "pandas"
+) -> pd.DataFrame:
+    """Функция возвращает траты по заданной категории за последние три месяца.
+
+    Отчеты на заданную дату кэшируются по отпечатку выгрузки, категории, дате и движку (category_cache):
+    повторный запрос не пересчитывается, пока не изменится файл. Отчет на текущий момент (date=None)
+    не кэшируется. engine="sqlite" — выборка запросом по индексу базы SQLite выгрузки.
+    """
+    key = None if date is None else result_key(file_path, category, date, engine)
+    return category_cache.get_or_compute(key, lambda: category_spending(file_path, category, date, engine))
+
 
-    transactions["Дата операции"] = pd.to_datetime(transactions["Дата операции"], format="%d.%m.%Y %H:%M:%S")
+def category_spending(file_path: str, category: str, date: str | None = None, engine: str = "pandas") -> pd.DataFrame:
+    """Траты по категории за три месяца до даты, без кэша и сохранения отчета."""
+    start_date, end_date = get_report_period(date)
 
-    logger.info(f"Первые несколько строк DataFrame:\n{transactions.head()}")
+    logger.info("Дата начала периода: %s", start_date)
+    logger.info("Дата конца периода: %s", end_date)
 
-    if date is None:
-        date = datetime.now()
+    if engine == "sqlite":
+        filtered_transactions = database.category_transactions(file_path, category, start_date, end_date)
     else:
-        date = datetime.strptime(date, "%d.%m.%Y")
+        filtered_transactions = filter_by_category(load_transactions(file_path), category, start_date, end_date)
 
-    start_date = date - timedelta(days=90)
+    if filtered_transactions.empty:
+        logger.warning("Не найдено транзакций по категории '%s' за последние три месяца.", category)
 
-    logger.info(f"Дата начала периода: {start_date}")
-    logger.info(f"Дата конца периода: {date}")
+    if not filtered_transactions["Дата операции"].is_monotonic_increasing:
+        filtered_transactions = filtered_transactions.sort_values(by="Дата операции")
 
-    filtered_transactions = transactions[
-        (transactions["Категория"] == category)
-        & (transactions["Дата операции"] >= start_date)
-        & (transactions["Дата операции"] <= date)
-    ]
+    # Дата платежа в отчете остается строкой, как в выгрузке: хранилище разбирает ее только для расчетов
+    return format_payment_dates(filtered_transactions)
 
-    if filtered_transactions.empty:
-        logger.warning(f"Не найдено транзакций по категории '{category}' за последние три месяца.")
 
-    sorted_transactions = filtered_transactions.sort_values(by="Дата операции")
+@report_decorator("../data/operations.xlsx")
+def spending_by_categories(file_path: str, categories: list | None, dates: list) -> pd.DataFrame:
+    """Суммы трат по каждой категории за три месяца до каждой из дат.
+
+    Выгрузка загружается один раз. Внутри категории суммы за все периоды считаются сразу:
+    по накопленной сумме и бинарному поиску границ периодов в отсортированных датах.
+    Если categories не задан, отчет строится по всем категориям выгрузки.
+    """
+    transactions = load_transactions(file_path)
+
+    end_dates = pd.DatetimeIndex([datetime.strptime(date, "%d.%m.%Y") for date in dates])
+    start_dates = end_dates - REPORT_PERIOD
+    if categories is None:
+        categories = sorted(transactions["Категория"].dropna().unique())
+
+    with span("aggregate.category_windows") as stage:
+        requested = set(categories)
+        groups = {
+            category: group
+            for category, group in transactions.groupby("Категория", observed=True, sort=False)
+            if category in requested
+        }
+
+        parts = []
+        for category in categories:
+            group = groups.get(category, transactions.iloc[:0])
+            if not group["Дата операции"].is_monotonic_increasing:
+                group = group.sort_values(by="Дата операции")
+            operation_dates = group["Дата операции"].to_numpy()
+            cumulative = np.concatenate([[0.0], group["Сумма платежа"].fillna(0).to_numpy().cumsum()])
+
+            left = operation_dates.searchsorted(start_dates.to_numpy(), side="left")
+            right = operation_dates.searchsorted(end_dates.to_numpy(), side="right")
+            parts.append(
+                pd.DataFrame(
+                    {
+                        "Дата": end_dates,
+                        "Категория": category,
+                        "Сумма платежа": cumulative[right] - cumulative[left],
+                        "Количество операций": right - left,
+                    }
+                )
+            )
+        stage.add(rows=len(transactions))
+
+    if not parts:
+        return pd.DataFrame(columns=["Дата", "Категория", "Сумма платежа", "Количество операций"])
 
-    return sorted_transactions
+    return pd.concat(parts, ignore_index=True).sort_values(by=["Дата", "Категория"], ignore_index=True)
 
 
 if __name__ == "__main__":
+    setup_logging()
     file_path = "../data/operations.xlsx"
     result = spending_by_category(file_path, "Каршеринг", "31.12.2021")
     print(result)
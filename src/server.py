@@ -0,0 +1,205 @@
+import argparse
+import gzip
+import json
+import logging
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from src.cube import SpendingCube
+from src.log import setup_logging
+from src.main import DEFAULT_CURRENCY, FILE_PATH, SETTINGS_PATH, parse_currency, reformat_json
+from src.metrics import metrics
+from src.reports import iter_json_records, spending_by_categories, spending_by_category
+from src.services import find_transactions_by_phone, find_transactions_with_phone_numbers, get_phone_index
+from src.store import derive, load_transactions
+from src.views import generate_report
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {"ndjson": "application/x-ndjson; charset=utf-8"}
+JSON_CONTENT_TYPE = "application/json; charset=utf-8"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+MIN_GZIP_SIZE = 1024  # ответы меньше этого размера не сжимаем
+
+Params = Dict[str, str]
+Response = Tuple[int, str, Iterable[str]]
+
+
+class ReportServer(ThreadingHTTPServer):
+    """HTTP-сервер отчетов. Выгрузка, производные индексы и кэши рыночных данных живут в памяти процесса
+    между запросами, поэтому запрос не тратит время на импорт pandas и разбор Excel."""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], data_path: str = FILE_PATH, settings_path: str = SETTINGS_PATH):
+        super().__init__(address, ReportHandler)
+        self.data_path = data_path
+        self.settings_path = settings_path
+
+    def warm_up(self) -> None:
+        """Заранее загружает выгрузку и строит куб дневных сумм и индекс телефонов."""
+        try:
+            transactions = load_transactions(self.data_path)
+        except FileNotFoundError:
+            logger.warning("Файл с данными не найден: %s. Данные будут загружены при первом запросе.", self.data_path)
+            return
+        derive(self.data_path, transactions, "cube", SpendingCube).cube
+        get_phone_index(self.data_path, transactions)
+        logger.info("Данные загружены в память: %s (%d строк)", self.data_path, len(transactions))
+
+
+def required(params: Params, name: str) -> str:
+    """Значение обязательного параметра запроса."""
+    if not params.get(name):
+        raise ValueError(f"Не указан параметр {name}")
+    return params[name]
+
+
+def checked_date(value: str) -> str:
+    """Проверяет дату в формате ДД.ММ.ГГГГ."""
+    datetime.strptime(value, "%d.%m.%Y")
+    return value
+
+
+def json_response(text: str, output_format: str) -> Response:
+    """Готовый JSON-ответ функции в нужном формате; ответ с ключом error отдается со статусом 500."""
+    data = json.loads(text)
+    status = 500 if isinstance(data, dict) and "error" in data else 200
+    return status, CONTENT_TYPES.get(output_format, JSON_CONTENT_TYPE), reformat_json(text, output_format)
+
+
+def main_page(server: ReportServer, params: Params, output_format: str) -> Response:
+    date = params.get("date") or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    currency = parse_currency(params["currency"]) if params.get("currency") else DEFAULT_CURRENCY
+    text = generate_report(date, file_path=server.data_path, settings_path=server.settings_path, currency=currency)
+    return json_response(text, output_format)
+
+
+def filtered_by_phone(server: ReportServer, params: Params, output_format: str) -> Response:
+    if params.get("phone"):
+        text = find_transactions_by_phone(server.data_path, params["phone"])
+    else:
+        text = find_transactions_with_phone_numbers(server.data_path)
+    if text is None:
+        return (
+            500,
+            JSON_CONTENT_TYPE,
+            [json.dumps({"error": "Не удалось прочитать файл с данными"}, ensure_ascii=False)],
+        )
+    return json_response(text, output_format)
+
+
+def report(server: ReportServer, params: Params, output_format: str) -> Response:
+    date = checked_date(params["date"]) if params.get("date") else None
+    # Недекорированная функция: результат уходит в ответ, а не в файл отчета
+    result = spending_by_category.__wrapped__(  # type: ignore[attr-defined]
+        server.data_path, required(params, "category"), date
+    )
+    return 200, CONTENT_TYPES.get(output_format, JSON_CONTENT_TYPE), iter_json_records(result, output_format)
+
+
+def report_batch(server: ReportServer, params: Params, output_format: str) -> Response:
+    dates = [checked_date(date) for date in required(params, "dates").split(",")]
+    categories = [category for category in params.get("categories", "").split(",") if category] or None
+    result = spending_by_categories.__wrapped__(server.data_path, categories, dates)  # type: ignore[attr-defined]
+    return 200, CONTENT_TYPES.get(output_format, JSON_CONTENT_TYPE), iter_json_records(result, output_format)
+
+
+def health(server: ReportServer, params: Params, output_format: str) -> Response:
+    return 200, JSON_CONTENT_TYPE, [json.dumps({"status": "ok"})]
+
+
+def stage_metrics(server: ReportServer, params: Params, output_format: str) -> Response:
+    """Время и счетчики по этапам с запуска сервера: в формате Prometheus или JSON (format=json)."""
+    if params.get("format") == "json":
+        return 200, JSON_CONTENT_TYPE, [metrics.to_json()]
+    return 200, PROMETHEUS_CONTENT_TYPE, [metrics.to_prometheus()]
+
+
+ROUTES: Dict[str, Callable[[ReportServer, Params, str], Response]] = {
+    "/main_page": main_page,
+    "/filtered_by_phone": filtered_by_phone,
+    "/report": report,
+    "/report_batch": report_batch,
+    "/health": health,
+    "/metrics": stage_metrics,
+}
+
+
+class ReportHandler(BaseHTTPRequestHandler):
+    """Обработчик GET-запросов: путь выбирает команду, параметры строки запроса — ее аргументы.
+
+    Параметр format (json, compact, ndjson) задает формат ответа. Ответ сжимается gzip,
+    если клиент передал Accept-Encoding: gzip.
+    """
+
+    server: ReportServer
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        route = ROUTES.get(url.path)
+        if route is None:
+            self.send_text(
+                404, JSON_CONTENT_TYPE, json.dumps({"error": f"Неизвестный путь {url.path}"}, ensure_ascii=False)
+            )
+            return
+
+        output_format = params.get("format", "json")
+        try:
+            if output_format not in CONTENT_TYPES and output_format not in ("json", "compact"):
+                raise ValueError(f"Неизвестный формат отчета: {output_format}")
+            status, content_type, parts = route(self.server, params, output_format)
+            body = "".join(parts)
+        except ValueError as e:
+            self.send_text(400, JSON_CONTENT_TYPE, json.dumps({"error": str(e)}, ensure_ascii=False))
+            return
+        except Exception as e:
+            logger.exception("Ошибка при обработке запроса %s", self.path)
+            self.send_text(500, JSON_CONTENT_TYPE, json.dumps({"error": str(e)}, ensure_ascii=False))
+            return
+        self.send_text(status, content_type, body)
+
+    def send_text(self, status: int, content_type: str, text: str) -> None:
+        body = text.encode("utf-8")
+        compress = len(body) >= MIN_GZIP_SIZE and "gzip" in self.headers.get("Accept-Encoding", "")
+        if compress:
+            body = gzip.compress(body, compresslevel=5)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if compress:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.info("%s - " + format, self.address_string(), *args)
+
+
+def serve(
+    host: str = "127.0.0.1", port: int = 8000, data_path: str = FILE_PATH, settings_path: str = SETTINGS_PATH
+) -> None:
+    """Запускает сервер отчетов и обслуживает запросы до остановки процесса."""
+    server = ReportServer((host, port), data_path, settings_path)
+    server.warm_up()
+    logger.info("Сервер отчетов запущен: http://%s:%s", host, server.server_address[1])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m src.server", description="Локальный HTTP-сервер отчетов.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("-i", "--input", default=FILE_PATH, help="путь к выгрузке операций (.xlsx)")
+    parser.add_argument("--settings", default=SETTINGS_PATH, help="путь к файлу пользовательских настроек")
+    args = parser.parse_args()
+    setup_logging()
+    serve(args.host, args.port, args.input, args.settings)
@@ -1,52 +1,129 @@
 import logging
-import os
 import re
-from typing import Any
+from typing import Any, Dict
 
+import numpy as np
 import pandas as pd
 
-# Создаем директорию для логов, если она не существует
-LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs")
-os.makedirs(LOG_DIR, exist_ok=True)
+from src.log import file_logger
+from src.metrics import span
+from src.store import derive, format_dates, load_transactions
 
-# Настройка логирования
-logger = logging.getLogger("find_transactions_with_phone_numbers")
-logger.propagate = False  # Отключаем передачу сообщений корневому логгеру
+# Записи уходят в общую очередь логов; файл services.log создается при первой записи, а не при импорте
+logger = file_logger("find_transactions_with_phone_numbers", "services.log", logging.INFO)
 
-file_handler = logging.FileHandler(os.path.join(LOG_DIR, "services.log"), mode="w", encoding="utf-8")
-file_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
-logger.addHandler(file_handler)
-logger.setLevel(logging.INFO)
+
+PHONE_PATTERN = re.compile(r"\+7\s?\d{3}\s?\d{3}[\s-]?\d{2}[\s-]?\d{2}")
+PHONE_PREFIX = "+7"  # дешевая проверка подстроки перед регулярным выражением
+
+
+def normalize_phone(phone: str) -> str:
+    """Приводит номер к формату E.164: +7XXXXXXXXXX."""
+    digits = re.sub(r"\D", "", phone)
+    if len(digits) == 11 and digits[0] in "78":
+        digits = digits[1:]
+    return f"+7{digits}"
+
+
+def extract_phone_numbers(descriptions: pd.Series) -> pd.Series:
+    """Возвращает номера телефонов (E.164) из описаний. Регулярное выражение применяется только
+    к строкам, содержащим "+7"; в результате только строки с найденными номерами."""
+    if not pd.api.types.is_string_dtype(descriptions):
+        descriptions = descriptions.astype(str)
+    candidates = descriptions[descriptions.str.contains(PHONE_PREFIX, regex=False, na=False)].astype(object)
+    found = candidates.str.findall(PHONE_PATTERN)
+    found = found[found.str.len() > 0]
+    return found.map(lambda phones: list(dict.fromkeys(normalize_phone(phone) for phone in phones)))
+
+
+class PhoneIndex:
+    """Номера телефонов в описаниях транзакций: флаг по каждой строке и обратный индекс номер -> строки."""
+
+    def __init__(self, transactions: pd.DataFrame) -> None:
+        positions = pd.Series(np.arange(len(transactions)))
+        phones = extract_phone_numbers(transactions["Описание"].reset_index(drop=True))
+
+        self.mask = np.zeros(len(transactions), dtype=bool)
+        self.mask[phones.index] = True
+        self.phones = phones
+
+        exploded = phones.explode()
+        self.positions: Dict[str, np.ndarray] = {
+            phone: positions[rows.index].to_numpy() for phone, rows in exploded.groupby(exploded, sort=False)
+        }
+
+    def lookup(self, phone: str) -> np.ndarray:
+        """Позиции строк с указанным номером."""
+        return self.positions.get(normalize_phone(phone), np.array([], dtype=int))
+
+
+def build_phone_index(transactions: pd.DataFrame) -> PhoneIndex:
+    """Строит индекс номеров телефонов с замером этапа."""
+    with span("aggregate.phone_index") as stage:
+        stage.add(rows=len(transactions))
+        return PhoneIndex(transactions)
+
+
+def get_phone_index(file_path: str, transactions: pd.DataFrame) -> PhoneIndex:
+    """Индекс номеров телефонов по выгрузке. Строится один раз для каждой версии файла."""
+    phone_index: PhoneIndex = derive(file_path, transactions, "phone_index", build_phone_index)
+    return phone_index
+
+
+def filter_phone_transactions(transactions: pd.DataFrame) -> pd.DataFrame:
+    """Отбирает транзакции, в описании которых есть мобильный номер."""
+    return transactions.iloc[PhoneIndex(transactions).mask].sort_index()
+
+
+def to_records_json(transactions: pd.DataFrame) -> str:
+    """Список транзакций в JSON с датами в формате выгрузки."""
+    with span("serialize.phones_json") as stage:
+        result: str = format_dates(transactions).to_json(orient="records", force_ascii=False, indent=4)
+        stage.add(rows=len(transactions), bytes=len(result))
+    return result
 
 
 def find_transactions_with_phone_numbers(file_path: str) -> Any:
     """Поиск и фильтрация транзакций, содержащих в описании мобильные номера"""
     logger.info("Функция find_transactions_with_phone_numbers начала работу.")
-    logger.info(f"Чтение файла: {file_path}")
+    logger.info("Чтение файла: %s", file_path)
 
     try:
-        df = pd.read_excel(file_path)
+        df = load_transactions(file_path)
         logger.info("Файл успешно прочитан.")
     except Exception as e:
-        logger.error(f"Ошибка при чтении файла: {e}")
+        logger.error("Ошибка при чтении файла: %s", e)
         return None
 
-    phone_pattern = re.compile(r"\+7\s?\d{3}\s?\d{3}[\s-]?\d{2}[\s-]?\d{2}")
-
     logger.info("Поиск транзакций с номерами телефонов...")
-    filtered_transactions = df[df["Описание"].astype(str).str.contains(phone_pattern, na=False)]
+    # Строки выводятся в порядке выгрузки, а не в порядке дат хранилища
+    filtered_transactions = df.iloc[get_phone_index(file_path, df).mask].sort_index()
 
     if filtered_transactions.empty:
         logger.warning("Транзакции с номерами телефонов не найдены.")
     else:
-        logger.info(f"Найдено {len(filtered_transactions)} транзакций с номерами телефонов.")
+        logger.info("Найдено %d транзакций с номерами телефонов.", len(filtered_transactions))
 
-    result_json = filtered_transactions.to_json(orient="records", force_ascii=False, indent=4)
+    result_json = to_records_json(filtered_transactions)
     logger.info("Функция find_transactions_with_phone_numbers завершила работу.")
 
     return result_json
 
 
+def find_transactions_by_phone(file_path: str, phone: str) -> Any:
+    """Поиск транзакций по конкретному номеру телефона через обратный индекс"""
+    try:
+        df = load_transactions(file_path)
+    except Exception as e:
+        logger.error("Ошибка при чтении файла: %s", e)
+        return None
+
+    filtered_transactions = df.iloc[get_phone_index(file_path, df).lookup(phone)].sort_index()
+    logger.info("Найдено %d транзакций с номером %s.", len(filtered_transactions), normalize_phone(phone))
+
+    return to_records_json(filtered_transactions)
+
+
 if __name__ == "__main__":
     file_path = "../data/operations.xlsx"
     result = find_transactions_with_phone_numbers(file_path)
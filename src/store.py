@@ -0,0 +1,423 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+import weakref
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+from src.metrics import span
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - без pyarrow работаем только с Excel
+    feather = None
+
+logger = logging.getLogger(__name__)
+
+OPERATION_DATE_FORMAT = "%d.%m.%Y %H:%M:%S"
+PAYMENT_DATE_FORMAT = "%d.%m.%Y"
+
+# Колонки с малым числом уникальных значений храним как категории
+CATEGORICAL_COLUMNS = ["Номер карты", "Статус", "Валюта операции", "Валюта платежа", "Категория"]
+# Суммы остаются float64: в float32 копейки теряются уже на суммах от 100 000
+AMOUNT_COLUMNS = ["Сумма операции", "Сумма платежа", "Кэшбэк", "Сумма операции с округлением"]
+INTEGER_COLUMNS = ["Бонусы (включая кэшбэк)", "Округление на инвесткопилку"]
+# Коды MCC четырехзначные и точно представимы в float32 (NaN для операций без кода)
+CODE_COLUMNS = ["MCC"]
+# Свободный текст хранится строками Arrow, если установлен pyarrow
+TEXT_COLUMNS = ["Описание"]
+TEXT_DTYPE = "string[pyarrow]" if feather is not None else object
+# Манифест накопительного хранилища (src.ingest): каталог с ним читается как одна выгрузка
+STORE_MANIFEST = "manifest.json"
+
+
+# Таблицы, отсортированные index_by_date, по id. Запись удаляется вместе с таблицей, а проверка is
+# исключает чужую таблицу с тем же id. Таблицы из хранилища не изменяются, поэтому порядок остается верным
+_sorted_by_date: "weakref.WeakValueDictionary[int, pd.DataFrame]" = weakref.WeakValueDictionary()
+
+
+def normalize_transactions(transactions: pd.DataFrame) -> pd.DataFrame:
+    """Приводит типы колонок выгрузки к компактному представлению: даты, категории, суммы и текст."""
+    if "Дата операции" in transactions and not pd.api.types.is_datetime64_any_dtype(transactions["Дата операции"]):
+        transactions["Дата операции"] = pd.to_datetime(transactions["Дата операции"], format=OPERATION_DATE_FORMAT)
+    if "Дата платежа" in transactions and not pd.api.types.is_datetime64_any_dtype(transactions["Дата платежа"]):
+        transactions["Дата платежа"] = pd.to_datetime(transactions["Дата платежа"], format=PAYMENT_DATE_FORMAT)
+
+    for column in CATEGORICAL_COLUMNS:
+        if column in transactions and transactions[column].dtype == object:
+            transactions[column] = transactions[column].astype("category")
+
+    for column in AMOUNT_COLUMNS:
+        if column in transactions:
+            transactions[column] = transactions[column].astype("float64")
+
+    for column in INTEGER_COLUMNS:
+        if column in transactions and pd.api.types.is_integer_dtype(transactions[column]):
+            transactions[column] = pd.to_numeric(transactions[column], downcast="integer")
+
+    for column in CODE_COLUMNS:
+        if column in transactions and pd.api.types.is_float_dtype(transactions[column]):
+            transactions[column] = transactions[column].astype("float32")
+
+    for column in TEXT_COLUMNS:
+        # Из Feather строки читаются в StringDtype с хранением в Python, поэтому проверяем и его
+        dtype = transactions[column].dtype if column in transactions else None
+        if (dtype == object or isinstance(dtype, pd.StringDtype)) and dtype != TEXT_DTYPE:
+            transactions[column] = transactions[column].astype(TEXT_DTYPE)
+
+    return transactions
+
+
+def read_excel(file_path: str) -> pd.DataFrame:
+    """Читает выгрузку из Excel с замером этапа загрузки."""
+    with span("load.excel") as stage:
+        transactions = pd.read_excel(file_path)
+        stage.add(rows=len(transactions), bytes=os.path.getsize(file_path) if os.path.exists(file_path) else 0)
+    return transactions
+
+
+def parse(transactions: pd.DataFrame) -> pd.DataFrame:
+    """Приводит типы колонок с замером этапа разбора дат и типов."""
+    with span("parse.normalize") as stage:
+        stage.add(rows=len(transactions))
+        return normalize_transactions(transactions)
+
+
+def card_labels(column: pd.Series) -> pd.Series:
+    """Номера карт строками для группировки и ключей отчета; пропуски становятся "nan".
+
+    Для категориальной колонки переименовываются только категории, без копии строк.
+    """
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        return column.astype(str)
+    labels = column.cat.rename_categories([str(category) for category in column.cat.categories])
+    if column.isna().any():
+        labels = labels.cat.add_categories("nan").fillna("nan")
+    return labels
+
+
+def cashback(total_spent: float) -> float:
+    """Кешбэк по сумме расходов: 1 рубль на каждые 100 рублей.
+
+    Сумма сначала округляется до копеек: иначе погрешность float (итог вроде -300.00000000000006) дала бы
+    лишний рубль, а итоги, сложенные в разном порядке, — разный кешбэк.
+    """
+    return round(total_spent, 2) // 100
+
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+    """Занимаемая память по колонкам до и после приведения типов, в байтах, с итоговой строкой."""
+    report = pd.DataFrame(
+        {
+            "Тип до": before.dtypes.astype(str),
+            "Байт до": before.memory_usage(index=False, deep=True),
+            "Тип после": after.dtypes.astype(str).reindex(before.columns),
+            "Байт после": after.memory_usage(index=False, deep=True).reindex(before.columns),
+        }
+    )
+    report.loc["Итого"] = ["", report["Байт до"].sum(), "", report["Байт после"].sum()]
+    return report
+
+
+def index_by_date(transactions: pd.DataFrame) -> pd.DataFrame:
+    """Сортирует транзакции по дате операции для выборок за период бинарным поиском.
+
+    Индекс — номер строки в выгрузке: sort_index() возвращает исходный порядок файла (новые операции первыми),
+    в котором выводятся результаты и разрешаются равные суммы. Порядок запоминается, и select_period
+    не проверяет его при каждой выборке.
+    """
+    if "Дата операции" not in transactions:
+        return transactions
+    indexed = transactions.reset_index(drop=True).sort_values(by="Дата операции", kind="stable")
+    dates = indexed["Дата операции"]
+    # Пропуски дат сортировка ставит в конец, и бинарный поиск по такой колонке неверен
+    if pd.api.types.is_datetime64_any_dtype(dates) and (dates.empty or pd.notna(dates.iat[-1])):
+        _sorted_by_date[id(indexed)] = indexed
+    return indexed
+
+
+def is_sorted_by_date(transactions: pd.DataFrame) -> bool:
+    """Отсортирована ли таблица по дате операции функцией index_by_date (или выбрана из такой за период)."""
+    return _sorted_by_date.get(id(transactions)) is transactions
+
+
+def select_period(transactions: pd.DataFrame, start_date: datetime, end_date: datetime) -> pd.DataFrame:
+    """Транзакции за период включительно. По отсортированным датам — бинарным поиском, иначе перебором.
+
+    Для таблиц из index_by_date выборка — только два бинарных поиска, без проверки порядка дат.
+    """
+    index = transactions.index
+    sorted_by_date = is_sorted_by_date(transactions)
+    if sorted_by_date:
+        dates = transactions["Дата операции"]
+    elif isinstance(index, pd.DatetimeIndex) and index.is_monotonic_increasing:
+        dates = index
+    else:
+        dates = pd.Index(transactions["Дата операции"])
+        if not dates.is_monotonic_increasing:
+            dates = transactions["Дата операции"]
+            return transactions[(dates >= start_date) & (dates <= end_date)]
+
+    start = dates.searchsorted(pd.Timestamp(start_date), side="left")
+    stop = dates.searchsorted(pd.Timestamp(end_date), side="right")
+    selected = transactions.iloc[start:stop]
+    if sorted_by_date:
+        _sorted_by_date[id(selected)] = selected
+    return selected
+
+
+def is_ingested(path: str) -> bool:
+    """Является ли путь каталогом накопительного хранилища выписок (src.ingest)."""
+    return os.path.isfile(os.path.join(path, STORE_MANIFEST))
+
+
+def source_path(file_path: str) -> str:
+    """Файл, по которому отслеживаются изменения источника: сама выгрузка или манифест хранилища.
+
+    Части хранилища после записи не меняются, поэтому новая версия манифеста — это новая версия данных.
+    """
+    if os.path.isdir(file_path):
+        return os.path.join(file_path, STORE_MANIFEST)
+    return file_path
+
+
+def file_digest(file_path: str) -> str:
+    """Считает SHA-256 содержимого файла."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sidecar_path(file_path: str, digest: str) -> str:
+    """Путь к колоночному кэшу (Feather) рядом с исходной выгрузкой."""
+    directory, name = os.path.split(os.path.abspath(file_path))
+    return os.path.join(directory, f".{name}.{digest[:16]}.feather")
+
+
+def read_sidecar(path: str, memory_map: bool = True) -> Optional[pd.DataFrame]:
+    """Читает колоночный кэш, если он есть. При memory_map файл отображается в память, а не копируется."""
+    if feather is None or not os.path.exists(path):
+        return None
+    try:
+        return feather.read_table(path, memory_map=memory_map).to_pandas()
+    except Exception as e:
+        logger.warning("Не удалось прочитать кэш %s: %s", path, e)
+        return None
+
+
+def write_sidecar(transactions: pd.DataFrame, path: str) -> None:
+    """Сохраняет колоночный кэш и удаляет кэши от прежних версий файла.
+
+    Кэш пишется во временный файл процесса и подменяет прежний одним переименованием, поэтому другие процессы
+    не прочитают его недописанным.
+    """
+    if feather is None:
+        return
+    stale = glob.glob(path[: -len(".feather")].rsplit(".", 1)[0] + ".*.feather")
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        feather.write_feather(transactions.reset_index(drop=True), temporary_path)
+        os.replace(temporary_path, path)
+    except Exception as e:
+        logger.warning("Не удалось сохранить кэш %s: %s", path, e)
+        try:
+            os.remove(temporary_path)
+        except OSError:
+            pass
+        return
+    for old_path in stale:
+        if old_path != path:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+
+class TransactionStore:
+    """Кэш загруженных выгрузок: файл читается один раз, пока не изменится на диске."""
+
+    def __init__(self, use_sidecar: bool = True, memory_map: bool = True) -> None:
+        self._cache: Dict[str, Tuple[Tuple[float, int], pd.DataFrame]] = {}
+        self._derived: Dict[str, Tuple[pd.DataFrame, Dict[str, Any]]] = {}
+        self._digests: Dict[str, Tuple[Tuple[float, int], str]] = {}
+        self._lock = threading.Lock()
+        self._digest_lock = threading.Lock()
+        self.use_sidecar = use_sidecar
+        self.memory_map = memory_map
+
+    def load(self, file_path: str) -> pd.DataFrame:
+        """Возвращает DataFrame с транзакциями. Результат общий для всех вызовов, изменять его нельзя.
+
+        Каталог накопительного хранилища (src.ingest) загружается как одна выгрузка.
+        """
+        key = os.path.abspath(file_path)
+        try:
+            stat = os.stat(source_path(key))
+        except OSError:
+            if os.path.isdir(key):
+                raise FileNotFoundError(f"Хранилище выписок пусто: {file_path}")
+            # Файла нет на диске: кэшировать нечего, ошибку вернет сам pd.read_excel
+            return index_by_date(normalize_transactions(read_excel(file_path)))
+
+        signature = (stat.st_mtime, stat.st_size)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+
+            transactions = self._read(file_path)
+            with span("parse.index_by_date") as stage:
+                transactions = index_by_date(transactions)
+                stage.add(rows=len(transactions))
+            self._cache[key] = (signature, transactions)
+            return transactions
+
+    def derive(
+        self, file_path: str, transactions: pd.DataFrame, name: str, build: Callable[[pd.DataFrame], Any]
+    ) -> Any:
+        """Возвращает данные, построенные функцией build по загруженной выгрузке (индексы, агрегаты).
+
+        Результат хранится вместе с выгрузкой и пересчитывается только при изменении файла.
+        """
+        key = os.path.abspath(file_path)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is None or cached[1] is not transactions:
+                # Выгрузка не кэшируется (например, файла нет на диске)
+                cacheable = False
+            else:
+                cacheable = True
+                source, derived = self._derived.get(key, (None, {}))
+                if source is transactions and name in derived:
+                    return derived[name]
+
+        value = build(transactions)
+        if cacheable:
+            with self._lock:
+                source, derived = self._derived.get(key, (None, {}))
+                if source is not transactions:
+                    derived = {}
+                derived[name] = value
+                self._derived[key] = (transactions, derived)
+        return value
+
+    def built(self, file_path: str, transactions: pd.DataFrame, name: str) -> Any:
+        """Производные данные name, если они уже построены по этой версии выгрузки, иначе None. Ничего не строит."""
+        key = os.path.abspath(file_path)
+        with self._lock:
+            source, derived = self._derived.get(key, (None, {}))
+            if source is transactions:
+                return derived.get(name)
+        return None
+
+    def fingerprint(self, file_path: str) -> str:
+        """SHA-256 содержимого выгрузки. Пересчитывается, только если изменились время изменения или размер файла.
+
+        Для накопительного хранилища — SHA-256 его манифеста.
+        """
+        key = source_path(os.path.abspath(file_path))
+        stat = os.stat(key)
+        signature = (stat.st_mtime, stat.st_size)
+        with self._digest_lock:
+            cached = self._digests.get(key)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+        digest = file_digest(key)
+        with self._digest_lock:
+            self._digests[key] = (signature, digest)
+        return digest
+
+    def _read(self, file_path: str) -> pd.DataFrame:
+        """Читает выгрузку из колоночного кэша, а при его отсутствии из Excel с сохранением кэша.
+
+        Накопительное хранилище уже лежит в Feather и читается напрямую, без отдельного кэша.
+        """
+        if os.path.isdir(file_path):
+            from src.ingest import IncrementalStore
+
+            logger.info("Загрузка транзакций из хранилища: %s", file_path)
+            return parse(IncrementalStore(file_path).read_parts())
+
+        if not self.use_sidecar or feather is None:
+            logger.info("Загрузка транзакций из файла: %s", file_path)
+            return parse(read_excel(file_path))
+
+        path = sidecar_path(file_path, self.fingerprint(file_path))
+        with span("load.sidecar") as stage:
+            transactions = read_sidecar(path, memory_map=self.memory_map)
+            if transactions is not None:
+                stage.add(rows=len(transactions), bytes=os.path.getsize(path))
+        if transactions is not None:
+            logger.info("Транзакции загружены из кэша: %s", path)
+            # Кэш мог быть записан до изменения схемы; для уже приведенных колонок это почти бесплатно
+            return parse(transactions)
+
+        logger.info("Загрузка транзакций из файла: %s", file_path)
+        transactions = parse(read_excel(file_path))
+        write_sidecar(transactions, path)
+        return transactions
+
+    def clear(self) -> None:
+        """Очищает кэш загруженных файлов."""
+        with self._lock:
+            self._cache.clear()
+            self._derived.clear()
+        with self._digest_lock:
+            self._digests.clear()
+
+
+store = TransactionStore()
+
+
+def load_transactions(file_path: str) -> pd.DataFrame:
+    """Загружает транзакции через общий кэш процесса."""
+    return store.load(file_path)
+
+
+def file_fingerprint(file_path: str) -> str:
+    """Отпечаток содержимого выгрузки (SHA-256) через общий кэш процесса."""
+    return store.fingerprint(file_path)
+
+
+def result_key(file_path: str, *params: Any) -> str | None:
+    """Ключ кэша вычисленного результата: отпечаток содержимого выгрузки и параметры вызова.
+
+    None, если файла нет на диске: кэшировать нечего, ошибку вернет сама загрузка.
+    """
+    try:
+        fingerprint = file_fingerprint(file_path)
+    except OSError:
+        return None
+    return json.dumps([fingerprint, *params], ensure_ascii=False, default=str)
+
+
+def derive(file_path: str, transactions: pd.DataFrame, name: str, build: Callable[[pd.DataFrame], Any]) -> Any:
+    """Возвращает производные данные по выгрузке через общий кэш процесса."""
+    return store.derive(file_path, transactions, name, build)
+
+
+def built(file_path: str, transactions: pd.DataFrame, name: str) -> Any:
+    """Уже построенные производные данные по выгрузке из общего кэша процесса или None."""
+    return store.built(file_path, transactions, name)
+
+
+def format_dates(transactions: pd.DataFrame) -> pd.DataFrame:
+    """Возвращает копию с датами в исходном строковом формате выгрузки (для вывода в JSON)."""
+    formatted = format_payment_dates(transactions.copy())
+    if "Дата операции" in formatted and pd.api.types.is_datetime64_any_dtype(formatted["Дата операции"]):
+        formatted["Дата операции"] = formatted["Дата операции"].dt.strftime(OPERATION_DATE_FORMAT)
+    return formatted
+
+
+def format_payment_dates(transactions: pd.DataFrame) -> pd.DataFrame:
+    """Возвращает копию с датой платежа в строковом формате выгрузки (ДД.ММ.ГГГГ), как до разбора дат."""
+    if "Дата платежа" not in transactions or not pd.api.types.is_datetime64_any_dtype(transactions["Дата платежа"]):
+        return transactions
+    return transactions.assign(**{"Дата платежа": transactions["Дата платежа"].dt.strftime(PAYMENT_DATE_FORMAT)})
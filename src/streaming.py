@@ -0,0 +1,72 @@
+import logging
+from typing import Iterator
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from src.reports import filter_by_category, get_report_period
+from src.services import filter_phone_transactions
+from src.store import normalize_transactions
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 10_000
+
+
+def read_header(file_path: str) -> list:
+    """Возвращает заголовки колонок выгрузки (первую строку листа)."""
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        header = next(workbook.active.iter_rows(max_row=1, values_only=True), ())
+    finally:
+        workbook.close()
+    return list(header)
+
+
+def iter_transaction_batches(file_path: str, batch_size: int = BATCH_SIZE) -> Iterator[pd.DataFrame]:
+    """Построчно читает выгрузку и отдает ее пачками по batch_size строк с приведенными типами."""
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+
+        batch = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield normalize_transactions(pd.DataFrame(batch, columns=header))
+                batch = []
+        if batch:
+            yield normalize_transactions(pd.DataFrame(batch, columns=header))
+    finally:
+        workbook.close()
+
+
+def stream_spending_by_category(
+    file_path: str, category: str, date: str | None = None, batch_size: int = BATCH_SIZE
+) -> pd.DataFrame:
+    """Траты по категории за три месяца без загрузки всей выгрузки в память."""
+    start_date, end_date = get_report_period(date)
+
+    parts = [
+        filter_by_category(batch, category, start_date, end_date)
+        for batch in iter_transaction_batches(file_path, batch_size)
+    ]
+    parts = [part for part in parts if not part.empty]
+    if not parts:
+        logger.warning("Не найдено транзакций по категории '%s' за последние три месяца.", category)
+        return pd.DataFrame(columns=read_header(file_path))
+
+    return pd.concat(parts, ignore_index=True).sort_values(by="Дата операции")
+
+
+def stream_transactions_with_phone_numbers(file_path: str, batch_size: int = BATCH_SIZE) -> Iterator[pd.DataFrame]:
+    """Отдает по пачкам транзакции, в описании которых есть мобильный номер."""
+    for batch in iter_transaction_batches(file_path, batch_size):
+        matched = filter_phone_transactions(batch)
+        if not matched.empty:
+            yield matched
@@ -1,48 +1,165 @@
-import logging
+import functools
 import os
-from typing import Dict, Optional
+import threading
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import Future
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-# Загрузка переменных окружения
-load_dotenv()
+from src.cache import TTLCache
+from src.log import file_logger
+from src.metrics import span
 
-CURRENCY_API_KEY = os.getenv("CURRENCY_API_KEY")
-SHARES_API_KEY = os.getenv("SHARES_API_KEY")
+# Базовые адреса API можно переопределить, например, для локального тестового сервера.
+# None — взять адрес из окружения (.env) при первом запросе или адрес по умолчанию
+CURRENCY_API_URL: str | None = None
+SHARES_API_URL: str | None = None
+RATES_API_URL: str | None = None
+DEFAULT_CURRENCY_API_URL = "https://v6.exchangerate-api.com/v6"
+DEFAULT_SHARES_API_URL = "https://financialmodelingprep.com/api/v3"
+DEFAULT_RATES_API_URL = "https://www.cbr.ru/scripts"  # исторические курсы ЦБ РФ, без ключа
 
-# Создаем директорию для логов, если она не существует
-LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs")
-os.makedirs(LOG_DIR, exist_ok=True)
+# Сроки хранения данных в кэше, в секундах
+RATES_TTL = 6 * 60 * 60
+SYMBOLS_TTL = 30 * 24 * 60 * 60
+CURRENCY_CODES_TTL = 30 * 24 * 60 * 60
+QUOTES_TTL = 60
 
-currency_rate_logger = logging.getLogger("get_currency_rates")
-stock_info_logger = logging.getLogger("get_stock_info")
-stock_prices_logger = logging.getLogger("get_stock_prices")
-currency_rate_logger.propagate = False
-stock_info_logger.propagate = False
-stock_prices_logger.propagate = False
-file_handler = logging.FileHandler(os.path.join(LOG_DIR, "utils.log"), mode="w", encoding="utf-8")
-file_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
-currency_rate_logger.addHandler(file_handler)
-stock_info_logger.addHandler(file_handler)
-stock_prices_logger.addHandler(file_handler)
+REQUEST_TIMEOUT = (3.05, 10)  # таймауты на соединение и чтение, в секундах
+MAX_WORKERS = 8
+QUOTE_BATCH_SIZE = 50  # тикеров в одном запросе котировок
 
+# Записи уходят в общую очередь логов; файл utils.log создается при первой записи, а не при импорте
+currency_rate_logger = file_logger("get_currency_rates", "utils.log")
+stock_info_logger = file_logger("get_stock_info", "utils.log")
+stock_prices_logger = file_logger("get_stock_prices", "utils.log")
+rate_history_logger = file_logger("get_rate_history", "utils.log")
 
-def get_currency_rates(currencies: list) -> dict:
-    """Функция для получения курса валют"""
-    currency_rate_logger.info("Функция get_currency_rates начала работу.")
-    url = f"https://v6.exchangerate-api.com/v6/{CURRENCY_API_KEY}/latest/RUB"
+rates_cache = TTLCache("currency_rates", ttl=RATES_TTL, maxsize=16)
+symbols_cache = TTLCache("stock_symbols", ttl=SYMBOLS_TTL, maxsize=1024)
+quotes_cache = TTLCache("stock_quotes", ttl=QUOTES_TTL, maxsize=1024)
+currency_codes_cache = TTLCache("currency_codes", ttl=CURRENCY_CODES_TTL, maxsize=1)
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def load_env() -> None:
+    """Загружает переменные окружения из .env один раз, при первом обращении к настройкам API."""
+    load_dotenv()
+
+
+def api_setting(name: str, default: str | None = None) -> str | None:
+    """Настройка API из переменных окружения."""
+    load_env()
+    return os.getenv(name, default)
+
+
+def currency_api_url() -> str:
+    load_env()
+    return CURRENCY_API_URL or os.getenv("CURRENCY_API_URL") or DEFAULT_CURRENCY_API_URL
+
+
+def shares_api_url() -> str:
+    load_env()
+    return SHARES_API_URL or os.getenv("SHARES_API_URL") or DEFAULT_SHARES_API_URL
+
+
+def rates_api_url() -> str:
+    load_env()
+    return RATES_API_URL or os.getenv("RATES_API_URL") or DEFAULT_RATES_API_URL
+
+
+def run_in_thread(func: Callable[..., Any], *args: Any) -> Future:
+    """Запускает func(*args) в фоновом потоке и возвращает Future с результатом.
+
+    Поток — daemon, поэтому не задерживает выход из процесса: в отличие от потоков ThreadPoolExecutor,
+    которые интерпретатор дожидается при завершении, зависший запрос к API прерывается вместе с процессом.
+    """
+    future: Future = Future()
+
+    def run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=f"background-{getattr(func, '__name__', 'task')}", daemon=True).start()
+    return future
+
+
+def map_in_threads(func: Callable[[Any], Any], items: Iterable[Any], max_workers: int = MAX_WORKERS) -> List[Any]:
+    """Параллельный map в фоновых потоках (run_in_thread), не больше max_workers вызовов одновременно."""
+    slots = threading.BoundedSemaphore(max_workers)
+
+    def limited(item: Any) -> Any:
+        with slots:
+            return func(item)
+
+    return [future.result() for future in [run_in_thread(limited, item) for item in items]]
+
+
+def get_session() -> requests.Session:
+    """Возвращает общую HTTP-сессию с пулом соединений и повторами запросов."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(["GET"]),
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def http_get(stage: str, url: str) -> requests.Response:
+    """GET-запрос через общую сессию с замером этапа stage (время и размер ответа)."""
+    with span(stage) as http_stage:
+        response = get_session().get(url, timeout=REQUEST_TIMEOUT)
+        if isinstance(response.content, bytes):
+            http_stage.add(bytes=len(response.content))
+    return response
+
+
+def fetch_rate_table() -> dict | None:
+    """Запрашивает таблицу курсов к рублю. При ошибке возвращает None."""
+    url = f"{currency_api_url()}/{api_setting('CURRENCY_API_KEY')}/latest/RUB"
 
     try:
-        response = requests.get(url)
+        response = http_get("http.currency_rates", url)
         response.raise_for_status()
         currency_rate_logger.info("Запрос к API выполнен успешно.")
     except requests.RequestException as e:
-        currency_rate_logger.error(f"Ошибка при запросе к API: {e}")
-        return {}
+        currency_rate_logger.error("Ошибка при запросе к API: %s", e)
+        return None
+
+    rates: dict = response.json().get("conversion_rates", {})
+    return rates
+
+
+def get_currency_rates(currencies: list) -> dict:
+    """Функция для получения курса валют"""
+    currency_rate_logger.info("Функция get_currency_rates начала работу.")
 
-    # Получение данных о курсах
-    rates = response.json().get("conversion_rates", {})
+    # Получение данных о курсах (таблица обновляется раз в сутки, поэтому берется из кэша)
+    rates = rates_cache.get_or_fetch("RUB", fetch_rate_table)
+    if rates is None:
+        return {}
 
     # Преобразование курсов в формат "1 валюта = X RUB"
     currency_rates: Dict[str, Optional[float]] = {}
@@ -57,38 +174,170 @@ def get_currency_rates(currencies: list) -> dict:
     return currency_rates
 
 
-def get_stock_info(symbol: str) -> dict | None:
-    """Функция для получения информации об акциях"""
-    stock_info_logger.info("Функция get_stock_info начала работу.")
-    search_url = f"https://financialmodelingprep.com/api/v3/search?query={symbol}&apikey={SHARES_API_KEY}"
-    response = requests.get(search_url)
+def fetch_currency_codes() -> dict | None:
+    """Запрашивает внутренние коды валют ЦБ РФ по буквенным кодам ISO. При ошибке возвращает None."""
+    try:
+        response = http_get("http.currency_codes", f"{rates_api_url()}/XML_valFull.asp")
+        response.raise_for_status()
+        root = ElementTree.fromstring(response.content)
+    except (requests.RequestException, ElementTree.ParseError) as e:
+        rate_history_logger.error("Ошибка при запросе к API: %s", e)
+        return None
+
+    return {
+        item.findtext("ISO_Char_Code"): item.get("ID") for item in root.iter("Item") if item.findtext("ISO_Char_Code")
+    }
+
+
+def get_rate_history(currency: str, start: date, end: date) -> dict | None:
+    """Курсы валюты к рублю за период включительно, одним запросом: {дата ГГГГ-ММ-ДД: рублей за единицу}.
+
+    ЦБ РФ публикует курсы только на рабочие дни, поэтому дат в ответе меньше, чем дней в периоде.
+    При ошибке или неизвестной валюте возвращает None.
+    """
+    rate_history_logger.info("Запрос курсов %s за период %s — %s.", currency, start, end)
+    codes = currency_codes_cache.get_or_fetch("CBR", fetch_currency_codes)
+    if not codes or currency not in codes:
+        rate_history_logger.warning("Валюта %s не найдена в справочнике ЦБ РФ.", currency)
+        return None
+
+    url = (
+        f"{rates_api_url()}/XML_dynamic.asp?date_req1={start:%d/%m/%Y}&date_req2={end:%d/%m/%Y}"
+        f"&VAL_NM_RQ={codes[currency]}"
+    )
+    try:
+        response = http_get("http.rate_history", url)
+        response.raise_for_status()
+        history = {}
+        for record in ElementTree.fromstring(response.content).iter("Record"):
+            # Курс указан за Nominal единиц валюты (например, за 10 лир) с запятой в качестве разделителя
+            value = float(record.findtext("Value", "").replace(",", "."))
+            nominal = float(record.findtext("Nominal", "1").replace(",", "."))
+            history[datetime.strptime(record.get("Date", ""), "%d.%m.%Y").date().isoformat()] = value / nominal
+    except (requests.RequestException, ElementTree.ParseError, ValueError) as e:
+        rate_history_logger.error("Ошибка при запросе к API: %s", e)
+        return None
+
+    return history
+
+
+def search_stock(symbol: str) -> dict | None:
+    """Ищет акцию через API. Возвращает первый найденный результат или None."""
+    search_url = f"{shares_api_url()}/search?query={symbol}&apikey={api_setting('SHARES_API_KEY')}"
+    try:
+        response = http_get("http.stock_search", search_url)
+    except requests.RequestException as e:
+        stock_info_logger.error("Ошибка при запросе к API: %s", e)
+        return None
     if response.status_code == 200:
         data = response.json()
         stock_info_logger.info("Запрос к API выполнен успешно.")
         return data[0] if data else None
     else:
-        stock_info_logger.error(f"Ошибка при запросе к API: {response.status_code}")
+        stock_info_logger.error("Ошибка при запросе к API: %s", response.status_code)
         return None
 
 
+def get_stock_info(symbol: str) -> dict | None:
+    """Функция для получения информации об акциях"""
+    stock_info_logger.info("Функция get_stock_info начала работу.")
+    return symbols_cache.get_or_fetch(symbol, lambda: search_stock(symbol))
+
+
+def fetch_quote(symbol: str) -> float | None:
+    """Запрашивает текущую стоимость акции по тикеру. При ошибке возвращает None."""
+    url = f"{shares_api_url()}/quote-short/{symbol}?apikey={api_setting('SHARES_API_KEY')}"
+    try:
+        response = http_get("http.quotes", url)
+    except requests.RequestException as e:
+        stock_prices_logger.error("Ошибка при запросе к API: %s", e)
+        return None
+    if response.status_code == 200:
+        data = response.json()
+        return data[0]["price"] if data else None
+
+    stock_prices_logger.error("Ошибка при запросе к API: %s", response.status_code)
+    return None
+
+
+def get_stock_price(stock: str) -> Tuple[str, Optional[float]] | None:
+    """Находит тикер акции и запрашивает его стоимость. Возвращает пару (тикер, цена)."""
+    stock_info = get_stock_info(stock)
+    if not stock_info:
+        stock_prices_logger.warning("Акция %s не найдена.", stock)
+        return None
+
+    symbol = stock_info["symbol"]
+    return symbol, quotes_cache.get_or_fetch(symbol, lambda: fetch_quote(symbol))
+
+
+def fetch_quotes(symbols: list) -> dict | None:
+    """Запрашивает котировки нескольких тикеров одним запросом. При ошибке возвращает None."""
+    url = f"{shares_api_url()}/quote-short/{','.join(symbols)}?apikey={api_setting('SHARES_API_KEY')}"
+    try:
+        response = http_get("http.quotes", url)
+    except requests.RequestException as e:
+        stock_prices_logger.error("Ошибка при запросе к API: %s", e)
+        return None
+    if response.status_code != 200:
+        stock_prices_logger.error("Ошибка при запросе к API: %s", response.status_code)
+        return None
+
+    return {item["symbol"].upper(): item.get("price") for item in response.json() if "symbol" in item}
+
+
 def get_stock_prices(stocks: list) -> dict:
-    """Функция для получения стоимости акций"""
+    """Функция для получения стоимости акций.
+
+    Котировки запрашиваются пачками по QUOTE_BATCH_SIZE тикеров. Поиск тикера по названию выполняется
+    только для тех акций, которых нет в ответе пакетного запроса.
+    """
     stock_prices_logger.info("Функция get_stock_prices начала работу.")
+    prices: Dict[str, Optional[float]] = {}
+    missing = []
+    for stock in dict.fromkeys(stocks):
+        found, price = quotes_cache.get(stock.upper())
+        if found:
+            prices[stock.upper()] = price
+        else:
+            missing.append(stock)
+
+    chunks = []
+    for start in range(0, len(missing), QUOTE_BATCH_SIZE):
+        stop = start + QUOTE_BATCH_SIZE
+        chunks.append(missing[start:stop])
+
+    unresolved = []
+    fetched: Dict[str, Optional[float]] = {}
+    if chunks:
+        for chunk, quotes in zip(chunks, map_in_threads(fetch_quotes, chunks)):
+            for stock in chunk:
+                symbol = stock.upper()
+                if quotes is None:
+                    # API недоступен: отдаем последнюю известную котировку, если она есть
+                    found, price = quotes_cache.get(symbol, allow_stale=True)
+                    if found:
+                        prices[symbol] = price
+                elif symbol in quotes:
+                    prices[symbol] = quotes[symbol]
+                    fetched[symbol] = quotes[symbol]
+                else:
+                    unresolved.append(stock)
+    # Полученные котировки сохраняются в кэш одной записью файла, а не по одной на тикер
+    quotes_cache.set_many(fetched)
+
+    # Акции, которых нет в пакетном ответе, ищем по названию
+    resolved = {}
+    if unresolved:
+        resolved = dict(zip(unresolved, map_in_threads(get_stock_price, unresolved)))
+
     stock_data = {}
     for stock in stocks:
-        stock_info = get_stock_info(stock)
-        if stock_info:
-            symbol = stock_info["symbol"]
-            url = f"https://financialmodelingprep.com/api/v3/quote-short/{symbol}?apikey={SHARES_API_KEY}"
-            response = requests.get(url)
-            if response.status_code == 200:
-                data = response.json()
-                stock_data[symbol] = data[0]["price"] if data else None
-            else:
-                stock_data[symbol] = None
-                stock_prices_logger.error(f"Ошибка при запросе к API: {response.status_code}")
-        else:
-            stock_prices_logger.warning(f"Акция {stock} не найдена.")
+        if stock.upper() in prices:
+            stock_data[stock.upper()] = prices[stock.upper()]
+        elif resolved.get(stock) is not None:
+            symbol, price = resolved[stock]
+            stock_data[symbol] = price
 
     stock_prices_logger.info("Функция get_stock_prices завершила работу.")
     return stock_data
@@ -1,10 +1,35 @@
 import json
+import logging
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from datetime import datetime
-from typing import Any, Dict
+from typing import Any, Dict, List, Tuple
 
+import numpy as np
 import pandas as pd
 
-from src.utils import get_currency_rates, get_stock_prices
+from src import database
+from src.cache import ResultCache
+from src.cube import SpendingCube
+from src.ingest import CardMonthlyTotals, IncrementalStore
+from src.metrics import span
+from src.rates import BASE_CURRENCY, convert_amounts
+from src.store import built, card_labels, cashback, derive, is_ingested, load_transactions, result_key, select_period
+from src.utils import get_currency_rates, get_stock_prices, run_in_thread
+
+logger = logging.getLogger(__name__)
+
+DATA_PATH = "../data/operations.xlsx"
+SETTINGS_PATH = "../user_settings.json"
+
+# Время в секундах от начала формирования отчета, за которое должен быть получен каждый раздел.
+# rate_history — догрузка исторических курсов для пересчета сумм: без нее рублевый отчет строится по суммам выписки
+SECTION_TIMEOUTS = {"currency_rates": 5.0, "stock_prices": 10.0, "rate_history": 5.0}
+
+# Расходы по картам для главной страницы: ключ — отпечаток выгрузки, дата и движок.
+# Курсы и котировки кэшируются отдельно в utils, со своим сроком жизни
+spending_cache = ResultCache("spending_data")
 
 
 def get_greeting() -> str:
@@ -20,74 +45,234 @@ def get_greeting() -> str:
         return "Доброй ночи"
 
 
-def get_spending_data(transactions: pd.DataFrame, end_date: datetime) -> Dict[str, Dict[str, Any]]:
-    """Возвращает приветствие в зависимости от текущего времени"""
-    start_date = end_date.replace(day=1)
-    print(f"Filtering transactions from {start_date} to {end_date}")
+def card_totals(transactions: pd.DataFrame) -> pd.Series:
+    """Суммы платежей по картам в порядке первой операции карты.
 
-    filtered_transactions = transactions[
-        (transactions["Дата операции"] >= start_date) & (transactions["Дата операции"] <= end_date)
-    ]
+    Строки каждой карты складываются в порядке выгрузки так же, как Series.sum() (попарным сложением numpy),
+    поэтому итоги совпадают с подсчетом по каждой карте до последнего знака. groupby().sum() складывает
+    с компенсацией ошибки округления и расходится с ним в последних знаках.
+    """
+    codes, cards = pd.factorize(transactions["Номер карты"], sort=False)
+    order = np.argsort(codes, kind="stable")
+    amounts = transactions["Сумма платежа"].to_numpy(dtype="float64")[order]
+    amounts = np.where(np.isnan(amounts), 0.0, amounts)
+    bounds = np.flatnonzero(np.diff(codes[order])) + 1
+    totals = [part.sum() for part in np.split(amounts, bounds)] if len(amounts) else []
+    return pd.Series(totals, index=cards, dtype="float64")
 
-    card_data: Dict[str, Dict[str, Any]] = {}
 
-    filtered_transactions.loc[:, "Номер карты"] = filtered_transactions["Номер карты"].astype(str)
+def get_spending_data(
+    transactions: pd.DataFrame, end_date: datetime, cube: SpendingCube | CardMonthlyTotals | None = None
+) -> Dict[str, Dict[str, Any]]:
+    """Возвращает по каждой карте сумму расходов, кешбэк и топ-5 транзакций с начала месяца.
 
-    for card_number in filtered_transactions["Номер карты"].unique():
-        card_transactions = filtered_transactions[filtered_transactions["Номер карты"] == card_number]
+    Если передан куб дневных сумм или месячные итоги хранилища (cube), итоги по картам берутся из них,
+    а строки нужны только для топ-5.
+    """
+    start_date = end_date.replace(day=1)
 
-        total_spent = card_transactions["Сумма платежа"].sum()
-        cashback = total_spent // 100  # 1 рубль на каждые 100 рублей
+    with span("filter.period") as stage:
+        # Порядок файла: карты перечисляются, а равные суммы в топ-5 выбираются как в выгрузке
+        filtered_transactions = select_period(transactions, start_date, end_date).sort_index()
+        # Новый столбец вместо записи в срез, чтобы не изменить общий DataFrame из хранилища
+        filtered_transactions = filtered_transactions.assign(
+            **{"Номер карты": card_labels(filtered_transactions["Номер карты"])}
+        )
+        stage.add(rows=len(filtered_transactions))
 
-        top_transactions = card_transactions.nlargest(5, "Сумма платежа")
+    with span("aggregate.card_totals") as stage:
+        card_numbers = filtered_transactions["Номер карты"].unique()
+        if cube is not None:
+            totals = cube.totals(start_date, end_date, by="Номер карты")["Сумма платежа"].reindex(card_numbers)
+        else:
+            # Суммы по всем картам за одну сортировку по карте
+            totals = card_totals(filtered_transactions)
+        stage.add(rows=len(filtered_transactions))
 
+    # Топ-5 по каждой карте: одна сортировка и head внутри групп вместо nlargest по каждой карте
+    with span("aggregate.top_transactions") as stage:
+        top_transactions = (
+            filtered_transactions.dropna(subset=["Сумма платежа"])
+            .sort_values(by="Сумма платежа", ascending=False, kind="stable")
+            .groupby("Номер карты", sort=False, observed=True)
+            .head(5)
+        )
+        stage.add(rows=len(filtered_transactions))
+    top_records: Dict[str, List[Dict[str, Any]]] = {card_number: [] for card_number in totals.index}
+    for card_number, record in zip(
+        top_transactions["Номер карты"],
+        top_transactions[["Дата операции", "Категория", "Сумма платежа"]].to_dict(orient="records"),
+    ):
+        top_records[card_number].append(record)
+
+    card_data: Dict[str, Dict[str, Any]] = {}
+    for card_number, total_spent in totals.items():
         card_data[card_number] = {
             "last_4_digits": card_number[-4:],
             "total_spent": total_spent,
-            "cashback": cashback,
-            "top_transactions": top_transactions[["Дата операции", "Категория", "Сумма платежа"]].to_dict(
-                orient="records"
-            ),
+            "cashback": cashback(total_spent),
+            "top_transactions": top_records[card_number],
         }
 
     return card_data
 
 
-def generate_report(date_str: str) -> str:
-    """Функция генерирует отчет о расходах, курсах валют и стоимости акций на указанную дату."""
-    end_date = pd.to_datetime(date_str, format="%Y-%m-%d %H:%M:%S")
-
+def load_user_settings(path: str = SETTINGS_PATH) -> Dict[str, Any] | None:
+    """Читает пользовательские настройки. Возвращает None, если файла нет."""
     try:
-        transactions = pd.read_excel("../data/operations.xlsx")
-        transactions["Дата операции"] = pd.to_datetime(
-            transactions["Дата операции"], format="%d.%m.%Y %H:%M:%S", dayfirst=True
-        )
-        transactions["Дата платежа"] = pd.to_datetime(transactions["Дата платежа"], format="%d.%m.%Y", dayfirst=True)
+        with open(path, "r", encoding="utf-8") as file:
+            settings: Dict[str, Any] = json.load(file)
     except FileNotFoundError:
-        return json.dumps({"error": "Файл с данными не найден"}, ensure_ascii=False, indent=4)
+        return None
+    return settings
 
-    spending_data = get_spending_data(transactions, end_date)
 
+def wait_section(name: str, future: Future, deadline: float) -> Any:
+    """Ждет результат раздела отчета до общего дедлайна. Если не успел — пустой раздел."""
     try:
-        with open("../user_settings.json", "r", encoding="utf-8") as file:
-            user_settings = json.load(file)
-    except FileNotFoundError:
-        return json.dumps({"error": "Файл настроек не найден"}, ensure_ascii=False, indent=4)
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except FutureTimeoutError:
+        logger.warning("Раздел %s не получен за отведенное время и пропущен.", name)
+    except Exception as e:
+        logger.error("Ошибка при получении раздела %s: %s", name, e)
+    return {}
+
+
+def card_spending(
+    file_path: str,
+    end_date: datetime,
+    engine: str = "pandas",
+    currency: str | None = BASE_CURRENCY,
+    rates_timeout: float | None = None,
+) -> Dict[str, Dict[str, Any]]:
+    """Расходы по картам для главной страницы: даты топ-транзакций уже переведены в строки.
+
+    currency — валюта, в которую пересчитываются суммы платежей по курсу на дату операции; None — суммы
+    как в выписке. Пересчет одинаков для обоих движков: если за месяц есть платежи в других валютах,
+    итоги считаются по пересчитанным строкам месяца (для engine="sqlite" они выбираются запросом к базе).
+    rates_timeout — сколько секунд ждать догрузки курсов (LookupError, если не успели).
+    """
+    start_date = end_date.replace(day=1)
+    if engine == "sqlite":
+        if currency is not None:
+            period = database.period_transactions(file_path, start_date, end_date)
+            converted = convert_amounts(period, currency, rates_timeout)
+            if converted is not period:
+                return format_top_dates(get_spending_data(converted, end_date))
+        return format_top_dates(database.spending_data(file_path, end_date))
+
+    transactions = load_transactions(file_path)
+    # Пересчитываются только строки месяца отчета: курсы нужны лишь за этот период
+    period = select_period(transactions, start_date, end_date)
+    converted = period if currency is None else convert_amounts(period, currency, rates_timeout)
+    if converted is not period:
+        spending_data = get_spending_data(converted, end_date)
+    elif is_ingested(file_path):
+        # Накопительное хранилище: итоги по картам из его агрегата по месяцам, строки — для краев месяца и топ-5
+        monthly_totals = derive(file_path, transactions, "card_monthly", IncrementalStore(file_path).card_totals)
+        spending_data = get_spending_data(transactions, end_date, monthly_totals)
+    else:
+        # Куб дневных сумм используется, только если уже построен (сервер строит его при запуске): ради одного
+        # месяца строить его по всей истории в каждом процессе CLI дороже, чем сгруппировать строки месяца
+        spending_data = get_spending_data(transactions, end_date, built(file_path, transactions, "cube"))
+    return format_top_dates(spending_data)
 
-    currency_rates = get_currency_rates(user_settings.get("user_currencies", []))
-    stock_prices = get_stock_prices(user_settings.get("user_stocks", []))
 
+def format_top_dates(spending_data: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Переводит даты топ-транзакций в строки ГГГГ-ММ-ДД ЧЧ:ММ:СС."""
     for card in spending_data:
         for transaction in spending_data[card]["top_transactions"]:
             transaction["Дата операции"] = transaction["Дата операции"].strftime("%Y-%m-%d %H:%M:%S")
+    return spending_data
+
+
+def cached_card_spending(
+    file_path: str,
+    date_str: str,
+    end_date: datetime,
+    engine: str,
+    currency: str | None,
+    rates_timeout: float | None = None,
+) -> Tuple[str | None, Dict[str, Dict[str, Any]]]:
+    """Расходы по картам через кэш отчетов (spending_cache). Возвращает пару (валюта сумм, расходы).
+
+    Если для пересчета в рубли нет курсов (например, нет сети или API не ответил за rates_timeout секунд),
+    суммы остаются как в выписке, а валюта сумм — None:
+    вызывающий код показывает, что итоги не пересчитаны. Такой результат кэшируется под ключом без валюты
+    и не подменяет пересчитанный. Для других валют отсутствие курса — ошибка (LookupError).
+    """
+
+    def compute(target: str | None) -> Dict[str, Dict[str, Any]]:
+        spending_data: Dict[str, Dict[str, Any]] = spending_cache.get_or_compute(
+            result_key(file_path, date_str, engine, target),
+            lambda: card_spending(file_path, end_date, engine, target, rates_timeout),
+        )
+        return spending_data
+
+    try:
+        return currency, compute(currency)
+    except LookupError as e:
+        if currency != BASE_CURRENCY:
+            raise
+        logger.warning("Суммы в других валютах оставлены без пересчета в рубли: %s", e)
+        return None, compute(None)
+
+
+def generate_report(
+    date_str: str,
+    timeouts: Dict[str, float] | None = None,
+    file_path: str = DATA_PATH,
+    settings_path: str = SETTINGS_PATH,
+    engine: str = "pandas",
+    currency: str | None = BASE_CURRENCY,
+) -> str:
+    """Функция генерирует отчет о расходах, курсах валют и стоимости акций на указанную дату.
+
+    Курсы валют и котировки запрашиваются в фоне, пока загружаются и обрабатываются транзакции.
+    Разделы, не полученные за время из timeouts, попадают в отчет пустыми. Если за timeouts["rate_history"]
+    не догружены курсы для пересчета сумм, итоги в рублях строятся по суммам выписки (currency — null).
+    file_path и settings_path — пути к выгрузке и к файлу пользовательских настроек.
+    engine="sqlite" — расходы по картам считаются запросами к базе SQLite выгрузки.
+    currency — валюта, в которую пересчитываются суммы платежей по историческим курсам (по умолчанию рубли);
+    None — суммы как в выписке. Поле currency отчета — валюта итогов: null, если суммы не пересчитаны
+    (пересчет не запрошен или для рублей не нашлось курсов).
+    """
+    started = time.monotonic()
+    timeouts = {**SECTION_TIMEOUTS, **(timeouts or {})}
+    end_date = pd.to_datetime(date_str, format="%Y-%m-%d %H:%M:%S")
+
+    user_settings = load_user_settings(settings_path)
+    # Курсы и котировки запрашиваются в фоновых потоках. Запросы, вышедшие за дедлайн, не ждем: они завершатся
+    # в фоне и заполнят кэш для следующих отчетов, а выход из CLI не задерживают
+    market_data: Dict[str, Future] = {}
+    if user_settings is not None:
+        market_data["currency_rates"] = run_in_thread(get_currency_rates, user_settings.get("user_currencies", []))
+        market_data["stock_prices"] = run_in_thread(get_stock_prices, user_settings.get("user_stocks", []))
+
+    try:
+        # Курсы для пересчета сумм догружаются под тем же дедлайном, что и разделы: медленный API ЦБ РФ
+        # не задерживает отчет
+        rates_timeout = max(0.0, started + timeouts["rate_history"] - time.monotonic())
+        totals_currency, spending_data = cached_card_spending(
+            file_path, date_str, end_date, engine, currency, rates_timeout
+        )
+    except FileNotFoundError:
+        return json.dumps({"error": "Файл с данными не найден"}, ensure_ascii=False, indent=4)
+    except LookupError as e:
+        return json.dumps({"error": str(e)}, ensure_ascii=False, indent=4)
+
+    if user_settings is None:
+        return json.dumps({"error": "Файл настроек не найден"}, ensure_ascii=False, indent=4)
 
-    response: Dict[str, Any] = {
-        "spending_data": spending_data,
-        "currency_rates": currency_rates,
-        "stock_prices": stock_prices,
-    }
+    response: Dict[str, Any] = {"currency": totals_currency, "spending_data": spending_data}
+    with span("http.wait_market_data"):
+        for name, future in market_data.items():
+            response[name] = wait_section(name, future, started + timeouts[name])
 
-    return json.dumps(response, ensure_ascii=False, indent=4)
+    with span("serialize.main_page") as stage:
+        result = json.dumps(response, ensure_ascii=False, indent=4)
+        stage.add(bytes=len(result))
+    return result
 
 
 if __name__ == "__main__":
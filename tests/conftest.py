@@ -4,6 +4,31 @@ from unittest.mock import patch
 import pandas as pd
 import pytest
 
+from src import cache, reports, views
+from src.rates import rate_store
+from src.store import store
+from src.utils import currency_codes_cache, quotes_cache, rates_cache, symbols_cache
+
+
+# Сбрасываем кэш загруженных выгрузок и вычисленных отчетов между тестами
+@pytest.fixture(autouse=True)
+def clear_transaction_store() -> Iterator:
+    for result_cache in (reports.category_cache, views.spending_cache):
+        result_cache.clear()
+    store.clear()
+    yield
+    store.clear()
+
+
+# Кэш ответов API хранится во временной директории и очищается перед каждым тестом
+@pytest.fixture(autouse=True)
+def isolated_api_cache(tmp_path_factory: pytest.TempPathFactory) -> Iterator:
+    with patch.object(cache, "CACHE_DIR", str(tmp_path_factory.mktemp("cache"))):
+        for api_cache in (rates_cache, symbols_cache, quotes_cache, currency_codes_cache):
+            api_cache.clear()
+        rate_store.clear()
+        yield
+
 
 # Фикстура для мока pd.read_excel
 @pytest.fixture
@@ -0,0 +1,64 @@
+import pandas as pd
+
+from benchmarks.suite import compare, result_digest
+from benchmarks.synthetic import make_operations
+from src.services import PhoneIndex
+
+OPERATIONS_COLUMNS = [
+    "Дата операции",
+    "Дата платежа",
+    "Номер карты",
+    "Статус",
+    "Сумма операции",
+    "Валюта операции",
+    "Сумма платежа",
+    "Валюта платежа",
+    "Кэшбэк",
+    "Категория",
+    "MCC",
+    "Описание",
+    "Бонусы (включая кэшбэк)",
+    "Округление на инвесткопилку",
+    "Сумма операции с округлением",
+]
+
+
+def test_make_operations_is_deterministic() -> None:
+    first = make_operations(5_000, seed=1)
+    second = make_operations(5_000, seed=1)
+
+    pd.testing.assert_frame_equal(first, second)
+    assert result_digest(first) == result_digest(second)
+    assert result_digest(first) != result_digest(make_operations(5_000, seed=2))
+
+
+def test_make_operations_matches_export_schema() -> None:
+    transactions = make_operations(5_000)
+
+    assert transactions.columns.tolist() == OPERATIONS_COLUMNS
+    assert transactions["Дата операции"].is_monotonic_increasing
+    assert transactions["Номер карты"].isna().any()
+    assert PhoneIndex(transactions).mask.any()
+
+
+def test_compare_flags_regressions_and_changed_output() -> None:
+    previous = {
+        "results": [
+            {"entry_point": "a", "rows": 10, "seconds": 1.0, "peak_bytes": 1, "digest": "x"},
+            {"entry_point": "b", "rows": 10, "seconds": 1.0, "peak_bytes": 1, "digest": "y"},
+        ]
+    }
+    current = {
+        "results": [
+            {"entry_point": "a", "rows": 10, "seconds": 2.0, "peak_bytes": 1, "digest": "x"},
+            {"entry_point": "b", "rows": 10, "seconds": 1.0, "peak_bytes": 1, "digest": "z"},
+            {"entry_point": "c", "rows": 10, "seconds": 1.0, "peak_bytes": 1, "digest": "z"},
+        ]
+    }
+
+    rows = compare(previous, current)
+
+    assert [(row["entry_point"], row["regression"], row["output_changed"]) for row in rows] == [
+        ("a", True, False),
+        ("b", False, True),
+    ]
@@ -0,0 +1,83 @@
+from unittest.mock import Mock, patch
+
+from src.cache import ResultCache, TTLCache
+
+
+def test_ttl_expiry() -> None:
+    api_cache = TTLCache("test", ttl=10, persistent=False)
+
+    with patch("time.time", return_value=1000.0):
+        api_cache.set("RUB", {"USD": 0.01})
+    with patch("time.time", return_value=1005.0):
+        assert api_cache.get("RUB") == (True, {"USD": 0.01})
+    with patch("time.time", return_value=1011.0):
+        assert api_cache.get("RUB") == (False, None)
+        assert api_cache.get("RUB", allow_stale=True) == (True, {"USD": 0.01})
+
+
+def test_lru_eviction() -> None:
+    api_cache = TTLCache("test", ttl=10, maxsize=2, persistent=False)
+    api_cache.set("a", 1)
+    api_cache.set("b", 2)
+    api_cache.get("a")
+    api_cache.set("c", 3)
+
+    assert api_cache.get("a") == (True, 1)
+    assert api_cache.get("b") == (False, None)
+    assert api_cache.get("c") == (True, 3)
+
+
+def test_persistence_between_instances() -> None:
+    TTLCache("persisted", ttl=10).set("AAPL", 150.0)
+
+    assert TTLCache("persisted", ttl=10).get("AAPL") == (True, 150.0)
+
+
+def test_set_many_saves_once() -> None:
+    api_cache = TTLCache("batched", ttl=10)
+
+    with patch.object(api_cache, "_save", wraps=api_cache._save) as save:
+        api_cache.set_many({"AAPL": 150.0, "MSFT": 300.0})
+        api_cache.set_many({})
+
+    save.assert_called_once()
+    assert TTLCache("batched", ttl=10).get("MSFT") == (True, 300.0)
+
+
+def test_get_or_fetch_serves_stale_when_source_fails() -> None:
+    api_cache = TTLCache("test", ttl=10, persistent=False)
+    fetch = Mock(return_value=150.0)
+
+    with patch("time.time", return_value=1000.0):
+        assert api_cache.get_or_fetch("AAPL", fetch) == 150.0
+        assert api_cache.get_or_fetch("AAPL", fetch) == 150.0
+    fetch.assert_called_once()
+
+    fetch.return_value = None
+    with patch("time.time", return_value=2000.0):
+        assert api_cache.get_or_fetch("AAPL", fetch) == 150.0
+    assert api_cache.get_or_fetch("MSFT", fetch) is None
+
+
+def test_result_cache_lru_and_disk_tier() -> None:
+    result_cache = ResultCache("test_results", maxsize=1, persistent=True)
+    compute = Mock(side_effect=[[1], [2]])
+
+    assert result_cache.get_or_compute("a", compute) == [1]
+    assert result_cache.get_or_compute("a", compute) == [1]
+    result_cache.set("b", [2])
+    result_cache.clear()
+
+    assert ResultCache("test_results", persistent=True).get("a") == (True, [1])
+    assert ResultCache("test_results", persistent=False).get("b") == (False, None)
+    assert compute.call_count == 1
+
+
+def test_result_cache_without_key_always_computes() -> None:
+    result_cache = ResultCache("test_results", persistent=False)
+    compute = Mock(return_value=[1])
+
+    result_cache.get_or_compute(None, compute)
+    result_cache.get_or_compute(None, compute)
+
+    assert compute.call_count == 2
@@ -0,0 +1,69 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from src.cube import SpendingCube
+from src.store import index_by_date
+from src.views import get_spending_data
+
+
+@pytest.fixture
+def cube_transactions() -> pd.DataFrame:
+    return index_by_date(
+        pd.DataFrame(
+            {
+                "Дата операции": pd.to_datetime(
+                    [
+                        "2023-09-30 23:59:59",
+                        "2023-10-01 00:00:00",
+                        "2023-10-01 09:00:00",
+                        "2023-10-15 12:00:00",
+                        "2023-10-15 18:00:00",
+                        "2023-10-31 00:00:00",
+                        "2023-10-31 10:00:00",
+                    ]
+                ),
+                "Номер карты": ["*1111", "*1111", "*2222", "*1111", "*2222", "*1111", "*2222"],
+                "Категория": ["Еда", "Еда", "Транспорт", "Еда", "Еда", "Транспорт", "Еда"],
+                "Сумма платежа": [-80.29, -194.02, -1025.69, -25.69, -349.9, -0.1, -0.2],
+            }
+        )
+    )
+
+
+@pytest.mark.parametrize(
+    "start, end",
+    [
+        (datetime(2023, 10, 1), datetime(2023, 10, 31)),
+        (datetime(2023, 10, 1, 5), datetime(2023, 10, 31, 12)),
+        (datetime(2023, 9, 30), datetime(2023, 10, 15, 12)),
+        (datetime(2023, 10, 15, 13), datetime(2023, 10, 15, 19)),
+    ],
+)
+def test_cube_totals_match_raw_rows(cube_transactions: pd.DataFrame, start: datetime, end: datetime) -> None:
+    dates = cube_transactions["Дата операции"]
+    raw = cube_transactions[(dates >= start) & (dates <= end)]
+
+    for by in ("Номер карты", "Категория"):
+        totals = SpendingCube(cube_transactions).totals(start, end, by=by)
+        expected = raw.groupby(by)["Сумма платежа"].agg(["sum", "count"])
+
+        # Дневные суммы складываются в другом порядке, чем строки: совпадение с точностью до округления float
+        assert totals["Сумма платежа"].sort_index().tolist() == pytest.approx(expected["sum"].tolist())
+        assert totals["Количество операций"].sort_index().tolist() == expected["count"].tolist()
+
+
+def test_get_spending_data_with_cube(cube_transactions: pd.DataFrame) -> None:
+    end_date = datetime(2023, 10, 31, 5)
+
+    result = get_spending_data(cube_transactions, end_date, SpendingCube(cube_transactions))
+    expected = get_spending_data(cube_transactions, end_date)
+
+    assert list(result) == list(expected)
+    for card, data in expected.items():
+        assert result[card]["total_spent"] == pytest.approx(data["total_spent"])
+        assert result[card]["cashback"] == data["cashback"]
+        assert result[card]["top_transactions"] == data["top_transactions"]
+    assert result["*1111"]["total_spent"] == pytest.approx(-25.79)
+    assert result["*1111"]["cashback"] == -1.0
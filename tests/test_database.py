@@ -0,0 +1,91 @@
+import os
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from src import database
+from src.reports import iter_json_records, spending_by_category
+from src.store import load_transactions
+from src.views import get_spending_data
+
+
+@pytest.fixture
+def statement(tmp_path: Path) -> str:
+    path = tmp_path / "operations.xlsx"
+    pd.DataFrame(
+        {
+            "Дата операции": [
+                "01.12.2021 12:00:00",
+                "05.12.2021 09:30:00",
+                "15.12.2021 14:00:00",
+                "20.12.2021 18:15:00",
+                "25.11.2021 10:00:00",
+            ],
+            "Номер карты": ["*7197", None, "*7197", "*5091", "*7197"],
+            "Категория": ["Переводы", "Каршеринг", "Переводы", "Переводы", "Супермаркеты"],
+            "Сумма платежа": [-100.1, -50.0, -200.2, None, -300.0],
+            "MCC": [None, 7512.0, None, None, 5411.0],
+            "Описание": ["МТС +7 921 111-22-33", "Ситидрайв", None, "Иван С.", "Магнит"],
+        }
+    ).to_excel(path, index=False)
+    return str(path)
+
+
+def test_category_transactions_match_pandas(statement: str) -> None:
+    pandas_result = spending_by_category.__wrapped__(statement, "Переводы", "31.12.2021")
+    sqlite_result = spending_by_category.__wrapped__(statement, "Переводы", "31.12.2021", engine="sqlite")
+
+    assert sqlite_result["Сумма платежа"].tolist()[:2] == [-100.1, -200.2]
+    assert "".join(iter_json_records(sqlite_result)) == "".join(iter_json_records(pandas_result))
+
+
+def test_category_cache_keeps_engines_apart(statement: str) -> None:
+    pandas_result = spending_by_category.__wrapped__(statement, "Переводы", "31.12.2021")
+    with patch.object(database, "category_transactions", wraps=database.category_transactions) as mock_query:
+        sqlite_result = spending_by_category.__wrapped__(statement, "Переводы", "31.12.2021", engine="sqlite")
+        cached_result = spending_by_category.__wrapped__(statement, "Переводы", "31.12.2021", engine="sqlite")
+
+    mock_query.assert_called_once()
+    assert sqlite_result is not pandas_result
+    assert cached_result is sqlite_result
+
+
+def test_spending_data_matches_pandas(statement: str) -> None:
+    end_date = datetime(2021, 12, 31)
+
+    result = database.spending_data(statement, end_date)
+
+    assert result == get_spending_data(load_transactions(statement), end_date)
+    assert list(result) == ["*7197", "nan", "*5091"]
+    assert result["*5091"] == {"last_4_digits": "5091", "total_spent": 0.0, "cashback": 0.0, "top_transactions": []}
+
+
+def test_query_is_parameterized_and_read_only(statement: str) -> None:
+    result = database.query(
+        statement, 'SELECT COUNT(*) AS n FROM transactions WHERE "Номер карты" = ? AND "MCC" IS NULL', ["*7197"]
+    )
+
+    assert result["n"].tolist() == [2]
+    with pytest.raises(Exception, match="readonly"):
+        database.query(statement, "DELETE FROM transactions")
+
+
+def test_database_rebuilt_when_statement_changes(statement: str) -> None:
+    first_path = database.ensure_database(statement)
+    connection = sqlite3.connect(first_path)
+    indexes = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    connection.close()
+
+    pd.DataFrame(
+        {"Дата операции": ["01.12.2021 12:00:00"], "Категория": ["Переводы"], "Сумма платежа": [-1.0]}
+    ).to_excel(statement, index=False)
+    second_path = database.ensure_database(statement)
+
+    assert indexes == set(database.INDEXES)
+    assert second_path != first_path
+    assert not os.path.exists(first_path)
+    assert database.query(statement, "SELECT COUNT(*) AS n FROM transactions")["n"].tolist() == [1]
@@ -0,0 +1,142 @@
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.ingest import IncrementalStore, card_monthly_totals, category_daily_totals, fingerprint_rows
+from src.store import load_transactions, result_key
+from src.utils import run_in_thread
+from src.views import get_spending_data
+
+
+@pytest.fixture
+def statement() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "Дата операции": pd.to_datetime(
+                ["2021-11-30 10:00:00", "2021-12-01 10:00:00", "2021-12-01 10:00:00", "2021-12-02 12:00:00"]
+            ),
+            "Номер карты": ["*7197", "*7197", "*7197", "*5091"],
+            "Сумма платежа": [-100.0, -50.0, -50.0, -300.0],
+            "Кэшбэк": [1.0, None, None, 3.0],
+            "Категория": ["Супермаркеты", "Кафе", "Кафе", "Супермаркеты"],
+            "Описание": ["Магнит", "Кофейня", "Кофейня", "Пятерочка"],
+        }
+    )
+
+
+def test_fingerprint_rows_keeps_identical_rows_apart(statement: pd.DataFrame) -> None:
+    fingerprints = fingerprint_rows(statement)
+
+    assert len(set(fingerprints)) == 4
+    assert (fingerprint_rows(statement.copy()) == fingerprints).all()
+
+
+def test_ingest_appends_only_new_rows(tmp_path: Path, statement: pd.DataFrame) -> None:
+    store = IncrementalStore(str(tmp_path))
+
+    assert store.ingest_frame(statement.iloc[:2]) == 2
+    assert store.ingest_frame(statement) == 2
+    assert store.ingest_frame(statement) == 0
+
+    loaded = store.load()
+    assert len(loaded) == 4
+    assert loaded["Сумма платежа"].tolist() == [-100.0, -50.0, -50.0, -300.0]
+
+
+def test_ingest_updates_aggregates_incrementally(tmp_path: Path, statement: pd.DataFrame) -> None:
+    store = IncrementalStore(str(tmp_path))
+    store.ingest_frame(statement.iloc[:3])
+    store.ingest_frame(statement.iloc[2:])
+
+    card_monthly = store.card_monthly().sort_values(["Номер карты", "Месяц"], ignore_index=True)
+    expected = card_monthly_totals(statement).sort_values(["Номер карты", "Месяц"], ignore_index=True)
+    pd.testing.assert_frame_equal(card_monthly, expected)
+
+    category_daily = store.category_daily().sort_values(["Категория", "День"], ignore_index=True)
+    expected = category_daily_totals(statement).sort_values(["Категория", "День"], ignore_index=True)
+    pd.testing.assert_frame_equal(category_daily, expected)
+    assert category_daily["Количество операций"].sum() == 4
+
+
+def test_store_directory_loads_as_one_statement(tmp_path: Path, statement: pd.DataFrame) -> None:
+    store = IncrementalStore(str(tmp_path))
+    store.ingest_frame(statement.iloc[:2])
+    key = result_key(str(tmp_path), "params")
+
+    assert len(load_transactions(str(tmp_path))) == 2
+
+    store.ingest_frame(statement)
+
+    assert len(load_transactions(str(tmp_path))) == 4
+    assert result_key(str(tmp_path), "params") != key
+
+
+def test_card_monthly_totals_match_rows(tmp_path: Path, statement: pd.DataFrame) -> None:
+    store = IncrementalStore(str(tmp_path))
+    store.ingest_frame(statement)
+    transactions = load_transactions(str(tmp_path))
+    monthly_totals = store.card_totals(transactions)
+
+    for end_date in [datetime(2021, 12, 1, 10, 0), datetime(2021, 12, 1, 23, 0), datetime(2021, 12, 31, 23, 59)]:
+        expected = get_spending_data(transactions, end_date)
+        result = get_spending_data(transactions, end_date, monthly_totals)
+
+        assert list(result) == list(expected)
+        for card, data in expected.items():
+            assert result[card]["total_spent"] == pytest.approx(data["total_spent"])
+            assert result[card]["top_transactions"] == data["top_transactions"]
+
+
+def test_interrupted_ingest_does_not_count_rows_twice(tmp_path: Path, statement: pd.DataFrame) -> None:
+    store = IncrementalStore(str(tmp_path))
+    store.ingest_frame(statement.iloc[:2])
+
+    # Процесс прервался после записи части и агрегатов, но до замены манифеста
+    with patch.object(IncrementalStore, "_write_manifest", side_effect=KeyboardInterrupt):
+        with pytest.raises(KeyboardInterrupt):
+            store.ingest_frame(statement)
+    assert store.ingest_frame(statement) == 2
+
+    card_monthly = store.card_monthly().sort_values(["Номер карты", "Месяц"], ignore_index=True)
+    expected = card_monthly_totals(statement).sort_values(["Номер карты", "Месяц"], ignore_index=True)
+    pd.testing.assert_frame_equal(card_monthly, expected)
+    assert sorted(path.name for path in tmp_path.glob("card_monthly*")) == [
+        "card_monthly-00001.feather",
+        "card_monthly-00002.feather",
+    ]
+
+
+def test_aggregates_rebuilt_for_manifest_without_versions(tmp_path: Path, statement: pd.DataFrame) -> None:
+    store = IncrementalStore(str(tmp_path))
+    store.ingest_frame(statement)
+    manifest = json.loads((tmp_path / "manifest.json").read_text(encoding="utf-8"))
+    del manifest["aggregates"]
+    (tmp_path / "manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
+
+    category_daily = store.category_daily().sort_values(["Категория", "День"], ignore_index=True)
+    expected = category_daily_totals(statement).sort_values(["Категория", "День"], ignore_index=True)
+    pd.testing.assert_frame_equal(category_daily, expected)
+
+
+def test_concurrent_ingests_take_turns(tmp_path: Path, statement: pd.DataFrame) -> None:
+    def slow_fingerprints(transactions: pd.DataFrame) -> np.ndarray:
+        time.sleep(0.1)
+        return fingerprint_rows(transactions)
+
+    # Разные экземпляры хранилища не делят threading.Lock: очередь обеспечивает только блокировка файла
+    with patch("src.ingest.fingerprint_rows", side_effect=slow_fingerprints):
+        futures = [
+            run_in_thread(IncrementalStore(str(tmp_path)).ingest_frame, part)
+            for part in (statement.iloc[:1], statement.iloc[1:])
+        ]
+        assert sorted(future.result() for future in futures) == [1, 3]
+
+    manifest = json.loads((tmp_path / "manifest.json").read_text(encoding="utf-8"))
+    assert [part["file"] for part in manifest["parts"]] == ["part-00001.feather", "part-00002.feather"]
+    assert len(IncrementalStore(str(tmp_path)).load()) == 4
@@ -0,0 +1,50 @@
+import logging
+import threading
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from src import log
+
+
+class ThreadRecorder:
+    """Аргумент сообщения, который запоминает поток, в котором его форматировали."""
+
+    def __init__(self) -> None:
+        self.thread_name: str | None = None
+
+    def __str__(self) -> str:
+        self.thread_name = threading.current_thread().name
+        return "payload"
+
+
+@pytest.fixture
+def test_logger(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[logging.Logger]:
+    monkeypatch.setattr(log, "LOG_DIR", str(tmp_path / "logs"))
+    logger = log.file_logger("test_log_queue", "test.log", logging.INFO)
+    yield logger
+    log.stop_listener()
+    log.router.routes.pop("test_log_queue")
+    log.file_handlers.pop("test.log").close()
+
+
+def test_file_logger_writes_in_background(test_logger: logging.Logger, tmp_path: Path) -> None:
+    payload = ThreadRecorder()
+
+    test_logger.info("Сообщение: %s", payload)
+    log.stop_listener()
+
+    text = (tmp_path / "logs" / "test.log").read_text(encoding="utf-8")
+    assert "test_log_queue - INFO - Сообщение: payload" in text
+    assert payload.thread_name not in (None, threading.current_thread().name)
+
+
+def test_file_logger_skips_disabled_levels(test_logger: logging.Logger, tmp_path: Path) -> None:
+    payload = ThreadRecorder()
+
+    test_logger.debug("Отладка: %s", payload)
+    log.stop_listener()
+
+    assert payload.thread_name is None
+    assert not (tmp_path / "logs" / "test.log").exists()
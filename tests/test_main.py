@@ -1,11 +1,24 @@
+import gzip
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
 from unittest.mock import patch
 
+import pandas as pd
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_BUDGET_US = 100_000  # бюджет на импорт src.main, мкс
+
 
 def test_main_page_default_date() -> None:
     with patch(
         "builtins.input", side_effect=["1", ""]
     ):  # Пользователь выбирает команду 1 и использует дату по умолчанию
-        with patch("src.views.generate_report", return_value="{}") as mock_generate_report:
+        with patch("src.main.generate_report", return_value="{}") as mock_generate_report:
             from src.main import main  # Замените `your_module` на имя вашего модуля
 
             main()
@@ -29,4 +42,200 @@ def test_invalid_command() -> None:
             from src.main import main
 
             main()
-            mock_print.assert_any_call("Ошибка: Неверная команда. Пожалуйста, введите 1, 2 или 3.")
+            mock_print.assert_any_call("Ошибка: Неверная команда. Пожалуйста, введите 1, 2, 3 или 4.")
+
+
+def test_report_batch() -> None:
+    with patch("builtins.input", side_effect=["4", "Переводы, Каршеринг", "30.11.2021, 31.12.2021"]):
+        with patch("src.main.spending_by_categories") as mock_spending_by_categories:
+            from src.main import FILE_PATH, main
+
+            main()
+            mock_spending_by_categories.assert_called_once_with(
+                FILE_PATH, ["Переводы", "Каршеринг"], ["30.11.2021", "31.12.2021"]
+            )
+
+
+def test_filtered_by_phone_without_delays() -> None:
+    with patch("builtins.input", side_effect=["2"]), patch("time.sleep") as mock_sleep:
+        with patch("src.main.find_transactions_with_phone_numbers", return_value="[]"):
+            from src.main import main
+
+            main()
+            mock_sleep.assert_not_called()
+
+
+def test_cli_main_page() -> None:
+    with patch("src.main.generate_report", return_value='{"spending_data": {}}') as mock_generate_report:
+        from src.main import cli
+
+        exit_code = cli(["main_page", "--date", "2021-12-31 00:00:00", "-i", "data.xlsx", "--settings", "s.json"])
+
+    assert exit_code == 0
+    mock_generate_report.assert_called_once_with(
+        "2021-12-31 00:00:00", file_path="data.xlsx", settings_path="s.json", engine="pandas", currency="RUB"
+    )
+
+
+@pytest.mark.parametrize("value, expected", [("usd", "USD"), ("none", None)])
+def test_cli_main_page_currency(value: str, expected: str | None) -> None:
+    with patch("src.main.generate_report", return_value='{"spending_data": {}}') as mock_generate_report:
+        from src.main import cli
+
+        exit_code = cli(["main_page", "--date", "2021-12-31 00:00:00", "--currency", value])
+
+    assert exit_code == 0
+    assert mock_generate_report.call_args.kwargs["currency"] == expected
+
+
+def test_cli_report_writes_output(tmp_path: Path, mock_transactions_data: pd.DataFrame) -> None:
+    input_path = tmp_path / "operations.xlsx"
+    input_path.write_bytes(b"stub")
+    output_path = tmp_path / "report.ndjson.gz"
+
+    with patch("pandas.read_excel", return_value=mock_transactions_data):
+        from src.main import cli
+
+        exit_code = cli(
+            ["report", "--category", "Переводы", "--date", "31.10.2023", "-i", str(input_path)]
+            + ["-o", str(output_path), "-f", "ndjson"]
+        )
+
+    assert exit_code == 0
+    with gzip.open(output_path, "rt", encoding="utf-8") as file:
+        records = [json.loads(line) for line in file]
+    assert [record["Сумма"] for record in records] == [100, 200]
+
+
+def test_cli_query(tmp_path: Path, mock_transactions_data: pd.DataFrame, capsys: pytest.CaptureFixture) -> None:
+    input_path = tmp_path / "operations.xlsx"
+    input_path.write_bytes(b"stub")
+    sql = 'SELECT "Категория", COUNT(*) AS n FROM transactions WHERE "Категория" = ? GROUP BY 1'
+
+    with patch("pandas.read_excel", return_value=mock_transactions_data):
+        from src.main import cli
+
+        exit_code = cli(["query", sql, "-p", "Переводы", "-i", str(input_path), "-f", "compact"])
+
+    assert exit_code == 0
+    assert json.loads(capsys.readouterr().out) == [{"Категория": "Переводы", "n": 2}]
+
+
+def test_cli_missing_input(capsys: pytest.CaptureFixture) -> None:
+    from src.main import cli
+
+    assert cli(["filtered_by_phone", "-i", "missing.xlsx"]) == 1
+    assert "Файл с данными не найден" in capsys.readouterr().err
+
+
+def test_cli_ingest_and_report_from_store(tmp_path: Path, capsys: pytest.CaptureFixture) -> None:
+    input_path = tmp_path / "operations.xlsx"
+    input_path.write_bytes(b"stub")
+    store_path = tmp_path / "ingested"
+    statement = pd.DataFrame(
+        {
+            "Дата операции": ["30.10.2023 16:00:00", "15.10.2023 14:00:00", "01.10.2023 12:00:00"],
+            "Номер карты": ["*5091", "*7197", "*7197"],
+            "Категория": ["Покупки", "Переводы", "Переводы"],
+            "Сумма платежа": [300.0, 200.0, 100.0],
+            "Описание": ["Магнит", "Иван П.", "Иван П."],
+        }
+    )
+
+    with patch("pandas.read_excel", return_value=statement):
+        from src.main import cli
+
+        assert cli(["ingest", "-i", str(input_path), "--store", str(store_path), "-f", "compact"]) == 0
+        assert cli(["ingest", "-i", str(input_path), "--store", str(store_path), "-f", "compact"]) == 0
+        added = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        exit_code = cli(["report", "--category", "Переводы", "--date", "31.10.2023", "-i", str(store_path)])
+
+    assert added == [{"added": {"operations.xlsx": 3}}, {"added": {"operations.xlsx": 0}}]
+    assert exit_code == 0
+    assert [record["Сумма платежа"] for record in json.loads(capsys.readouterr().out)] == [100.0, 200.0]
+
+
+def test_cli_invalid_date() -> None:
+    from src.main import cli
+
+    with pytest.raises(SystemExit) as error:
+        cli(["report", "--category", "Переводы", "--date", "2021-12-31"])
+    assert error.value.code == 2
+
+
+def test_cli_multiple_statements(tmp_path: Path) -> None:
+    result = pd.DataFrame({"Дата": [pd.Timestamp("2021-12-31")], "Категория": ["Переводы"], "Сумма платежа": [-1.0]})
+    (tmp_path / "operations.xlsx").write_bytes(b"stub")
+
+    with patch("src.multifile.categories_report_for_files", return_value=result) as mock_report:
+        from src.main import cli
+
+        exit_code = cli(["report_batch", "-i", str(tmp_path), "-j", "4", "--dates", "31.12.2021", "-o", "-"])
+
+    assert exit_code == 0
+    mock_report.assert_called_once_with(str(tmp_path), None, ["31.12.2021"], max_workers=4)
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args], cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+
+
+def test_import_time_budget() -> None:
+    result = run_python("-X", "importtime", "-c", "import src.main")
+    cumulative = {
+        line.split("|")[2].strip(): int(line.split("|")[1])
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:") and line.split("|")[1].strip().isdigit()
+    }
+
+    assert cumulative["src.main"] < IMPORT_BUDGET_US
+    assert not {"pandas", "requests", "dotenv", "src.views", "src.reports"} & cumulative.keys()
+
+
+def test_help_without_heavy_imports() -> None:
+    result = run_python(
+        "-c",
+        "import sys\n"
+        "from src.main import cli\n"
+        "try:\n"
+        "    cli(['--help'])\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "print('pandas' in sys.modules, 'requests' in sys.modules, file=sys.stderr)",
+    )
+
+    assert "main_page" in result.stdout
+    assert result.stderr.strip() == "False False"
+
+
+def test_slow_market_data_does_not_delay_exit() -> None:
+    started = time.perf_counter()
+    run_python(
+        "-c",
+        "import time\n"
+        "from unittest.mock import patch\n"
+        "from src import views\n"
+        "slow = patch('src.views.get_stock_prices', side_effect=lambda _: time.sleep(60))\n"
+        "with slow, patch('src.views.get_currency_rates', return_value={}):\n"
+        "    views.generate_report(\n"
+        "        '2021-12-31 00:00:00', {'stock_prices': 0.5}, 'data/operations.xlsx', 'user_settings.json'\n"
+        "    )",
+    )
+
+    assert time.perf_counter() - started < 15
+
+
+def test_import_does_not_open_logs() -> None:
+    result = run_python(
+        "-c",
+        "import src.log, src.services, src.utils; print([h.stream for h in src.log.file_handlers.values()])",
+    )
+
+    assert result.stdout.strip() == "[None, None]"
+
+
+def test_output_formats_match_reports() -> None:
+    from src.main import OUTPUT_FORMATS
+    from src.reports import OUTPUT_FORMATS as REPORT_FORMATS
+
+    assert OUTPUT_FORMATS == REPORT_FORMATS
@@ -0,0 +1,53 @@
+import json
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from src import metrics
+from src.metrics import Metrics, capture
+
+
+def test_span_records_time_and_counters() -> None:
+    stage_metrics = Metrics()
+
+    with stage_metrics.span("filter.period") as stage:
+        stage.add(rows=10)
+    with pytest.raises(ValueError):
+        with stage_metrics.span("filter.period") as stage:
+            stage.add(rows=5, bytes=100)
+            raise ValueError
+
+    stats = stage_metrics.snapshot()["filter.period"]
+    assert stats["calls"] == 2
+    assert stats["rows"] == 15
+    assert stats["bytes"] == 100
+    assert stats["seconds"] >= stats["max_seconds"] >= 0
+
+
+def test_export_formats(tmp_path: Path) -> None:
+    stage_metrics = Metrics()
+    stage_metrics.record("load.excel", 0.5, rows=3, bytes=2048)
+
+    prometheus = stage_metrics.to_prometheus()
+    stage_metrics.save(str(tmp_path / "metrics.json"))
+
+    assert "# TYPE report_stage_seconds_total counter" in prometheus
+    assert 'report_stage_seconds_total{stage="load.excel"} 0.5' in prometheus
+    assert 'report_stage_bytes_total{stage="load.excel"} 2048' in prometheus
+    assert json.loads((tmp_path / "metrics.json").read_text(encoding="utf-8"))["load.excel"]["rows"] == 3
+
+
+@pytest.mark.parametrize("mode, filename", [("cprofile", "stage.prof"), ("tracemalloc", "stage.tracemalloc.txt")])
+def test_capture_writes_profile(tmp_path: Path, mode: str, filename: str) -> None:
+    with patch.object(metrics, "PROFILE_DIR", str(tmp_path)):
+        with capture("stage", mode):
+            sum(range(1000))
+
+    assert (tmp_path / filename).exists()
+
+
+def test_capture_unknown_mode() -> None:
+    with pytest.raises(ValueError):
+        with capture("stage", "perf"):
+            pass
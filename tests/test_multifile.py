@@ -0,0 +1,109 @@
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from src import multifile
+
+
+@pytest.fixture
+def statements_dir(tmp_path: Path) -> Path:
+    for name, amount in (("first.xlsx", -100.0), ("second.xlsx", -250.0)):
+        pd.DataFrame(
+            {
+                "Дата операции": ["01.12.2021 12:00:00", "15.12.2021 14:00:00"],
+                "Номер карты": ["*7197", "*5091"],
+                "Категория": ["Переводы", "Каршеринг"],
+                "Сумма платежа": [amount, amount * 2],
+                "Описание": ["МТС +7 921 111-22-33", "Ситидрайв"],
+            }
+        ).to_excel(tmp_path / name, index=False)
+    (tmp_path / "broken.xlsx").write_bytes(b"not an excel file")
+    (tmp_path / "~$first.xlsx").write_bytes(b"excel lock file")
+    return tmp_path
+
+
+def test_statement_paths(statements_dir: Path) -> None:
+    names = [Path(path).name for path in multifile.statement_paths(str(statements_dir))]
+
+    assert names == ["broken.xlsx", "first.xlsx", "second.xlsx"]
+    assert multifile.statement_paths(str(statements_dir / "s*.xlsx")) == [str(statements_dir / "second.xlsx")]
+
+
+def test_category_report_for_files_process_pool(statements_dir: Path) -> None:
+    result = multifile.category_report_for_files(str(statements_dir), "Переводы", "31.12.2021", max_workers=2)
+
+    assert result["Сумма платежа"].tolist() == [-100.0, -250.0]
+    assert result["Файл"].tolist() == ["first.xlsx", "second.xlsx"]
+
+
+def test_categories_report_for_files(statements_dir: Path) -> None:
+    result = multifile.categories_report_for_files(str(statements_dir), None, ["31.12.2021"], max_workers=1)
+
+    assert result["Категория"].tolist() == ["Каршеринг", "Переводы"]
+    assert result["Сумма платежа"].tolist() == [-700.0, -350.0]
+    assert result["Количество операций"].tolist() == [2, 2]
+
+
+def test_spending_data_and_phones_for_files(statements_dir: Path) -> None:
+    currency, spending_data = multifile.spending_data_for_files(
+        str(statements_dir), datetime(2021, 12, 31), max_workers=1
+    )
+    phones = multifile.phone_transactions_for_files(str(statements_dir), max_workers=1)
+
+    assert currency is None
+    assert spending_data["*7197"]["total_spent"] == -350.0
+    assert len(spending_data["*7197"]["top_transactions"]) == 2
+    assert phones["Файл"].tolist() == ["first.xlsx", "second.xlsx"]
+
+
+def test_spending_data_for_files_converts_currency(tmp_path: Path) -> None:
+    for name, currency in (("rubles.xlsx", "RUB"), ("yuan.xlsx", "CNY")):
+        pd.DataFrame(
+            {
+                "Дата операции": ["25.04.2019 08:39:38"],
+                "Номер карты": ["*4556"],
+                "Категория": ["Супермаркеты"],
+                "Сумма платежа": [-100.0],
+                "Валюта платежа": [currency],
+            }
+        ).to_excel(tmp_path / name, index=False)
+    end_date = datetime(2019, 4, 30)
+
+    with patch("src.rates.get_rate_history", return_value=None):
+        offline = multifile.spending_data_for_files(str(tmp_path), end_date, max_workers=1, currency="RUB")
+        with pytest.raises(LookupError):
+            multifile.spending_data_for_files(str(tmp_path), end_date, max_workers=1, currency="USD")
+    with patch("src.rates.get_rate_history", return_value={"2019-04-24": 9.5}):
+        online = multifile.spending_data_for_files(str(tmp_path), end_date, max_workers=1, currency="RUB")
+
+    # Без курсов суммы остаются как в выписке, и валюта итогов не указана
+    assert offline[0] is None
+    assert offline[1]["*4556"]["total_spent"] == -200.0
+    assert online[0] == "RUB"
+    assert online[1]["*4556"]["total_spent"] == -100.0 - 950.0
+
+
+def test_merge_spending_data_keeps_top_five() -> None:
+    part = {
+        "*7197": {
+            "last_4_digits": "7197",
+            "total_spent": -600.0,
+            "cashback": -6.0,
+            "top_transactions": [{"Сумма платежа": float(amount)} for amount in range(-10, -70, -20)],
+        }
+    }
+
+    result = multifile.merge_spending_data([part, part])
+
+    assert result["*7197"]["total_spent"] == -1200.0
+    assert result["*7197"]["cashback"] == -12.0
+    assert [record["Сумма платежа"] for record in result["*7197"]["top_transactions"]] == [
+        -10.0,
+        -10.0,
+        -30.0,
+        -30.0,
+        -50.0,
+    ]
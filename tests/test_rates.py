@@ -0,0 +1,96 @@
+import threading
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from src.rates import RateStore, convert_amounts, rate_store
+
+CNY_HISTORY = {"2019-04-20": 10.0, "2019-04-24": 9.5, "2019-04-26": 9.0}
+
+
+@pytest.fixture
+def foreign_transactions() -> pd.DataFrame:
+    dates = pd.to_datetime(
+        ["2019-04-22 10:00:00", "2019-04-25 12:00:00", "2019-04-26 09:00:00", "2019-04-27 00:00:00"]
+    )
+    return pd.DataFrame(
+        {
+            "Дата операции": dates,
+            "Номер карты": ["*4556", "*4556", "*7197", "*4556"],
+            "Сумма платежа": [-100.0, -10.0, -500.0, None],
+            "Валюта платежа": pd.Categorical(["CNY", "CNY", "RUB", "CNY"]),
+        },
+        index=pd.DatetimeIndex(dates),
+    )
+
+
+def test_convert_amounts_uses_rate_as_of_operation_date(foreign_transactions: pd.DataFrame) -> None:
+    with patch("src.rates.get_rate_history", return_value=CNY_HISTORY) as mock_history:
+        result = convert_amounts(foreign_transactions, "RUB")
+        convert_amounts(foreign_transactions, "RUB")
+
+    assert result["Сумма платежа"].tolist()[:3] == [-1000.0, -95.0, -500.0]
+    assert pd.isna(result["Сумма платежа"].iloc[3])
+    assert result["Валюта платежа"].tolist() == ["RUB"] * 4
+    assert foreign_transactions["Валюта платежа"].tolist() == ["CNY", "CNY", "RUB", "CNY"]
+    # Курсы запрошены одним запросом с запасом до первой операции и затем берутся из хранилища
+    mock_history.assert_called_once()
+    assert mock_history.call_args[0][1].isoformat() == "2019-04-08"
+
+
+def test_convert_amounts_to_foreign_currency(foreign_transactions: pd.DataFrame) -> None:
+    with patch("src.rates.get_rate_history", return_value=CNY_HISTORY):
+        result = convert_amounts(foreign_transactions, "CNY")
+
+    assert result["Сумма платежа"].tolist()[:3] == [-100.0, -10.0, pytest.approx(-500.0 / 9.0)]
+
+
+def test_convert_amounts_without_rates(foreign_transactions: pd.DataFrame) -> None:
+    with patch("src.rates.get_rate_history", return_value=None), pytest.raises(LookupError, match="CNY"):
+        convert_amounts(foreign_transactions, "RUB")
+
+    rubles_only = foreign_transactions[foreign_transactions["Валюта платежа"] == "RUB"]
+    assert convert_amounts(rubles_only, "RUB") is rubles_only
+
+
+def test_convert_amounts_does_not_wait_for_slow_api(foreign_transactions: pd.DataFrame) -> None:
+    fetched = threading.Event()
+
+    def slow_history(*args: object) -> dict:
+        time.sleep(0.3)
+        fetched.set()
+        return CNY_HISTORY
+
+    with patch("src.rates.get_rate_history", side_effect=slow_history) as mock_history:
+        started = time.perf_counter()
+        with pytest.raises(LookupError, match="не получены"):
+            convert_amounts(foreign_transactions, "RUB", timeout=0.05)
+        elapsed = time.perf_counter() - started
+        # Загрузка курсов завершается в фоне, и следующий пересчет берет их из хранилища
+        assert fetched.wait(5)
+        result = convert_amounts(foreign_transactions, "RUB")
+
+    assert elapsed < 0.2
+    mock_history.assert_called_once()
+    assert result["Сумма платежа"].tolist()[:3] == [-1000.0, -95.0, -500.0]
+
+
+def test_rate_store_persists_and_fetches_only_missing_days() -> None:
+    with patch("src.rates.get_rate_history", return_value=CNY_HISTORY):
+        rate_store.ensure(["CNY"], datetime(2019, 4, 22), datetime(2019, 4, 26))
+
+    restored = RateStore()
+    with patch("src.rates.get_rate_history", return_value={"2019-04-29": 8.0}) as mock_history:
+        restored.ensure(["CNY"], datetime(2019, 4, 22), datetime(2019, 4, 30))
+
+    assert [call.args[1:] for call in mock_history.call_args_list] == [
+        (datetime(2019, 4, 27).date(), datetime(2019, 4, 30).date())
+    ]
+    rates = restored.to_rubles(
+        pd.Series(["CNY", "CNY", "RUB"]), pd.Series(pd.to_datetime(["2019-04-19", "2019-04-30", "2019-04-30"]))
+    )
+    assert rates[1:].tolist() == [8.0, 1.0]
+    assert pd.isna(rates[0])
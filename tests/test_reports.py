@@ -1,9 +1,13 @@
+import gzip
 import json
+import os
+from pathlib import Path
 from unittest.mock import MagicMock, mock_open, patch
 
 import pandas as pd
+import pytest
 
-from src.reports import report_decorator, spending_by_category
+from src.reports import iter_json_records, report_decorator, spending_by_categories, spending_by_category
 
 
 @patch("builtins.open", new_callable=mock_open)
@@ -21,7 +25,7 @@ def test_spending_by_category(
                 ["01.10.2023 12:00:00", "15.10.2023 14:00:00"],
                 format="%d.%m.%Y %H:%M:%S",  # Указываем правильный формат
             ),
-            "Категория": ["Переводы", "Переводы"],
+            "Категория": pd.Categorical(["Переводы", "Переводы"], categories=["Переводы", "Покупки"]),
             "Сумма": [100, 200],
         }
     )
@@ -54,7 +58,7 @@ def test_report_decorator() -> None:
 
             mock_open_file.assert_called_once_with("../logs/mock_func_report.json", "w", encoding="utf-8")
 
-            mock_logger_info.assert_called_once_with("Отчет сохранен в файл: ../logs/mock_func_report.json")
+            mock_logger_info.assert_called_once_with("Отчет сохранен в файл: %s", "../logs/mock_func_report.json")
 
             pd.testing.assert_frame_equal(result, mock_func.return_value)
 
@@ -65,3 +69,125 @@ def test_report_decorator() -> None:
             )
             actual_writes = "".join([call.args[0] for call in mock_open_file().write.call_args_list])
             assert actual_writes == expected_json
+
+
+@pytest.fixture
+def report_frame() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "Дата": [pd.Timestamp("2023-01-01 10:00:00"), pd.Timestamp("2023-01-02 10:00:00.123456"), pd.NaT],
+            "Категория": pd.Categorical(["Переводы", "Покупки", "Переводы"]),
+            "Описание": ['Кафе "Ромашка"', None, "50% скидка"],
+            "Сумма": [100.5, float("nan"), -3.0],
+            "Бонусы": [1, 2, 3],
+        }
+    )
+
+
+def expected_records(frame: pd.DataFrame) -> list:
+    records = frame.to_dict(orient="records")
+    for record in records:
+        for key, value in record.items():
+            if isinstance(value, pd.Timestamp):
+                record[key] = value.isoformat()
+            elif value is pd.NaT:
+                record[key] = None
+    return records
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 10])
+def test_iter_json_records_matches_json_dump(report_frame: pd.DataFrame, chunk_size: int) -> None:
+    result = "".join(iter_json_records(report_frame, chunk_size=chunk_size))
+
+    assert result == json.dumps(expected_records(report_frame), ensure_ascii=False, indent=4)
+
+
+def test_iter_json_records_compact_and_ndjson(report_frame: pd.DataFrame) -> None:
+    records = expected_records(report_frame)
+
+    compact = "".join(iter_json_records(report_frame, "compact", chunk_size=2))
+    ndjson = "".join(iter_json_records(report_frame, "ndjson", chunk_size=2))
+
+    assert compact == json.dumps(records, ensure_ascii=False)
+    assert ndjson == "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+
+
+def test_iter_json_records_empty_and_unknown_format() -> None:
+    assert "".join(iter_json_records(pd.DataFrame())) == "[]"
+    with pytest.raises(ValueError):
+        list(iter_json_records(pd.DataFrame(), "xml"))
+
+
+def test_report_decorator_ndjson_gzip(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    (tmp_path / "logs").mkdir()
+    (tmp_path / "src").mkdir()
+    monkeypatch.chdir(tmp_path / "src")
+    frame = pd.DataFrame({"value": [1, 2]})
+
+    result = report_decorator("test_report", output_format="ndjson", compress=True)(lambda: frame)()
+
+    with gzip.open(tmp_path / "logs" / "<lambda>_report.ndjson.gz", "rt", encoding="utf-8") as file:
+        assert file.read() == '{"value": 1}\n{"value": 2}\n'
+    pd.testing.assert_frame_equal(result, frame)
+
+
+@patch("builtins.open", new_callable=mock_open)
+def test_spending_by_categories(
+    mock_file: MagicMock, mock_read_excel: MagicMock, mock_transactions_data: MagicMock
+) -> None:
+    mock_read_excel.return_value = mock_transactions_data.rename(columns={"Сумма": "Сумма платежа"})
+
+    categories = ["Переводы", "Покупки", "Каршеринг"]
+
+    result = spending_by_categories("dummy_path.xlsx", categories, ["31.10.2023", "14.10.2023"])
+
+    expected = pd.DataFrame(
+        {
+            "Дата": pd.to_datetime(["2023-10-14"] * 3 + ["2023-10-31"] * 3),
+            "Категория": ["Каршеринг", "Переводы", "Покупки"] * 2,
+            "Сумма платежа": [0.0, 100.0, 0.0, 0.0, 300.0, 300.0],
+            "Количество операций": [0, 1, 0, 0, 2, 1],
+        }
+    )
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_spending_by_category_cached_until_file_changes(tmp_path: Path) -> None:
+    path = tmp_path / "operations.xlsx"
+    frame = pd.DataFrame(
+        {"Дата операции": ["01.10.2023 12:00:00"], "Категория": ["Переводы"], "Сумма платежа": [-100.0]}
+    )
+    frame.to_excel(path, index=False)
+
+    first = spending_by_category.__wrapped__(str(path), "Переводы", "31.10.2023")
+    second = spending_by_category.__wrapped__(str(path), "Переводы", "31.10.2023")
+
+    frame.assign(**{"Сумма платежа": [-250.0]}).to_excel(path, index=False)
+    os.utime(path, (os.path.getatime(path), os.path.getmtime(path) + 10))
+    changed = spending_by_category.__wrapped__(str(path), "Переводы", "31.10.2023")
+
+    assert second is first
+    assert changed["Сумма платежа"].tolist() == [-250.0]
+
+
+def test_spending_by_category_keeps_payment_date_format(tmp_path: Path) -> None:
+    path = tmp_path / "operations.xlsx"
+    pd.DataFrame(
+        {
+            "Дата операции": ["01.10.2021 12:00:00"],
+            "Дата платежа": ["03.10.2021"],
+            "Категория": ["Переводы"],
+            "Сумма платежа": [-100.0],
+        }
+    ).to_excel(path, index=False)
+
+    result = spending_by_category.__wrapped__(str(path), "Переводы", "31.10.2021")
+
+    assert json.loads("".join(iter_json_records(result))) == [
+        {
+            "Дата операции": "2021-10-01T12:00:00",
+            "Дата платежа": "03.10.2021",
+            "Категория": "Переводы",
+            "Сумма платежа": -100.0,
+        }
+    ]
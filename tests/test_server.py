@@ -0,0 +1,111 @@
+import gzip
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Iterator, Tuple
+from unittest.mock import MagicMock, patch
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pandas as pd
+import pytest
+
+from src.server import ReportServer
+
+
+@pytest.fixture
+def report_server(tmp_path: Path) -> Iterator[Tuple[str, MagicMock]]:
+    data_path = tmp_path / "operations.xlsx"
+    data_path.write_bytes(b"stub")
+    df = pd.DataFrame(
+        {
+            "Дата операции": ["01.10.2023 12:00:00", "15.10.2023 14:00:00", "30.10.2023 16:00:00"],
+            "Номер карты": ["*7197", "*7197", "*5091"],
+            "Категория": ["Переводы", "Переводы", "Покупки"],
+            "Сумма платежа": [-100.0, -200.0, -300.0],
+            "Описание": ["Константин Л.", "МТС +7 921 111-22-33", "Магнит"],
+        }
+    )
+
+    with patch("pandas.read_excel", return_value=df) as mock_read_excel:
+        server = ReportServer(("127.0.0.1", 0), str(data_path), str(tmp_path / "user_settings.json"))
+        server.warm_up()
+        thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        thread.start()
+        yield f"http://127.0.0.1:{server.server_address[1]}", mock_read_excel
+        server.shutdown()
+        server.server_close()
+
+
+def get(url: str, **headers: str) -> Tuple[int, Any]:
+    try:
+        with urlopen(Request(url, headers=headers)) as response:
+            body = response.read()
+            if response.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            return response.status, body.decode("utf-8")
+    except HTTPError as e:
+        return e.code, e.read().decode("utf-8")
+
+
+def test_report_endpoint_uses_warm_data(report_server: Tuple[str, MagicMock]) -> None:
+    base_url, mock_read_excel = report_server
+    url = f"{base_url}/report?category=%D0%9F%D0%B5%D1%80%D0%B5%D0%B2%D0%BE%D0%B4%D1%8B&date=31.10.2023"
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        responses = list(executor.map(get, [url] * 16))
+
+    assert {status for status, _ in responses} == {200}
+    assert [record["Сумма платежа"] for record in json.loads(responses[0][1])] == [-100.0, -200.0]
+    mock_read_excel.assert_called_once()
+
+
+def test_filtered_by_phone_endpoint(report_server: Tuple[str, MagicMock]) -> None:
+    base_url, _ = report_server
+
+    status, body = get(f"{base_url}/filtered_by_phone?format=ndjson", **{"Accept-Encoding": "gzip"})
+    by_phone_status, by_phone_body = get(f"{base_url}/filtered_by_phone?phone=89211112233")
+
+    assert status == 200
+    assert [json.loads(line)["Описание"] for line in body.splitlines()] == ["МТС +7 921 111-22-33"]
+    assert by_phone_status == 200
+    assert len(json.loads(by_phone_body)) == 1
+
+
+def test_main_page_endpoint_without_settings(report_server: Tuple[str, MagicMock]) -> None:
+    base_url, _ = report_server
+
+    status, body = get(f"{base_url}/main_page?date=2023-10-31%2000:00:00")
+
+    assert status == 500
+    assert json.loads(body) == {"error": "Файл настроек не найден"}
+
+
+@pytest.mark.parametrize(
+    "path, expected_status",
+    [
+        ("/report?date=31.10.2023", 400),
+        ("/report?category=x&date=2023-10-31", 400),
+        ("/report?category=x&format=xml", 400),
+        ("/unknown", 404),
+        ("/health", 200),
+        ("/metrics", 200),
+    ],
+)
+def test_endpoint_statuses(report_server: Tuple[str, MagicMock], path: str, expected_status: int) -> None:
+    base_url, _ = report_server
+
+    status, _ = get(f"{base_url}{path}")
+
+    assert status == expected_status
+
+
+def test_metrics_endpoint_reports_stages(report_server: Tuple[str, MagicMock]) -> None:
+    base_url, _ = report_server
+    get(f"{base_url}/report?category=x&date=31.10.2023")
+
+    status, body = get(f"{base_url}/metrics")
+
+    assert status == 200
+    assert 'report_stage_calls_total{stage="filter.category"}' in body
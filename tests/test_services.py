@@ -1,9 +1,11 @@
 import json
+from pathlib import Path
 from unittest.mock import patch
 
 import pandas as pd
+import pytest
 
-from src.services import find_transactions_with_phone_numbers
+from src.services import PhoneIndex, find_transactions_by_phone, find_transactions_with_phone_numbers, normalize_phone
 
 
 def test_find_transactions_with_phone_numbers() -> None:
@@ -55,3 +57,66 @@ def test_empty_dataframe() -> None:
 
         assert result == []
         mock_read_excel.assert_called_once_with("dummy_path.xlsx")
+
+
+@pytest.mark.parametrize(
+    "phone, expected",
+    [
+        ("+7 921 111-22-33", "+79211112233"),
+        ("+79211112233", "+79211112233"),
+        ("8 (921) 111-22-33", "+79211112233"),
+        ("9211112233", "+79211112233"),
+    ],
+)
+def test_normalize_phone(phone: str, expected: str) -> None:
+    assert normalize_phone(phone) == expected
+
+
+def test_phone_index() -> None:
+    df = pd.DataFrame(
+        {
+            "Описание": [
+                "Я МТС +7 921 111-22-33",
+                "Магнит",
+                "Тинькофф Мобайл +7 995 555-55-55",
+                "Повтор +79211112233",
+                None,
+            ]
+        }
+    )
+
+    index = PhoneIndex(df)
+
+    assert index.mask.tolist() == [True, False, True, True, False]
+    assert index.lookup("8 921 111 22 33").tolist() == [0, 3]
+    assert index.lookup("+7 000 000-00-00").tolist() == []
+
+
+def test_find_transactions_by_phone() -> None:
+    df = pd.DataFrame(
+        {
+            "Дата операции": ["03.10.2023 12:00:00", "02.10.2023 12:00:00", "01.10.2023 12:00:00"],
+            "Описание": ["Я МТС +7 921 111-22-33", "Тинькофф Мобайл +7 995 555-55-55", "Я МТС +7 921 111-22-33"],
+        }
+    )
+
+    with patch("pandas.read_excel", return_value=df):
+        result = json.loads(find_transactions_by_phone("dummy_path.xlsx", "+79211112233"))
+
+    # Порядок выгрузки (новые операции первыми), а не порядок дат в хранилище
+    assert result == [
+        {"Дата операции": "03.10.2023 12:00:00", "Описание": "Я МТС +7 921 111-22-33"},
+        {"Дата операции": "01.10.2023 12:00:00", "Описание": "Я МТС +7 921 111-22-33"},
+    ]
+
+
+def test_phone_index_built_once_per_file(tmp_path: Path) -> None:
+    file_path = tmp_path / "operations.xlsx"
+    file_path.write_bytes(b"stub")
+    df = pd.DataFrame({"Описание": ["Я МТС +7 921 111-22-33", "Магнит"]})
+
+    with patch("pandas.read_excel", return_value=df), patch("src.services.PhoneIndex", wraps=PhoneIndex) as mock_index:
+        find_transactions_with_phone_numbers(str(file_path))
+        find_transactions_by_phone(str(file_path), "+79211112233")
+
+    mock_index.assert_called_once()
@@ -0,0 +1,217 @@
+import os
+from datetime import datetime
+from hashlib import sha256
+from pathlib import Path
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from src import store
+from src.store import TransactionStore, index_by_date, load_transactions, normalize_transactions, select_period
+
+
+def test_normalize_transactions() -> None:
+    df = pd.DataFrame(
+        {
+            "Дата операции": ["31.12.2021 16:44:00"],
+            "Дата платежа": ["31.12.2021"],
+            "Категория": ["Супермаркеты"],
+            "Сумма платежа": [-160],
+        }
+    )
+
+    result = normalize_transactions(df)
+
+    assert result["Дата операции"].iloc[0] == pd.Timestamp("2021-12-31 16:44:00")
+    assert result["Дата платежа"].iloc[0] == pd.Timestamp("2021-12-31")
+    assert isinstance(result["Категория"].dtype, pd.CategoricalDtype)
+    assert result["Сумма платежа"].dtype == "float64"
+
+
+def test_normalize_transactions_compact_types() -> None:
+    df = pd.DataFrame(
+        {
+            "Номер карты": ["*7197", None],
+            "MCC": [5411.0, None],
+            "Описание": ["Магнит", None],
+            "Бонусы (включая кэшбэк)": [3, 120],
+            "Округление на инвесткопилку": [0, 0],
+        }
+    )
+    raw = df.copy()
+
+    result = normalize_transactions(df)
+
+    assert isinstance(result["Номер карты"].dtype, pd.CategoricalDtype)
+    assert result["MCC"].dtype == "float32"
+    assert result["Описание"].dtype == "string"
+    assert result["Бонусы (включая кэшбэк)"].dtype == "int8"
+    assert result["Округление на инвесткопилку"].dtype == "int8"
+    assert result["MCC"].iloc[0] == 5411
+
+    report = store.memory_report(raw, result)
+    assert report.loc["Итого", "Байт после"] < report.loc["Итого", "Байт до"]
+    assert report.loc["MCC", "Тип после"] == "float32"
+
+
+def test_card_labels() -> None:
+    cards = pd.Series(["*7197", None, "*5091"], dtype="category")
+
+    result = store.card_labels(cards)
+
+    assert isinstance(result.dtype, pd.CategoricalDtype)
+    assert result.tolist() == ["*7197", "nan", "*5091"]
+
+
+def test_cashback() -> None:
+    assert store.cashback(-300.00000000000006) == -3.0
+    assert store.cashback(-199.99) == -2.0
+    assert store.cashback(250.0) == 2.0
+
+
+def test_load_transactions_cached_until_file_changes(tmp_path: Path) -> None:
+    file_path = tmp_path / "operations.xlsx"
+    file_path.write_bytes(b"stub")
+    df = pd.DataFrame({"Описание": ["Магнит"]})
+
+    with patch("pandas.read_excel", return_value=df) as mock_read_excel:
+        first = load_transactions(str(file_path))
+        second = load_transactions(str(file_path))
+
+        assert first is second
+        mock_read_excel.assert_called_once_with(str(file_path))
+
+        file_path.write_bytes(b"changed stub")
+        os.utime(file_path, (0, 0))
+        load_transactions(str(file_path))
+
+        assert mock_read_excel.call_count == 2
+
+
+def test_built_does_not_build(tmp_path: Path) -> None:
+    file_path = tmp_path / "operations.xlsx"
+    file_path.write_bytes(b"stub")
+    df = pd.DataFrame({"Описание": ["Магнит"]})
+
+    with patch("pandas.read_excel", return_value=df):
+        transactions = load_transactions(str(file_path))
+
+    assert store.built(str(file_path), transactions, "rows") is None
+    assert store.derive(str(file_path), transactions, "rows", len) == 1
+    assert store.built(str(file_path), transactions, "rows") == 1
+
+
+def test_load_transactions_missing_file_not_cached() -> None:
+    df = pd.DataFrame({"Описание": ["Магнит"]})
+
+    with patch("pandas.read_excel", return_value=df) as mock_read_excel:
+        load_transactions("dummy_path.xlsx")
+        load_transactions("dummy_path.xlsx")
+
+        assert mock_read_excel.call_count == 2
+
+
+def test_sidecar_used_on_cold_start(tmp_path: Path) -> None:
+    file_path = tmp_path / "operations.xlsx"
+    file_path.write_bytes(b"stub")
+    df = pd.DataFrame(
+        {
+            "Дата операции": ["31.12.2021 16:44:00"],
+            "Номер карты": ["*7197"],
+            "Категория": ["Супермаркеты"],
+            "MCC": [5411.0],
+            "Описание": ["Магнит"],
+        }
+    )
+
+    with patch("pandas.read_excel", return_value=df):
+        expected = TransactionStore().load(str(file_path))
+
+    assert len(list(tmp_path.glob(".operations.xlsx.*.feather"))) == 1
+
+    with patch("pandas.read_excel") as mock_read_excel:
+        result = TransactionStore().load(str(file_path))
+
+        mock_read_excel.assert_not_called()
+
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_sidecar_written_atomically(tmp_path: Path) -> None:
+    path = str(tmp_path / ".operations.xlsx.0123456789abcdef.feather")
+    store.write_sidecar(pd.DataFrame({"Описание": ["Магнит"]}), path)
+
+    def write_partly(frame: pd.DataFrame, target: str) -> None:
+        Path(target).write_bytes(b"partial")
+        raise OSError("диск заполнен")
+
+    with patch("pyarrow.feather.write_feather", side_effect=write_partly):
+        store.write_sidecar(pd.DataFrame({"Описание": ["Пятерочка"]}), path)
+
+    # Прежний кэш цел, а временный файл удален
+    assert store.read_sidecar(path)["Описание"].tolist() == ["Магнит"]
+    assert [file.name for file in tmp_path.iterdir()] == [".operations.xlsx.0123456789abcdef.feather"]
+
+
+def test_sidecar_replaced_when_file_changes(tmp_path: Path) -> None:
+    file_path = tmp_path / "operations.xlsx"
+    file_path.write_bytes(b"stub")
+    df = pd.DataFrame({"Описание": ["Магнит"]})
+
+    with patch("pandas.read_excel", return_value=df):
+        TransactionStore().load(str(file_path))
+        file_path.write_bytes(b"changed stub")
+        TransactionStore().load(str(file_path))
+
+    digest = sha256(b"changed stub").hexdigest()[:16]
+    sidecars = list(tmp_path.glob(".operations.xlsx.*.feather"))
+    assert [sidecar.name for sidecar in sidecars] == [f".operations.xlsx.{digest}.feather"]
+
+
+def test_index_by_date_sorts_transactions() -> None:
+    df = pd.DataFrame(
+        {
+            "Дата операции": pd.to_datetime(["2023-10-03", "2023-10-01", "2023-10-02"]),
+            "Сумма платежа": [3.0, 1.0, 2.0],
+        }
+    )
+
+    result = index_by_date(df)
+
+    assert result["Дата операции"].is_monotonic_increasing
+    assert result["Сумма платежа"].tolist() == [1.0, 2.0, 3.0]
+    assert result.sort_index()["Сумма платежа"].tolist() == [3.0, 1.0, 2.0]
+
+
+@pytest.mark.parametrize("indexed", [True, False])
+def test_select_period(indexed: bool) -> None:
+    df = pd.DataFrame(
+        {
+            "Дата операции": pd.to_datetime(["2023-10-31", "2023-09-30", "2023-10-01", "2023-11-01", "2023-10-15"]),
+            "Сумма платежа": [4.0, 1.0, 2.0, 5.0, 3.0],
+        }
+    )
+    if indexed:
+        df = index_by_date(df)
+
+    result = select_period(df, datetime(2023, 10, 1), datetime(2023, 10, 31))
+
+    assert sorted(result["Сумма платежа"].tolist()) == [2.0, 3.0, 4.0]
+
+
+def test_select_period_skips_order_check_after_index_by_date() -> None:
+    df = index_by_date(
+        pd.DataFrame({"Дата операции": pd.to_datetime(["2023-10-03", "2023-10-01", "2023-10-02"]), "x": [3, 1, 2]})
+    )
+
+    with patch("pandas.Index", side_effect=AssertionError("порядок дат проверяется заново")):
+        result = select_period(df, datetime(2023, 10, 2), datetime(2023, 10, 3))
+        inner = select_period(result, datetime(2023, 10, 3), datetime(2023, 10, 3))
+
+    assert result["x"].tolist() == [2, 3]
+    assert inner["x"].tolist() == [3]
+    # Пропуски дат сортируются в конец: по такой колонке выборка идет перебором
+    with_missing = index_by_date(pd.DataFrame({"Дата операции": pd.to_datetime([None, "2023-10-01"]), "x": [1, 2]}))
+    assert not store.is_sorted_by_date(with_missing)
+    assert select_period(with_missing, datetime(2023, 10, 1), datetime(2023, 10, 2))["x"].tolist() == [2]
@@ -0,0 +1,48 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from src.streaming import iter_transaction_batches, stream_spending_by_category, stream_transactions_with_phone_numbers
+
+
+@pytest.fixture
+def operations_file(tmp_path: Path) -> str:
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["Дата операции", "Категория", "Сумма платежа", "Описание"])
+    sheet.append(["01.10.2023 12:00:00", "Переводы", -100, "Константин Л."])
+    sheet.append(["15.10.2023 14:00:00", "Мобильная связь", -200, "Я МТС +7 921 11-22-33"])
+    sheet.append(["30.10.2023 16:00:00", "Переводы", -300, "Перевод +7 995 555-55-55"])
+    sheet.append(["01.01.2023 10:00:00", "Переводы", -400, "Старый перевод"])
+    file_path = tmp_path / "operations.xlsx"
+    workbook.save(file_path)
+    return str(file_path)
+
+
+def test_iter_transaction_batches(operations_file: str) -> None:
+    batches = list(iter_transaction_batches(operations_file, batch_size=3))
+
+    assert [len(batch) for batch in batches] == [3, 1]
+    assert pd.api.types.is_datetime64_any_dtype(batches[0]["Дата операции"])
+    assert batches[0]["Сумма платежа"].dtype == "float64"
+
+
+def test_stream_spending_by_category(operations_file: str) -> None:
+    result = stream_spending_by_category(operations_file, "Переводы", "31.10.2023", batch_size=2)
+
+    assert result["Сумма платежа"].tolist() == [-100.0, -300.0]
+
+
+def test_stream_spending_by_category_no_transactions(operations_file: str) -> None:
+    result = stream_spending_by_category(operations_file, "Каршеринг", "31.10.2023", batch_size=2)
+
+    assert result.empty
+    assert result.columns.tolist() == ["Дата операции", "Категория", "Сумма платежа", "Описание"]
+
+
+def test_stream_transactions_with_phone_numbers(operations_file: str) -> None:
+    result = pd.concat(stream_transactions_with_phone_numbers(operations_file, batch_size=2))
+
+    assert result["Описание"].tolist() == ["Перевод +7 995 555-55-55"]
@@ -1,10 +1,66 @@
+import json
+import threading
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
 from unittest.mock import Mock, patch
 
-from src.utils import get_currency_rates, get_stock_info, get_stock_prices
+import pytest
+import requests
+
+from src.utils import RATES_TTL, get_currency_rates, get_rate_history, get_stock_info, get_stock_prices, quotes_cache
+
+STUB_DELAY = 0.3
+STUB_TICKERS = {"Apple": "AAPL", "Amazon": "AMZN", "Alphabet": "GOOGL", "Microsoft": "MSFT", "Tesla": "TSLA"}
+
+
+class StubSharesHandler(BaseHTTPRequestHandler):
+    """Локальная заглушка API акций: поиск тикера и котировки с искусственной задержкой."""
+
+    paths: list = []
+
+    def do_GET(self) -> None:
+        time.sleep(STUB_DELAY)
+        path, _, query = self.path.partition("?")
+        self.paths.append(path)
+        if path == "/search":
+            name = dict(part.split("=") for part in query.split("&"))["query"]
+            body = [{"symbol": STUB_TICKERS[name]}] if name in STUB_TICKERS else []
+        elif path.startswith("/quote-short/"):
+            symbols = path.removeprefix("/quote-short/").split(",")
+            body = [
+                {"symbol": symbol, "price": float(len(symbol))}
+                for symbol in symbols
+                if symbol in STUB_TICKERS.values()
+            ]
+        else:
+            self.send_error(404)
+            return
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+@pytest.fixture
+def stub_shares_api() -> Iterator[str]:
+    StubSharesHandler.paths = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubSharesHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
 
 
 def test_get_currency_rates() -> None:
-    with patch("requests.get") as mock_get:
+    with patch("requests.Session.get") as mock_get:
         mock_response = Mock()
         mock_response.status_code = 200
         mock_response.json.return_value = {"conversion_rates": {"EUR": 0.85, "JPY": 110.0, "GBP": 0.75}}
@@ -22,8 +78,39 @@ def test_get_currency_rates() -> None:
         assert result == expected_rates
 
 
+def test_get_rate_history() -> None:
+    codes = '<Valuta><Item ID="R01700J"><ISO_Char_Code>TRY</ISO_Char_Code></Item></Valuta>'
+    history = (
+        '<ValCurs><Record Date="09.01.2021" Id="R01700J"><Nominal>10</Nominal><Value>99,5000</Value></Record>'
+        '<Record Date="12.01.2021" Id="R01700J"><Nominal>10</Nominal><Value>100,5000</Value></Record></ValCurs>'
+    )
+    with patch("requests.Session.get") as mock_get:
+        mock_get.side_effect = [Mock(content=body.encode("cp1251")) for body in (codes, history)]
+
+        result = get_rate_history("TRY", date(2021, 1, 1), date(2021, 1, 12))
+
+    assert result == {"2021-01-09": 9.95, "2021-01-12": 10.05}
+    assert "date_req1=01/01/2021&date_req2=12/01/2021&VAL_NM_RQ=R01700J" in mock_get.call_args[0][0]
+
+
+def test_get_currency_rates_cached_and_stale_on_error() -> None:
+    with patch("requests.Session.get") as mock_get:
+        mock_response = Mock()
+        mock_response.json.return_value = {"conversion_rates": {"USD": 0.0125}}
+        mock_get.return_value = mock_response
+
+        assert get_currency_rates(["USD"]) == {"USD": 80.0}
+        assert get_currency_rates(["USD"]) == {"USD": 80.0}
+        mock_get.assert_called_once()
+
+        mock_get.side_effect = requests.ConnectionError
+        with patch("time.time", return_value=time.time() + RATES_TTL + 1):
+            assert get_currency_rates(["USD"]) == {"USD": 80.0}
+        assert mock_get.call_count == 2
+
+
 def test_get_stock_info() -> None:
-    with patch("requests.get") as mock_get:
+    with patch("requests.Session.get") as mock_get:
         mock_response = Mock()
         mock_response.status_code = 200
         mock_response.json.return_value = [{"symbol": "AAPL", "name": "Apple Inc.", "price": 150.0}]
@@ -35,17 +122,49 @@ def test_get_stock_info() -> None:
 
 
 def test_get_stock_prices() -> None:
-    with patch("requests.get") as mock_get:
-        mock_response_search = Mock()
-        mock_response_search.status_code = 200
-        mock_response_search.json.return_value = [{"symbol": "AAPL"}]
-
+    with patch("requests.Session.get") as mock_get:
         mock_response_price = Mock()
         mock_response_price.status_code = 200
-        mock_response_price.json.return_value = [{"price": 150.0}]
+        mock_response_price.json.return_value = [{"symbol": "AAPL", "price": 150.0}]
 
-        mock_get.side_effect = [mock_response_search, mock_response_price]
+        mock_get.return_value = mock_response_price
 
         stocks = ["AAPL"]
         expected_prices = {"AAPL": 150.0}
         assert get_stock_prices(stocks) == expected_prices
+        mock_get.assert_called_once()
+        assert "quote-short/AAPL?" in mock_get.call_args.args[0]
+
+
+def test_get_stock_prices_stub_server_batched(stub_shares_api: str) -> None:
+    stocks = ["AAPL", "AMZN", "GOOGL", "MSFT", "TSLA"]
+
+    with (
+        patch("src.utils.SHARES_API_URL", stub_shares_api),
+        patch("src.utils.QUOTE_BATCH_SIZE", 2),
+        patch.object(quotes_cache, "_save", wraps=quotes_cache._save) as save,
+    ):
+        result = get_stock_prices(stocks)
+        cached_result = get_stock_prices(stocks)
+
+    assert result == cached_result == {stock: float(len(stock)) for stock in stocks}
+    save.assert_called_once()
+    assert sorted(StubSharesHandler.paths) == [
+        "/quote-short/AAPL,AMZN",
+        "/quote-short/GOOGL,MSFT",
+        "/quote-short/TSLA",
+    ]
+
+
+def test_get_stock_prices_stub_server_search_fallback(stub_shares_api: str) -> None:
+    stocks = ["Apple", "Amazon", "Alphabet", "Microsoft", "Tesla", "Unknown"]
+
+    with patch("src.utils.SHARES_API_URL", stub_shares_api):
+        started = time.perf_counter()
+        result = get_stock_prices(stocks)
+        elapsed = time.perf_counter() - started
+
+    assert list(result) == ["AAPL", "AMZN", "GOOGL", "MSFT", "TSLA"]
+    assert result["AAPL"] == 4.0
+    # Пакетный запрос, затем параллельно поиск и котировка; последовательно было бы 12 задержек заглушки
+    assert elapsed < 5 * STUB_DELAY
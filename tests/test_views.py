@@ -1,9 +1,14 @@
 import json
+import time
 from datetime import datetime
+from pathlib import Path
+from typing import Callable
 from unittest.mock import MagicMock, patch
 
 import pandas as pd
+import pytest
 
+from src.store import index_by_date
 from src.views import generate_report, get_greeting, get_spending_data
 
 
@@ -66,6 +71,78 @@ def test_get_spending_data(transactions: pd.DataFrame) -> None:
         assert len(result[card]["top_transactions"]) == len(expected_data[card]["top_transactions"])
 
 
+def test_get_spending_data_top_five_per_card() -> None:
+    transactions = pd.DataFrame(
+        {
+            "Дата операции": pd.date_range("2023-10-01", periods=8, freq="D"),
+            "Номер карты": ["*1111"] * 7 + ["*2222"],
+            "Категория": ["Еда"] * 8,
+            "Сумма платежа": [10.0, 70.0, 30.0, None, 50.0, 60.0, 20.0, 5.0],
+        }
+    )
+
+    result = get_spending_data(transactions, datetime(2023, 10, 31))
+
+    assert list(result) == ["*1111", "*2222"]
+    assert result["*1111"]["total_spent"] == 240.0
+    assert result["*1111"]["cashback"] == 2.0
+    assert [t["Сумма платежа"] for t in result["*1111"]["top_transactions"]] == [70.0, 60.0, 50.0, 30.0, 20.0]
+    assert [t["Сумма платежа"] for t in result["*2222"]["top_transactions"]] == [5.0]
+
+
+def test_get_spending_data_cashback_ignores_float_error() -> None:
+    transactions = pd.DataFrame(
+        {
+            "Дата операции": pd.date_range("2023-10-01", periods=3, freq="D"),
+            "Номер карты": ["*1111"] * 3,
+            "Категория": ["Еда"] * 3,
+            "Сумма платежа": [-80.29, -194.02, -25.69],
+        }
+    )
+
+    result = get_spending_data(transactions, datetime(2023, 10, 31))
+
+    assert result["*1111"]["total_spent"] == pytest.approx(-300.0)
+    assert result["*1111"]["cashback"] == -3.0
+
+
+def test_get_spending_data_totals_match_per_card_sum() -> None:
+    transactions = pd.DataFrame(
+        {
+            "Дата операции": pd.date_range("2023-10-01", periods=5, freq="D"),
+            "Номер карты": ["*1111", "*1111", "*2222", "*1111", "*1111"],
+            "Категория": ["Еда"] * 5,
+            "Сумма платежа": [43.62, 435.07, 10.0, 315.85, -497.26],
+        }
+    )
+
+    result = get_spending_data(transactions, datetime(2023, 10, 31))
+
+    # Итоги до последнего знака как при сложении строк каждой карты по отдельности (сумма с компенсацией
+    # ошибки округления дала бы 297.28000000000003)
+    assert result["*1111"]["total_spent"] == pd.Series([43.62, 435.07, 315.85, -497.26]).sum() == 297.28
+    assert result["*2222"]["total_spent"] == 10.0
+
+
+def test_get_spending_data_keeps_file_order() -> None:
+    # Выгрузка идет от новых операций к старым, хранилище сортирует строки по дате
+    transactions = index_by_date(
+        pd.DataFrame(
+            {
+                "Дата операции": pd.to_datetime(["2023-10-05", "2023-10-04", "2023-10-03", "2023-10-02"]),
+                "Номер карты": ["*2222", "*1111", "*1111", "*1111"],
+                "Категория": ["Еда", "Такси", "Аптеки", "Кафе"],
+                "Сумма платежа": [-10.0, -50.0, -50.0, -50.0],
+            }
+        )
+    )
+
+    result = get_spending_data(transactions, datetime(2023, 10, 31))
+
+    assert list(result) == ["*2222", "*1111"]
+    assert [t["Категория"] for t in result["*1111"]["top_transactions"]] == ["Такси", "Аптеки", "Кафе"]
+
+
 @patch("pandas.read_excel")
 @patch("builtins.open")
 @patch("src.views.get_spending_data")
@@ -183,3 +260,166 @@ def test_generate_report_invalid_date_format(
     mock_open.return_value.__enter__.return_value.read.return_value = json.dumps(
         {"user_currencies": ["USD"], "user_stocks": ["AAPL"]}
     )
+
+
+@patch("src.views.load_transactions")
+@patch("src.views.load_user_settings")
+@patch("src.views.get_currency_rates")
+@patch("src.views.get_stock_prices")
+def test_generate_report_fetches_market_data_concurrently(
+    mock_stock_prices: MagicMock,
+    mock_currency_rates: MagicMock,
+    mock_user_settings: MagicMock,
+    mock_load_transactions: MagicMock,
+    transactions: pd.DataFrame,
+) -> None:
+    def slow(value: dict) -> Callable[[list], dict]:
+        def fetch(_: list) -> dict:
+            time.sleep(0.3)
+            return value
+
+        return fetch
+
+    def slow_load(_: str) -> pd.DataFrame:
+        time.sleep(0.3)
+        return transactions
+
+    mock_user_settings.return_value = {"user_currencies": ["USD"], "user_stocks": ["AAPL"]}
+    mock_currency_rates.side_effect = slow({"USD": 75.0})
+    mock_stock_prices.side_effect = slow({"AAPL": 150.0})
+    mock_load_transactions.side_effect = slow_load
+
+    started = time.perf_counter()
+    result_json = json.loads(generate_report("2023-10-31 00:00:00"))
+    elapsed = time.perf_counter() - started
+
+    assert result_json["currency_rates"] == {"USD": 75.0}
+    assert result_json["stock_prices"] == {"AAPL": 150.0}
+    assert set(result_json["spending_data"]) == {"1234567890123456", "9876543210987654"}
+    assert elapsed < 0.6
+
+
+@patch("src.views.load_transactions")
+@patch("src.views.load_user_settings")
+@patch("src.views.get_currency_rates")
+@patch("src.views.get_stock_prices")
+def test_generate_report_section_deadline(
+    mock_stock_prices: MagicMock,
+    mock_currency_rates: MagicMock,
+    mock_user_settings: MagicMock,
+    mock_load_transactions: MagicMock,
+    transactions: pd.DataFrame,
+) -> None:
+    mock_user_settings.return_value = {"user_currencies": ["USD"], "user_stocks": ["AAPL"]}
+    mock_currency_rates.return_value = {"USD": 75.0}
+    mock_stock_prices.side_effect = lambda _: time.sleep(1) or {"AAPL": 150.0}
+    mock_load_transactions.return_value = transactions
+
+    started = time.perf_counter()
+    result_json = json.loads(generate_report("2023-10-31 00:00:00", timeouts={"stock_prices": 0.1}))
+    elapsed = time.perf_counter() - started
+
+    assert result_json["currency_rates"] == {"USD": 75.0}
+    assert result_json["stock_prices"] == {}
+    assert elapsed < 0.5
+
+
+@patch("src.views.get_stock_prices", return_value={})
+@patch("src.views.get_currency_rates", return_value={})
+def test_generate_report_converts_amounts_to_currency(_rates: MagicMock, _stocks: MagicMock, tmp_path: Path) -> None:
+    data_path = tmp_path / "operations.xlsx"
+    pd.DataFrame(
+        {
+            "Дата операции": ["25.04.2019 08:39:38", "26.04.2019 13:14:29", "27.04.2019 02:16:38"],
+            "Номер карты": ["*4556", "*4556", "*7197"],
+            "Категория": ["Супермаркеты", "Фастфуд", "Супермаркеты"],
+            "Сумма платежа": [100.0, 32.0, 150.0],
+            "Валюта платежа": ["CNY", "CNY", "RUB"],
+        }
+    ).to_excel(data_path, index=False)
+    settings_path = tmp_path / "user_settings.json"
+    settings_path.write_text(json.dumps({"user_currencies": [], "user_stocks": []}), encoding="utf-8")
+
+    with patch("src.rates.get_rate_history", return_value={"2019-04-24": 9.5, "2019-04-26": 9.0}):
+        result = json.loads(
+            generate_report(
+                "2019-04-30 00:00:00", file_path=str(data_path), settings_path=str(settings_path), currency="RUB"
+            )
+        )
+    with patch("src.rates.get_rate_history", return_value=None):
+        error = json.loads(
+            generate_report(
+                "2019-04-30 00:00:00", file_path=str(data_path), settings_path=str(settings_path), currency="USD"
+            )
+        )
+
+    assert result["currency"] == "RUB"
+    assert result["spending_data"]["*4556"]["total_spent"] == 100.0 * 9.5 + 32.0 * 9.0
+    assert result["spending_data"]["*4556"]["cashback"] == 12.0
+    assert result["spending_data"]["*7197"]["total_spent"] == 150.0
+    assert "error" in error
+
+
+@patch("src.views.get_stock_prices", return_value={})
+@patch("src.views.get_currency_rates", return_value={})
+def test_generate_report_in_rubles_without_rates(_rates: MagicMock, _stocks: MagicMock, tmp_path: Path) -> None:
+    data_path = tmp_path / "operations.xlsx"
+    pd.DataFrame(
+        {
+            "Дата операции": ["25.04.2019 08:39:38", "26.04.2019 13:14:29"],
+            "Номер карты": ["*4556", "*7197"],
+            "Категория": ["Супермаркеты", "Супермаркеты"],
+            "Сумма платежа": [100.0, 150.0],
+            "Валюта платежа": ["CNY", "RUB"],
+        }
+    ).to_excel(data_path, index=False)
+    settings_path = tmp_path / "user_settings.json"
+    settings_path.write_text(json.dumps({"user_currencies": [], "user_stocks": []}), encoding="utf-8")
+
+    # Рубли — пересчет по умолчанию: без курсов суммы остаются как в выписке, а не ошибка
+    with patch("src.rates.get_rate_history", return_value=None) as mock_history:
+        offline = json.loads(
+            generate_report("2019-04-30 00:00:00", file_path=str(data_path), settings_path=str(settings_path))
+        )
+    with patch("src.rates.get_rate_history", return_value={"2019-04-24": 9.5}):
+        online = json.loads(
+            generate_report("2019-04-30 00:00:00", file_path=str(data_path), settings_path=str(settings_path))
+        )
+
+    mock_history.assert_called_once()
+    assert offline["currency"] is None
+    assert offline["spending_data"]["*4556"]["total_spent"] == 100.0
+    assert online["currency"] == "RUB"
+    assert online["spending_data"]["*4556"]["total_spent"] == 950.0
+
+
+@pytest.mark.parametrize("engine", ["pandas", "sqlite"])
+@patch("src.views.get_stock_prices", return_value={})
+@patch("src.views.get_currency_rates", return_value={})
+def test_generate_report_converts_amounts_with_both_engines(
+    _rates: MagicMock, _stocks: MagicMock, tmp_path: Path, engine: str
+) -> None:
+    data_path = tmp_path / "operations.xlsx"
+    pd.DataFrame(
+        {
+            "Дата операции": ["27.04.2019 02:16:38", "26.04.2019 13:14:29", "25.04.2019 08:39:38"],
+            "Номер карты": ["*7197", "*4556", "*4556"],
+            "Категория": ["Супермаркеты", "Фастфуд", "Супермаркеты"],
+            "Сумма платежа": [150.0, 32.0, 100.0],
+            "Валюта платежа": ["RUB", "CNY", "CNY"],
+        }
+    ).to_excel(data_path, index=False)
+    settings_path = tmp_path / "user_settings.json"
+    settings_path.write_text(json.dumps({"user_currencies": [], "user_stocks": []}), encoding="utf-8")
+
+    with patch("src.rates.get_rate_history", return_value={"2019-04-24": 9.5, "2019-04-26": 9.0}):
+        result = json.loads(
+            generate_report(
+                "2019-04-30 00:00:00", file_path=str(data_path), settings_path=str(settings_path), engine=engine
+            )
+        )
+
+    assert result["currency"] == "RUB"
+    assert list(result["spending_data"]) == ["*7197", "*4556"]
+    assert result["spending_data"]["*4556"]["total_spent"] == 32.0 * 9.0 + 100.0 * 9.5
+    assert [t["Сумма платежа"] for t in result["spending_data"]["*4556"]["top_transactions"]] == [950.0, 288.0]